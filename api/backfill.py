@@ -0,0 +1,251 @@
+"""
+Bulk import / backfill commands for the Qdrant collection.
+
+Usage:
+    python -m api.backfill import corpus.jsonl [--batch-size 256] [--parallelism 8]
+    python -m api.backfill recount-revisions [--batch-size 256]
+    python -m api.backfill project-metadata [--batch-size 256]
+    python -m api.backfill restore-created-at [--batch-size 256]
+
+Each line of the input file is a JSON object with an "id", the "content" text, and optionally a
+precomputed "vector" and extra "payload" fields. Lines without a vector are embedded in batches.
+
+recount-revisions sets the revisions_count payload field on points written before searches
+stopped fetching the revisions list.
+
+restore-created-at copies each message's creation time from its Qdrant payload into
+messages_table.created_at. Rows that existed before that column was added hold the time of the
+migration, so run it once after upgrading; until then their dashboard order is only by id.
+
+project-metadata fills message_metadata_table from the Qdrant payloads of existing messages,
+taking created_at from the payload and restoring it in messages_table as restore-created-at does. It
+is idempotent, so it can run while the projection is already being written for new messages.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+
+from dotenv import load_dotenv, find_dotenv
+
+from api.data.openai_client import OpenAIClient
+from api.data.qdrant_client import MESSAGE_PAYLOAD_FIELDS, QdrantClient
+
+_: bool = load_dotenv(find_dotenv())
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def read_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.error(f"Skipping line {line_number}: {e}")
+
+
+async def corpus_points(path, openai_client, embed_batch_size):
+    """Yield (id, text, vector, payload) tuples, embedding lines without a vector in batches."""
+    pending = []
+
+    async def embed_pending():
+        vectors = await openai_client.embed_many([record["content"] for record in pending])
+        if vectors is None:
+            raise RuntimeError(f"Failed to embed {len(pending)} records starting at id {pending[0].get('id')}")
+        for record, vector in zip(pending, vectors):
+            yield to_point(record, vector)
+        pending.clear()
+
+    for record in read_corpus(path):
+        if record.get("vector") is not None:
+            yield to_point(record, record["vector"])
+            continue
+        pending.append(record)
+        if len(pending) >= embed_batch_size:
+            async for point in embed_pending():
+                yield point
+    if pending:
+        async for point in embed_pending():
+            yield point
+
+
+def to_point(record, vector):
+    return (record.get("id") or str(uuid.uuid4()), record["content"], vector, record.get("payload") or {})
+
+
+async def import_corpus(args):
+    openai_client = OpenAIClient()
+    qdrant_client = QdrantClient(collection_name=args.collection)
+    started = time.monotonic()
+    try:
+        report = await qdrant_client.bulk_upsert(
+            corpus_points(args.path, openai_client, args.embed_batch_size),
+            batch_size=args.batch_size,
+            parallelism=args.parallelism,
+            max_retries=args.max_retries,
+        )
+    finally:
+        await qdrant_client.close()
+        await openai_client.close()
+
+    elapsed = time.monotonic() - started
+    rate = report.points / elapsed * 60 if elapsed else 0
+    logger.info(f"Imported {report.points} points in {report.batches} batches ({elapsed:.1f}s, {rate:.0f} points/min)")
+    for failure in report.failures:
+        logger.error(f"Batch {failure.batch_index} failed after {failure.attempts} attempts: {failure.error}")
+    return 1 if report.failures else 0
+
+
+def stale_revision_counts(records):
+    """Group the ids of records whose revisions_count is missing or out of date by their true count."""
+    updates = defaultdict(list)
+    for record in records:
+        payload = record.payload or {}
+        revisions_count = len(payload.get("revisions") or [])
+        if payload.get("revisions_count") != revisions_count:
+            updates[revisions_count].append(record.id)
+    return updates
+
+
+async def recount_revisions(args):
+    qdrant_client = QdrantClient(collection_name=args.collection)
+    scanned = updated = 0
+    try:
+        async for records in qdrant_client.scroll_payloads(["revisions", "revisions_count"], args.batch_size):
+            scanned += len(records)
+            # One set_payload request per distinct count in the page
+            for revisions_count, ids in stale_revision_counts(records).items():
+                await qdrant_client.set_payload({"revisions_count": revisions_count}, ids)
+                updated += len(ids)
+    finally:
+        await qdrant_client.close()
+    logger.info(f"Scanned {scanned} points, set revisions_count on {updated}")
+    return 0
+
+
+async def project_metadata(args):
+    # Imported here so the engine is created after load_dotenv has run
+    from api.data._db_config import SessionLocal
+    from api.data._message_metadata import metadata_from_payload, payload_created_at, restore_created_at, upsert_message_metadata
+
+    qdrant_client = QdrantClient(collection_name=args.collection)
+    db = SessionLocal()
+    written = missing = 0
+    try:
+        for messages in message_pages(db, args.batch_size):
+            # Older points may only carry the revisions list, so fetch it alongside the message fields
+            records = await qdrant_client.retrieve(
+                [str(message.id) for message in messages], payload_fields=[*MESSAGE_PAYLOAD_FIELDS, "revisions"]
+            )
+            payloads = {str(record.id): record.payload or {} for record in records or []}
+            found = [message for message in messages if str(message.id) in payloads]
+            # messages_table.created_at may still be the created_at migration's placeholder, so take
+            # the payload's and write it back there too
+            created_at = {
+                message.id: payload_created_at(payloads[str(message.id)]) or message.created_at for message in found
+            }
+            rows = [
+                metadata_from_payload(message.id, message.user_id, created_at[message.id], payloads[str(message.id)])
+                for message in found
+            ]
+            missing += len(messages) - len(rows)
+            written += upsert_message_metadata(db, rows)
+            restore_created_at(
+                db, {message.id: created_at[message.id] for message in found if created_at[message.id] != message.created_at}
+            )
+            db.commit()
+    finally:
+        db.close()
+        await qdrant_client.close()
+    logger.info(f"Projected metadata for {written} messages; {missing} messages have no Qdrant point")
+    return 0
+
+
+def message_pages(db, batch_size):
+    """Yield pages of (id, user_id, created_at) messages_table rows in id order."""
+    from sqlalchemy import select
+    from api.data._sqlalchemy_models import MESSAGE
+
+    last_id = None
+    while True:
+        statement = select(MESSAGE.id, MESSAGE.user_id, MESSAGE.created_at).order_by(MESSAGE.id).limit(batch_size)
+        if last_id is not None:
+            statement = statement.where(MESSAGE.id > last_id)
+        messages = db.execute(statement).all()
+        if not messages:
+            return
+        last_id = messages[-1].id
+        yield messages
+
+
+async def restore_message_created_at(args):
+    # Imported here so the engine is created after load_dotenv has run
+    from api.data._db_config import SessionLocal
+    from api.data._message_metadata import payload_created_at, restore_created_at
+
+    qdrant_client = QdrantClient(collection_name=args.collection)
+    db = SessionLocal()
+    scanned = restored = unknown = 0
+    try:
+        for messages in message_pages(db, args.batch_size):
+            scanned += len(messages)
+            records = await qdrant_client.retrieve([str(message.id) for message in messages], payload_fields=["created_at"])
+            created_at = {str(record.id): payload_created_at(record.payload or {}) for record in records or []}
+            corrections = {
+                message.id: created_at[str(message.id)]
+                for message in messages
+                if created_at.get(str(message.id)) not in (None, message.created_at)
+            }
+            unknown += sum(1 for message in messages if created_at.get(str(message.id)) is None)
+            restored += restore_created_at(db, corrections)
+            db.commit()
+    finally:
+        db.close()
+        await qdrant_client.close()
+    logger.info(f"Scanned {scanned} messages, restored created_at on {restored}; {unknown} have no Qdrant created_at")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import and backfill tools for the Qdrant collection")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Upsert a JSONL corpus into Qdrant")
+    import_parser.add_argument("path", help="JSONL file with id, content, optional vector and payload per line")
+    import_parser.add_argument("--collection", default="choir")
+    import_parser.add_argument("--batch-size", type=int, default=256, help="Points per upsert request")
+    import_parser.add_argument("--parallelism", type=int, default=8, help="Upsert requests in flight")
+    import_parser.add_argument("--embed-batch-size", type=int, default=256, help="Texts per embeddings request")
+    import_parser.add_argument("--max-retries", type=int, default=3)
+    import_parser.set_defaults(handler=import_corpus)
+
+    recount_parser = subparsers.add_parser("recount-revisions", help="Backfill the revisions_count payload field")
+    recount_parser.add_argument("--collection", default="choir")
+    recount_parser.add_argument("--batch-size", type=int, default=256, help="Points scanned per scroll request")
+    recount_parser.set_defaults(handler=recount_revisions)
+
+    metadata_parser = subparsers.add_parser("project-metadata", help="Backfill message_metadata_table from Qdrant")
+    metadata_parser.add_argument("--collection", default="choir")
+    metadata_parser.add_argument("--batch-size", type=int, default=256, help="Messages per Qdrant retrieve")
+    metadata_parser.set_defaults(handler=project_metadata)
+
+    created_at_parser = subparsers.add_parser("restore-created-at", help="Backfill messages_table.created_at from Qdrant")
+    created_at_parser.add_argument("--collection", default="choir")
+    created_at_parser.add_argument("--batch-size", type=int, default=256, help="Messages per Qdrant retrieve")
+    created_at_parser.set_defaults(handler=restore_message_created_at)
+
+    args = parser.parse_args(argv)
+    return asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
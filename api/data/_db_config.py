@@ -1,12 +1,18 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from fastapi import HTTPException
 
-import time
+import math
+import asyncio
+from dataclasses import asdict
 import os
 from dotenv import load_dotenv, find_dotenv
 
+from ._db_pool import PoolSettings, instrument_engine
+from ._db_health import DatabaseAvailability, DatabaseUnavailableException
+
 _: bool = load_dotenv(find_dotenv())
 
 DB_URL = os.environ.get("DB_URL")
@@ -14,32 +20,177 @@ DB_URL = os.environ.get("DB_URL")
 if DB_URL is None:
     raise Exception("No DB_URL environment variable found")
 
-# Enable connection pooling with pessimistic testing
-engine = create_engine(DB_URL, pool_pre_ping=True)
+# Pool size, overflow, recycle, timeout and pre-ping policy come from DB_POOL_* env vars
+POOL_SETTINGS = PoolSettings.from_env()
+
+engine = create_engine(DB_URL, **POOL_SETTINGS.engine_kwargs(DB_URL))
+engine_telemetry = instrument_engine(engine, POOL_SETTINGS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers for the sync URL schemes DB_URL uses; Alembic and scripts keep the sync engine
+ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def async_db_url(url: str):
+    """
+    Map a sync database URL to its async driver, e.g. postgresql:// to postgresql+asyncpg://.
+
+    asyncpg takes ssl=<mode> instead of libpq's sslmode=<mode>, so that query option is renamed.
+    """
+    url = make_url(url)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    if url.drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        url = url.difference_update_query(["sslmode"]).update_query_dict({"ssl": url.query["sslmode"]})
+    return url
+
+
+ASYNC_DB_URL = os.environ.get("ASYNC_DB_URL") or async_db_url(DB_URL)
+
+_async_engine = None
+_async_engine_telemetry = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    """The worker's async engine, created on first use so sync-only callers never load the async driver."""
+    global _async_engine, _async_engine_telemetry
+    if _async_engine is None:
+        _async_engine = create_async_engine(ASYNC_DB_URL, **POOL_SETTINGS.engine_kwargs(ASYNC_DB_URL, is_async=True))
+        _async_engine_telemetry = instrument_engine(_async_engine.sync_engine, POOL_SETTINGS)
+    return _async_engine
+
+
+def get_async_sessionmaker():
+    global _async_session_factory
+    if _async_session_factory is None:
+        # expire_on_commit=False: attribute access after commit would otherwise need implicit async IO
+        _async_session_factory = async_sessionmaker(
+            get_async_engine(), class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory
+
+
+async def dispose_async_engine():
+    global _async_engine, _async_engine_telemetry, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_engine_telemetry = None
+    _async_session_factory = None
+
+
+def pool_metrics():
+    """Per-worker pool counters for the sync engine and, once created, the async engine."""
+    metrics = {"settings": asdict(POOL_SETTINGS), "sync": engine_telemetry.metrics()}
+    if _async_engine_telemetry is not None:
+        metrics["async"] = _async_engine_telemetry.metrics()
+    return metrics
+
+
+def listen_connection_factory():
+    """
+    Returns a coroutine function opening a dedicated asyncpg connection for LISTEN, outside the
+    pools, or None when the database is not Postgres.
+    """
+    url = make_url(ASYNC_DB_URL)
+    if url.get_backend_name() not in ("postgres", "postgresql"):
+        return None
+    url = url.set(drivername="postgresql")
+    if "ssl" in url.query:
+        # A bare asyncpg DSN only understands libpq's sslmode
+        url = url.difference_update_query(["ssl"]).update_query_dict({"sslmode": url.query["ssl"]})
+    dsn = url.render_as_string(hide_password=False)
+
+    async def connect():
+        import asyncpg
+
+        return await asyncpg.connect(dsn)
+
+    return connect
+
+
+def _ping_sync():
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+async def _ping_async():
+    async with _async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def ping_database():
+    """Ping the sync engine and, once requests have created it, the async engine too; both must answer."""
+    await asyncio.to_thread(_ping_sync)
+    if _async_engine is not None:
+        await _ping_async()
+
+
+# Shared per worker: async connect retries, the circuit breaker and its health probe
+db_availability = DatabaseAvailability.from_env(ping_database)
+
+
+def _service_unavailable(e: DatabaseUnavailableException) -> HTTPException:
+    return HTTPException(status_code=503, detail=e.detail, headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+async def _open_session():
+    db = SessionLocal()
+    try:
+        # Check out the connection up front, in a thread, so a dead database surfaces here
+        await asyncio.to_thread(db.connection)
+    except Exception:
+        db.close()
+        raise
+    return db
+
+
+# Dependency: fails fast with 503 while the database is down instead of sleeping in the event loop
+async def get_db():
+    try:
+        db = await db_availability.connect(_open_session)
+    except DatabaseUnavailableException as e:
+        raise _service_unavailable(e)
+    try:
+        yield db
+    finally:
+        await asyncio.to_thread(db.close)
+
+
+async def _open_async_session():
+    db = get_async_sessionmaker()()
+    try:
+        await db.connection()
+    except Exception:
+        await db.close()
+        raise
+    return db
+
+
+# Async dependency: queries are awaited instead of blocking the event loop
+async def get_async_db():
+    try:
+        db = await db_availability.connect(_open_async_session)
+    except DatabaseUnavailableException as e:
+        raise _service_unavailable(e)
+    try:
+        yield db
+    finally:
+        await db.close()
+
 
-# Dependency with retry mechanism for OperationalError
-def get_db():
-    attempt_count = 0
-    max_attempts = 5
-    retry_delay = 2  # seconds
-
-    while attempt_count < max_attempts:
-        db = SessionLocal()
-        try:
-            yield db
-            break  # If successful, exit the loop
-        except OperationalError as e:
-            print(f"SSL connection error occurred: {e}, retrying...")
-            attempt_count += 1
-            time.sleep(retry_delay)
-        except SQLAlchemyError as e:
-            print(f"Database error occurred: {e}")
-            break
-        finally:
-            db.close()
-
-        if attempt_count == max_attempts:
-            print("Failed to connect to the database after several attempts.")
+# Async dependency for cache-first reads: the session only checks out a connection on its first
+# query, so requests answered from a cache never touch the pool (nor wait on the circuit breaker)
+async def get_lazy_async_db():
+    db = get_async_sessionmaker()()
+    try:
+        yield db
+    finally:
+        await db.close()
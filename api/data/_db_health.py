@@ -0,0 +1,191 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the database could not be reached, as opposed to a bad query. asyncpg raises
+# socket-level errors (ConnectionRefusedError, socket.gaierror, TimeoutError: all OSError) and its
+# own connection errors unwrapped while SQLAlchemy opens a connection.
+CONNECTION_ERRORS = (OperationalError, InterfaceError, OSError, asyncio.TimeoutError)
+
+try:
+    from asyncpg.exceptions import CannotConnectNowError, PostgresConnectionError, TooManyConnectionsError
+
+    CONNECTION_ERRORS += (PostgresConnectionError, CannotConnectNowError, TooManyConnectionsError)
+except ImportError:  # asyncpg is only needed with a Postgres async engine
+    pass
+
+
+class DatabaseUnavailableException(Exception):
+    """Exception raised when the circuit breaker is open or the database could not be reached."""
+
+    def __init__(self, detail: str, retry_after: float):
+        self.detail = detail
+        self.retry_after = retry_after
+        super().__init__(detail)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive connection failures; only a successful health
+    probe closes it again. Thread-safe, since sync sessions connect from the threadpool.
+    """
+
+    def __init__(self, failure_threshold: int = 5):
+        self.failure_threshold = failure_threshold
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.opened_at is None and self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                logger.error(f"Database circuit breaker opened after {self.consecutive_failures} failures")
+
+    def close(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Database circuit breaker closed after {time.monotonic() - self.opened_at:.1f}s")
+            self.opened_at = None
+            self.consecutive_failures = 0
+
+
+class DatabaseAvailability:
+    """
+    Connection gate for the request path.
+
+    `connect` retries the first connection of a session with async exponential backoff and
+    jitter, so a database blip never blocks the event loop. Once the breaker opens, requests fail
+    immediately with DatabaseUnavailableException until the background health probe gets a
+    successful ping through.
+
+    Args:
+        ping (Callable[[], Awaitable]): Runs a trivial query, raising on failure.
+        max_attempts (int): Connection attempts per request before giving up.
+        base_backoff (float): Seconds before the first retry, doubled on each further attempt.
+        max_backoff (float): Upper bound for a single retry delay.
+        failure_threshold (int): Consecutive failures that open the breaker.
+        probe_interval (float): Seconds between health probes while the breaker is open.
+    """
+
+    def __init__(
+        self,
+        ping: Callable[[], Awaitable],
+        max_attempts: int = 3,
+        base_backoff: float = 0.1,
+        max_backoff: float = 2.0,
+        failure_threshold: int = 5,
+        probe_interval: float = 5.0,
+    ):
+        self.ping = ping
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.probe_interval = probe_interval
+        self.breaker = CircuitBreaker(failure_threshold)
+        self.retries = 0
+        self.probes = 0
+        self._task = None
+
+    @classmethod
+    def from_env(cls, ping: Callable[[], Awaitable]) -> "DatabaseAvailability":
+        return cls(
+            ping,
+            max_attempts=int(os.environ.get("DB_CONNECT_MAX_ATTEMPTS", "3")),
+            base_backoff=float(os.environ.get("DB_CONNECT_BACKOFF_SECONDS", "0.1")),
+            max_backoff=float(os.environ.get("DB_CONNECT_MAX_BACKOFF_SECONDS", "2.0")),
+            failure_threshold=int(os.environ.get("DB_BREAKER_FAILURE_THRESHOLD", "5")),
+            probe_interval=float(os.environ.get("DB_HEALTH_PROBE_INTERVAL_SECONDS", "5.0")),
+        )
+
+    def _unavailable(self) -> DatabaseUnavailableException:
+        return DatabaseUnavailableException("Database unavailable", retry_after=self.probe_interval)
+
+    async def connect(self, open_connection: Callable[[], Awaitable]):
+        """
+        Await open_connection(), retrying connection errors, and return its result.
+
+        Raises:
+            DatabaseUnavailableException: If the breaker is open or every attempt failed.
+        """
+        for attempt in range(self.max_attempts):
+            if self.breaker.is_open:
+                self.breaker.reject()
+                raise self._unavailable()
+            try:
+                result = await open_connection()
+                self.breaker.record_success()
+                return result
+            except CONNECTION_ERRORS as e:
+                self.breaker.record_failure()
+                if attempt + 1 == self.max_attempts or self.breaker.is_open:
+                    logger.error(f"Database connection failed after {attempt + 1} attempts: {e}")
+                    raise self._unavailable() from e
+                self.retries += 1
+                backoff = min(self.max_backoff, self.base_backoff * 2**attempt)
+                logger.warning(f"Database connection failed (attempt {attempt + 1}): {e}, retrying in ~{backoff}s")
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+
+    async def probe_once(self) -> bool:
+        self.probes += 1
+        try:
+            await self.ping()
+        except Exception as e:
+            logger.warning(f"Database health probe failed: {e}")
+            return False
+        self.breaker.close()
+        return True
+
+    async def run_health_probe(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            if self.breaker.is_open:
+                await self.probe_once()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_health_probe())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def metrics(self) -> dict:
+        return {
+            "breaker_open": self.breaker.is_open,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "times_opened": self.breaker.times_opened,
+            "rejected": self.breaker.rejected,
+            "retries": self.retries,
+            "probes": self.probes,
+        }
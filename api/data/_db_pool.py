@@ -0,0 +1,201 @@
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+PRE_PING_POLICIES = ("always", "never", "idle")
+
+
+@dataclass
+class PoolSettings:
+    """
+    Engine pool configuration, read from the environment so it can be sized per deployment.
+
+    With several gunicorn workers every worker gets its own pool, so Postgres sees up to
+    workers * (pool_size + max_overflow) connections for each engine.
+
+    pre_ping controls the liveness check on checkout: "always" pings every checkout, "never"
+    relies on pool_recycle and invalidation on error, and "idle" pings only connections that
+    have sat in the pool for at least pre_ping_idle_seconds.
+    """
+
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_recycle: int = 1800
+    pool_timeout: float = 30.0
+    pre_ping: str = "idle"
+    pre_ping_idle_seconds: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        pre_ping = os.environ.get("DB_POOL_PRE_PING", "idle").lower()
+        if pre_ping not in PRE_PING_POLICIES:
+            raise ValueError(f"DB_POOL_PRE_PING must be one of {', '.join(PRE_PING_POLICIES)}, got {pre_ping!r}")
+        return cls(
+            pool_size=int(os.environ.get("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+            pool_recycle=int(os.environ.get("DB_POOL_RECYCLE_SECONDS", "1800")),
+            pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "30")),
+            pre_ping=pre_ping,
+            pre_ping_idle_seconds=float(os.environ.get("DB_POOL_PRE_PING_IDLE_SECONDS", "30")),
+        )
+
+    def engine_kwargs(self, url, is_async: bool = False) -> dict:
+        """Keyword arguments for create_engine / create_async_engine."""
+        kwargs = {"pool_pre_ping": self.pre_ping == "always", "pool_recycle": self.pool_recycle}
+        if make_url(url).get_backend_name() != "sqlite":
+            # SQLite keeps its dialect's default pool; sizing only applies to QueuePool
+            kwargs.update(
+                poolclass=TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+                pool_size=self.pool_size,
+                max_overflow=self.max_overflow,
+                pool_timeout=self.pool_timeout,
+            )
+        return kwargs
+
+
+class PoolTelemetry:
+    """
+    Thread-safe counters for one engine's pool, fed by pool events and the timed pool classes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pool = None
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.pre_pings = 0
+        self.pre_ping_failures = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            metrics = {
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "soft_invalidations": self.soft_invalidations,
+                "pre_pings": self.pre_pings,
+                "pre_ping_failures": self.pre_ping_failures,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+                "wait_ms_avg": round(self.wait_seconds_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            }
+        if isinstance(self.pool, QueuePool):
+            metrics.update(
+                size=self.pool.size(),
+                checked_out=self.pool.checkedout(),
+                overflow=self.pool.overflow(),
+                idle=self.pool.checkedin(),
+            )
+        return metrics
+
+
+class _TimedPoolMixin:
+    """Records how long each checkout waited for a connection, including pool timeouts."""
+
+    telemetry: Optional[PoolTelemetry] = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            if self.telemetry is not None:
+                self.telemetry.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        if self.telemetry is not None:
+            self.telemetry.record_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a recreated pool; keep reporting into the same counters
+        pool = super().recreate()
+        pool.telemetry = self.telemetry
+        if self.telemetry is not None:
+            self.telemetry.pool = pool
+        return pool
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine, settings: PoolSettings) -> PoolTelemetry:
+    """
+    Attach telemetry and the idle pre-ping policy to a sync Engine (pass async_engine.sync_engine).
+    """
+    telemetry = PoolTelemetry()
+    telemetry.pool = engine.pool
+    if isinstance(engine.pool, _TimedPoolMixin):
+        engine.pool.telemetry = telemetry
+    dialect = engine.dialect
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        telemetry.increment("connects")
+        # A connection that was just opened needs no ping on its first checkout
+        connection_record.info["last_checkin"] = None
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        telemetry.increment("checkouts")
+        if settings.pre_ping != "idle":
+            return
+        last_checkin = connection_record.info.get("last_checkin")
+        idle_for = 0.0 if last_checkin is None else time.monotonic() - last_checkin
+        if last_checkin is None or idle_for < settings.pre_ping_idle_seconds:
+            return
+        telemetry.increment("pre_pings")
+        try:
+            alive = dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            if not dialect.is_disconnect(e, dbapi_connection, None):
+                raise
+            alive = False
+        if not alive:
+            telemetry.increment("pre_ping_failures")
+            # The pool discards this connection and retries the checkout with a fresh one
+            raise exc.DisconnectionError(f"Connection idle for {idle_for:.0f}s failed pre-ping")
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        connection_record.info["last_checkin"] = time.monotonic()
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        telemetry.increment("invalidations")
+
+    @event.listens_for(engine, "soft_invalidate")
+    def on_soft_invalidate(dbapi_connection, connection_record, exception):
+        telemetry.increment("soft_invalidations")
+
+    return telemetry
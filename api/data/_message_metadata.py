@@ -0,0 +1,111 @@
+import os
+import uuid
+import logging
+import datetime
+from typing import Iterable, Mapping, Optional
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from ._sqlalchemy_models import MESSAGE, MESSAGE_METADATA
+
+logger = logging.getLogger(__name__)
+
+# Write the message metadata projection and serve dashboards from it instead of Qdrant. Dashboards
+# then show each message's content_preview, its first MESSAGE_PREVIEW_CHARS characters, rather than
+# the full content; messages without a projection row are still read from Qdrant in full.
+MESSAGE_METADATA_PROJECTION = os.environ.get("MESSAGE_METADATA_PROJECTION", "false").lower() in ("1", "true", "yes")
+CONTENT_PREVIEW_CHARS = int(os.environ.get("MESSAGE_PREVIEW_CHARS", "280"))
+
+
+def content_preview(content: str, max_chars: int = CONTENT_PREVIEW_CHARS) -> str:
+    if len(content) <= max_chars:
+        return content
+    return content[: max_chars - 1].rstrip() + "…"
+
+
+def metadata_from_payload(message_id, user_id, created_at, payload: dict) -> dict:
+    """A message_metadata_table row from a message's Qdrant payload."""
+    voice = payload.get("voice")
+    revisions_count = payload.get("revisions_count")
+    if revisions_count is None:
+        revisions_count = len(payload.get("revisions") or [])
+    return {
+        "message_id": uuid.UUID(str(message_id)),
+        "user_id": uuid.UUID(str(user_id)),
+        "created_at": created_at,
+        "content_preview": content_preview(payload.get("content", "")),
+        "voice": None if voice is None else int(round(voice)),
+        "revisions_count": revisions_count,
+    }
+
+
+def upsert_message_metadata(db: Session, rows: Iterable[dict]) -> int:
+    """
+    Insert or refresh projection rows, without committing.
+
+    Returns:
+        int: Number of rows written.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        statement = insert(MESSAGE_METADATA)
+        statement = statement.on_conflict_do_update(
+            index_elements=[MESSAGE_METADATA.message_id],
+            set_={
+                "created_at": statement.excluded.created_at,
+                "content_preview": statement.excluded.content_preview,
+                "voice": statement.excluded.voice,
+                "revisions_count": statement.excluded.revisions_count,
+            },
+        )
+        db.execute(statement, rows)
+    else:
+        for row in rows:
+            db.merge(MESSAGE_METADATA(**row))
+    return len(rows)
+
+
+
+def payload_created_at(payload: dict) -> Optional[datetime.datetime]:
+    """
+    A message's creation time from its Qdrant payload, as the naive UTC messages_table stores.
+
+    Payloads without an offset were written with datetime.now(), so they are read in the local
+    time zone: run backfills with the TZ of the hosts that wrote them.
+    """
+    created_at = payload.get("created_at")
+    if not created_at:
+        return None
+    try:
+        created_at = datetime.datetime.fromisoformat(created_at)
+    except (TypeError, ValueError):
+        return None
+    return created_at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def restore_created_at(db: Session, created_at_by_id: Mapping) -> int:
+    """
+    Set messages_table.created_at, and the projection's copy of it, to the given times, without
+    committing. Rows added by the created_at migration hold the migration time until this runs.
+
+    Returns:
+        int: Number of messages updated.
+    """
+    if not created_at_by_id:
+        return 0
+    ids = [uuid.UUID(str(message_id)) for message_id in created_at_by_id]
+    times = list(created_at_by_id.values())
+    db.execute(update(MESSAGE), [{"id": i, "created_at": t} for i, t in zip(ids, times)])
+    # Only messages with a projection row have a copy to update
+    projected = set(db.scalars(select(MESSAGE_METADATA.message_id).where(MESSAGE_METADATA.message_id.in_(ids))))
+    rows = [{"message_id": i, "created_at": t} for i, t in zip(ids, times) if i in projected]
+    if rows:
+        db.execute(update(MESSAGE_METADATA), rows)
+    return len(ids)
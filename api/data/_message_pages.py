@@ -0,0 +1,84 @@
+import uuid
+import base64
+import binascii
+import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+
+from ._sqlalchemy_models import MESSAGE, MESSAGE_METADATA
+
+
+class InvalidCursorException(Exception):
+    """Exception raised when a page cursor cannot be decoded."""
+
+
+def encode_cursor(created_at: datetime.datetime, message_id) -> str:
+    raw = f"{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, message_id = raw.split("|")
+        created_at = datetime.datetime.fromisoformat(created_at)
+        if created_at.tzinfo is not None:
+            # created_at columns are naive UTC; asyncpg refuses to compare them with aware values
+            created_at = created_at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return created_at, uuid.UUID(message_id)
+    except (ValueError, binascii.Error) as e:
+        raise InvalidCursorException(f"Invalid cursor: {cursor!r}") from e
+
+
+def _keyset_page(statement, created_at_column, id_column, limit: int, cursor: Optional[str]):
+    if cursor:
+        created_at, message_id = decode_cursor(cursor)
+        statement = statement.where(
+            or_(created_at_column < created_at, and_(created_at_column == created_at, id_column < message_id))
+        )
+    return statement.order_by(created_at_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def message_page_statement(user_id, limit: int, cursor: Optional[str] = None):
+    """
+    One page of a user's message ids, newest first, keyed on (created_at, id).
+
+    Seeks past the cursor through ix_messages_user_created instead of an OFFSET, so every page
+    costs the same however deep it is. Selects limit + 1 rows to tell whether another page follows.
+
+    Raises:
+        InvalidCursorException: If the cursor cannot be decoded.
+    """
+    statement = select(MESSAGE.id, MESSAGE.created_at).where(MESSAGE.user_id == uuid.UUID(str(user_id)))
+    return _keyset_page(statement, MESSAGE.created_at, MESSAGE.id, limit, cursor)
+
+
+def metadata_page_statement(user_id, limit: int, cursor: Optional[str] = None):
+    """
+    Same page as message_page_statement, joined with the message metadata projection, so the rows
+    carry everything the dashboard shows. Cursors are interchangeable between the two.
+
+    The page is still keyed on messages_table: a message without a projection row (created with
+    the projection disabled and not yet backfilled) is kept, with content_preview, voice and
+    revisions_count all None.
+    """
+    statement = (
+        select(
+            MESSAGE.id,
+            MESSAGE.created_at,
+            MESSAGE_METADATA.content_preview,
+            MESSAGE_METADATA.voice,
+            MESSAGE_METADATA.revisions_count,
+        )
+        .outerjoin(MESSAGE_METADATA, MESSAGE_METADATA.message_id == MESSAGE.id)
+        .where(MESSAGE.user_id == uuid.UUID(str(user_id)))
+    )
+    return _keyset_page(statement, MESSAGE.created_at, MESSAGE.id, limit, cursor)
+
+
+def split_page(rows, limit: int) -> Tuple[List, Optional[str]]:
+    """Returns (rows, next_cursor) from the rows of a page statement; the cursor is None on the last page."""
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1].created_at, page[-1].id) if len(rows) > limit else None
+    return page, next_cursor
@@ -0,0 +1,95 @@
+import uuid
+import logging
+from collections import defaultdict
+from typing import Iterable, Tuple
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ._sqlalchemy_models import REWARD_EVENT, utcnow
+from ._voice_balances import apply_voice_rewards
+
+logger = logging.getLogger(__name__)
+
+
+def _insert_ignoring_duplicates(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return pg_insert(REWARD_EVENT).on_conflict_do_nothing(constraint="uq_reward_events_source_message")
+    if dialect == "sqlite":
+        return sqlite_insert(REWARD_EVENT).on_conflict_do_nothing()
+    return insert(REWARD_EVENT)
+
+
+def _as_uuid(value) -> uuid.UUID:
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+
+
+def enqueue_reward_events(db: Session, source_message_id, rewards: Iterable[Tuple]) -> int:
+    """
+    Append reward events to the queue table, without committing.
+
+    Args:
+        db (Session): Session whose transaction the insert joins.
+        source_message_id: The new message whose search surfaced the rewarded messages.
+        rewards: (message_id, author_id, amount) tuples. Ids may be UUIDs or their strings.
+
+    Returns:
+        int: Number of events submitted. Events already queued for the same source and message are skipped.
+    """
+    source_message_id = _as_uuid(source_message_id)
+    rows = [
+        {
+            "source_message_id": source_message_id,
+            "message_id": _as_uuid(message_id),
+            "author_id": _as_uuid(author_id),
+            "amount": amount,
+        }
+        for message_id, author_id, amount in rewards
+    ]
+    if rows:
+        db.execute(_insert_ignoring_duplicates(db), rows)
+    return len(rows)
+
+
+def settle_reward_events(db: Session, batch_size: int = 500) -> int:
+    """
+    Settle one batch of pending reward events and commit.
+
+    The balance update and marking the events settled happen in one transaction, so a batch that
+    fails is retried in full and a committed batch is never applied twice. Fractional amounts are
+    carried per author in voice_remainder, so the voice credited does not depend on the batch size. Concurrent settlers skip
+    rows locked by each other (FOR UPDATE SKIP LOCKED on Postgres).
+
+    Returns:
+        int: Number of events settled.
+    """
+    try:
+        events = db.execute(
+            select(REWARD_EVENT.id, REWARD_EVENT.author_id, REWARD_EVENT.amount)
+            .where(REWARD_EVENT.settled_at.is_(None))
+            .order_by(REWARD_EVENT.created_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not events:
+            db.rollback()
+            return 0
+
+        voice_rewards = defaultdict(float)
+        for event in events:
+            voice_rewards[event.author_id] += event.amount
+        apply_voice_rewards(db, voice_rewards)
+
+        db.execute(
+            update(REWARD_EVENT)
+            .where(REWARD_EVENT.id.in_([event.id for event in events]))
+            .values(settled_at=utcnow())
+        )
+        db.commit()
+        logger.info(f"Settled {len(events)} reward events for {len(voice_rewards)} authors")
+        return len(events)
+    except Exception:
+        db.rollback()
+        raise
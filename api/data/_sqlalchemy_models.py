@@ -1,19 +1,38 @@
 from sqlalchemy.orm import mapped_column, DeclarativeBase, Mapped, relationship
-from sqlalchemy import String, Boolean, UUID, DateTime, Text, ForeignKey, Integer
+from sqlalchemy import String, Boolean, UUID, DateTime, Text, ForeignKey, Integer, Float, Index, UniqueConstraint, func, text
 
 import datetime
 import uuid
 
 
+def utcnow() -> datetime.datetime:
+    """
+    Current UTC time as a naive datetime, matching the `timestamp without time zone` columns.
+
+    asyncpg rejects timezone-aware values for those columns, so bind this rather than
+    datetime.now(timezone.utc).
+    """
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
 class Base(DeclarativeBase):
     pass
 
 
 class MESSAGE(Base):
     __tablename__ = "messages_table"
+    # Dashboard pages walk a user's messages newest first by (created_at, id)
+    __table_args__ = (Index("ix_messages_user_created", "user_id", "created_at"),)
+
     id: Mapped[UUID] = mapped_column(UUID, primary_key=True, index=True, default=uuid.uuid4)
 
     user_id: Mapped[UUID] = mapped_column(UUID, ForeignKey("users_table.id", ondelete="CASCADE"), nullable=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime,
+        nullable=False,
+        default=utcnow,
+        server_default=func.now(),
+    )
     user: Mapped["USER"] = relationship("USER", back_populates="messages")
 
 
@@ -31,14 +50,70 @@ class USER(Base):
     hashed_password: Mapped[str] = mapped_column(String, index=True)
     email_verified: Mapped[bool] = mapped_column(Boolean, default=False)
     voice: Mapped[int] = mapped_column(Integer, default=0)
+    # Fractional reward voice not yet credited to `voice`, carried between settlement batches
+    voice_remainder: Mapped[float] = mapped_column(Float, nullable=False, default=0.0, server_default="0")
 
     created_at: Mapped[datetime.datetime] = mapped_column(
-        DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc)
+        DateTime, default=utcnow
     )
     updated_at: Mapped[datetime.datetime] = mapped_column(
         DateTime,
-        default=lambda: datetime.datetime.now(datetime.timezone.utc),
-        onupdate=lambda: datetime.datetime.now(datetime.timezone.utc),
+        default=utcnow,
+        onupdate=utcnow,
     )
 
     messages = relationship("MESSAGE", back_populates="user")
+
+
+class REWARD_EVENT(Base):
+    """
+    A voice reward owed to the author of a message that was relevant to a new message.
+
+    Events are appended on the request path and settled into users_table.voice in batches by the
+    reward settlement worker. (source_message_id, message_id) is unique so re-enqueueing the same
+    reward is a no-op, and settled_at is set in the same transaction as the balance update.
+    """
+
+    __tablename__ = "reward_events_table"
+    __table_args__ = (
+        UniqueConstraint("source_message_id", "message_id", name="uq_reward_events_source_message"),
+        Index(
+            "ix_reward_events_unsettled",
+            "created_at",
+            postgresql_where=text("settled_at IS NULL"),
+            sqlite_where=text("settled_at IS NULL"),
+        ),
+    )
+
+    id: Mapped[UUID] = mapped_column(UUID, primary_key=True, default=uuid.uuid4)
+    source_message_id: Mapped[UUID] = mapped_column(UUID, nullable=False)
+    message_id: Mapped[UUID] = mapped_column(UUID, nullable=False)
+    author_id: Mapped[UUID] = mapped_column(UUID, ForeignKey("users_table.id", ondelete="CASCADE"), nullable=False)
+    amount: Mapped[float] = mapped_column(Float, nullable=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, default=utcnow
+    )
+    settled_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True)
+
+
+class MESSAGE_METADATA(Base):
+    """
+    Optional Postgres-side projection of a message's Qdrant payload, for serving dashboards
+    without a Qdrant round trip. Qdrant stays the source of truth and is only needed for
+    similarity search.
+
+    Written with the messages_table row by create_message when the projection is enabled, and
+    filled in for older messages by `python -m api.backfill project-metadata`; no other write path
+    maintains it. Dashboards fall back to Qdrant for messages that have no row. content_preview
+    holds only the first MESSAGE_PREVIEW_CHARS characters of the content.
+    """
+
+    __tablename__ = "message_metadata_table"
+    __table_args__ = (Index("ix_message_metadata_user_created", "user_id", "created_at"),)
+
+    message_id: Mapped[UUID] = mapped_column(UUID, ForeignKey("messages_table.id", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[UUID] = mapped_column(UUID, ForeignKey("users_table.id", ondelete="CASCADE"), nullable=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime, nullable=False)
+    content_preview: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    voice: Mapped[int] = mapped_column(Integer, nullable=True)
+    revisions_count: Mapped[int] = mapped_column(Integer, nullable=True)
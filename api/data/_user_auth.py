@@ -1,9 +1,11 @@
 from typing import Union
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ._sqlalchemy_models import USER
 from ..models._user_auth import RegisterUser
-from ..utils._helpers import get_password_hash
+from ..utils._helpers import get_password_hash_async
 
 
 class InvalidUserException(Exception):
@@ -26,7 +28,18 @@ def get_user(db, username: Union[str, None] = None):
 
     if not user:
         raise InvalidUserException(status_code=404, detail="User not found")
-    print("user", user)
+    return user
+
+
+async def get_user_async(db: AsyncSession, username: Union[str, None] = None):
+
+    if username is None:
+        raise InvalidUserException(status_code=404, detail="Username not provided")
+
+    user = (await db.execute(select(USER).where(USER.username == username))).scalars().first()
+
+    if not user:
+        raise InvalidUserException(status_code=404, detail="User not found")
     return user
 
 
@@ -39,7 +52,7 @@ async def db_signup_users(user_data: RegisterUser, db: Session):
         raise InvalidUserException(status_code=400, detail="Email or username already registered")
 
     # Hash the password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
 
     # Create new user instance
     new_user = USER(
@@ -56,3 +69,29 @@ async def db_signup_users(user_data: RegisterUser, db: Session):
 
     # Return the new user data
     return new_user
+
+
+async def db_signup_users_async(user_data: RegisterUser, db: AsyncSession):
+    existing_user = (
+        (
+            await db.execute(
+                select(USER).where((USER.username == user_data.username) | (USER.email == user_data.email))
+            )
+        )
+        .scalars()
+        .first()
+    )
+    if existing_user:
+        raise InvalidUserException(status_code=400, detail="Email or username already registered")
+
+    new_user = USER(
+        username=user_data.username,
+        email=user_data.email,
+        full_name=user_data.full_name,
+        hashed_password=await get_password_hash_async(user_data.password),
+    )
+
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    return new_user
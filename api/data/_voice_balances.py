@@ -0,0 +1,150 @@
+import math
+import uuid
+import logging
+from collections import defaultdict
+from typing import Iterable, Mapping, Tuple, Union
+
+from sqlalchemy import Integer, bindparam, case, func, select, update
+from sqlalchemy import UUID as SA_UUID
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+
+from ._sqlalchemy_models import USER
+
+logger = logging.getLogger(__name__)
+
+VoiceDeltas = Union[Mapping, Iterable[Tuple[object, int]]]
+
+# NOTIFY channel telling every worker's BalanceCache which users' balances changed
+BALANCE_CHANNEL = "user_balances"
+# Postgres caps a NOTIFY payload at 8000 bytes; a UUID plus separator is 37
+_NOTIFY_IDS_PER_PAYLOAD = 200
+
+
+def _as_uuid(user_id) -> uuid.UUID:
+    return user_id if isinstance(user_id, uuid.UUID) else uuid.UUID(str(user_id))
+
+
+def aggregate_voice_deltas(deltas: VoiceDeltas) -> dict:
+    """Sum (user_id, delta) pairs per user so each row is touched once; zero totals are dropped."""
+    pairs = deltas.items() if isinstance(deltas, Mapping) else deltas
+    totals = defaultdict(int)
+    for user_id, delta in pairs:
+        totals[_as_uuid(user_id)] += int(delta)
+    return {user_id: delta for user_id, delta in totals.items() if delta}
+
+
+def voice_deltas_statement(dialect_name: str, totals: dict):
+    """
+    Build the single UPDATE that adds each delta to users_table.voice.
+
+    Postgres joins against unnest() of two array parameters, so the statement and its parameter
+    count stay the same size however many users are updated. Other dialects use an IN list with a
+    CASE on the id.
+    """
+    if dialect_name == "postgresql":
+        deltas = (
+            func.unnest(
+                bindparam("user_ids", list(totals), type_=ARRAY(SA_UUID)),
+                bindparam("deltas", list(totals.values()), type_=ARRAY(Integer)),
+            )
+            .table_valued("user_id", "delta")
+            .render_derived(name="deltas")
+        )
+        return update(USER).where(USER.id == deltas.c.user_id).values(voice=USER.voice + deltas.c.delta)
+    return update(USER).where(USER.id.in_(list(totals))).values(voice=USER.voice + case(totals, value=USER.id, else_=0))
+
+
+def notify_balance_change(db: Session, user_ids, origin: str = ""):
+    """
+    Queue a NOTIFY on BALANCE_CHANNEL for user_ids, without committing. Postgres delivers it
+    when the transaction commits, and drops it on rollback. A no-op on other databases.
+
+    The payload is "<origin>:<id>,<id>,...". A worker that already wrote the change through to
+    its own cache passes its origin token so it can skip its own notification.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    user_ids = [str(_as_uuid(user_id)) for user_id in user_ids]
+    for start in range(0, len(user_ids), _NOTIFY_IDS_PER_PAYLOAD):
+        payload = f"{origin}:{','.join(user_ids[start : start + _NOTIFY_IDS_PER_PAYLOAD])}"
+        db.execute(select(func.pg_notify(BALANCE_CHANNEL, payload)))
+
+
+def apply_voice_deltas(db: Session, deltas: VoiceDeltas, origin: str = "") -> dict:
+    """
+    Atomically add any number of (user_id, delta) pairs to voice balances in one statement, without committing.
+
+    The increment is computed by the database (voice = voice + delta), so concurrent callers
+    rewarding the same user never overwrite each other's updates.
+
+    Args:
+        db (Session): Session whose transaction the update joins.
+        deltas (VoiceDeltas): Mapping of user_id to delta, or an iterable of (user_id, delta) pairs.
+            Repeated user_ids are summed.
+        origin (str): Cache origin token of the caller, passed on to notify_balance_change.
+
+    Returns:
+        dict: The per-user totals that were applied.
+    """
+    totals = aggregate_voice_deltas(deltas)
+    if totals:
+        # The callers commit straight after, which expires loaded users, so skip the ORM's
+        # evaluate/fetch step and its extra SELECT
+        result = db.execute(
+            voice_deltas_statement(db.get_bind().dialect.name, totals),
+            execution_options={"synchronize_session": False},
+        )
+        if result.rowcount != len(totals):
+            logger.warning(f"Voice update matched {result.rowcount} of {len(totals)} users")
+        notify_balance_change(db, totals, origin)
+    return totals
+
+
+def apply_voice_increments(db: Session, voice_rewards: dict, origin: str = "") -> dict:
+    """
+    Add each user's reward to their voice balance in a single UPDATE statement, without committing.
+
+    Args:
+        db (Session): Session whose transaction the update joins.
+        voice_rewards (dict): Mapping of user_id to the voice to add; fractional rewards are floored.
+
+    Returns:
+        dict: The integer increments that were applied.
+    """
+    increments = {user_id: math.floor(voice_reward) for user_id, voice_reward in voice_rewards.items()}
+    apply_voice_deltas(db, increments, origin)
+    return increments
+
+
+def apply_voice_rewards(db: Session, voice_rewards: dict, origin: str = "") -> dict:
+    """
+    Credit fractional rewards without losing the fractions, without committing.
+
+    Each user's reward is added to the remainder carried in users_table.voice_remainder; the whole
+    part goes to voice and the rest stays in voice_remainder. So 1.5 and 1.7 credit 3 voice
+    whether they are settled together or in separate batches. The users' rows are locked
+    (FOR UPDATE on Postgres) so concurrent settlers cannot both carry the same remainder.
+
+    Args:
+        db (Session): Session whose transaction the update joins.
+        voice_rewards (dict): Mapping of user_id to the voice to add.
+
+    Returns:
+        dict: The integer increments that were applied.
+    """
+    rewards = {_as_uuid(user_id): reward for user_id, reward in voice_rewards.items()}
+    if not rewards:
+        return {}
+    remainders = db.execute(
+        select(USER.id, USER.voice_remainder).where(USER.id.in_(list(rewards))).with_for_update()
+    ).all()
+    increments, carried = {}, []
+    for user_id, remainder in remainders:
+        # Rounded so float drift cannot turn 3.0 into 2.9999999 and withhold a point
+        total = round((remainder or 0.0) + rewards[user_id], 9)
+        increments[user_id] = math.floor(total)
+        carried.append({"id": user_id, "voice_remainder": total - increments[user_id]})
+    db.execute(update(USER), carried)
+    apply_voice_deltas(db, increments, origin)
+    return increments
@@ -0,0 +1,196 @@
+import os
+import uuid
+import random
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Iterable, Optional
+
+from ..utils._cache import LRUCache
+from ._voice_balances import BALANCE_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+
+def _key(user_id) -> str:
+    return str(user_id if isinstance(user_id, uuid.UUID) else uuid.UUID(str(user_id)))
+
+
+class BalanceCache:
+    """
+    Per-worker cache of each user's dashboard summary: voice balance and message count.
+
+    Writes made by this worker invalidate the entries of the users they touched right after the
+    commit. Entries are dropped rather than adjusted by the write's delta: a read that queried
+    after the commit but stored its result before the invalidation already holds the new value,
+    and adding the delta to it would count the write twice. Writes made anywhere else arrive as
+    Postgres NOTIFYs on BALANCE_CHANNEL and invalidate the entries they name (see
+    BalanceInvalidationListener).
+    While a required listener is not connected, the cache serves nothing, since it could miss
+    invalidations. The TTL bounds staleness if a notification is ever lost.
+
+    As in SearchResultCache, a version counter bumped on every write and invalidation keeps a
+    read that raced a write from storing its stale result. Entries are dropped per user, so one
+    user's write leaves every other cached summary in place.
+
+    Args:
+        max_size (int): Maximum number of cached users per worker.
+        ttl (float): Seconds an entry is served for.
+        requires_listener (bool): Only serve entries while the invalidation listener is connected.
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 30.0, requires_listener: bool = False):
+        self._cache = LRUCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self.requires_listener = requires_listener
+        self.listening = False
+        # Identifies this worker's own NOTIFYs, whose users it has already invalidated
+        self.origin = uuid.uuid4().hex
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["BalanceCache"]:
+        """Build from BALANCE_CACHE_SIZE and BALANCE_CACHE_TTL_SECONDS; a size or TTL of 0 disables the cache."""
+        max_size = int(os.environ.get("BALANCE_CACHE_SIZE", "10000"))
+        ttl = float(os.environ.get("BALANCE_CACHE_TTL_SECONDS", "30"))
+        if max_size <= 0 or ttl <= 0:
+            return None
+        return cls(max_size=max_size, ttl=ttl)
+
+    @property
+    def serving(self) -> bool:
+        return self.listening or not self.requires_listener
+
+    def get(self, user_id) -> Optional[dict]:
+        summary = self._cache.get(_key(user_id)) if self.serving else None
+        if summary is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(summary)
+
+    def set(self, user_id, summary: dict, version: int):
+        """Store a summary read while the cache was at `version` (read it before querying)."""
+        with self._lock:
+            if version == self.version:
+                self._cache.set(_key(user_id), dict(summary))
+
+    def invalidate(self, user_ids: Optional[Iterable] = None):
+        """Drop the given users' entries, or every entry when user_ids is None."""
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            if user_ids is None:
+                self._cache.clear()
+                return
+            for user_id in user_ids:
+                self._cache.delete(_key(user_id))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "max_size": self._cache.max_size,
+            "serving": self.serving,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+class BalanceInvalidationListener:
+    """
+    Background task that LISTENs on BALANCE_CHANNEL over a dedicated connection and invalidates
+    the BalanceCache entries named by other workers' NOTIFYs.
+
+    The cache is switched to requires_listener, so it only serves while the LISTEN is active.
+    Every (re)connect clears the cache, because anything committed while disconnected went
+    unnoticed. Reconnects back off exponentially with jitter.
+
+    Args:
+        cache (BalanceCache): Cache to invalidate.
+        connect (Callable[[], Awaitable]): Opens an asyncpg connection.
+        check_interval (float): Seconds between checks that the connection is still open.
+        base_backoff (float): Seconds before the first reconnect, doubled on each further attempt.
+        max_backoff (float): Upper bound for a single reconnect delay.
+    """
+
+    def __init__(
+        self,
+        cache: BalanceCache,
+        connect: Callable[[], Awaitable],
+        check_interval: float = 5.0,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        self.cache = cache
+        self.cache.requires_listener = True
+        self.connect = connect
+        self.check_interval = check_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.notifications = 0
+        self.own_notifications = 0
+        self.reconnects = 0
+        self._task = None
+
+    def on_notification(self, connection, pid, channel, payload: str):
+        origin, _, user_ids = payload.partition(":")
+        if origin and origin == self.cache.origin:
+            self.own_notifications += 1
+            return
+        self.notifications += 1
+        self.cache.invalidate([user_id for user_id in user_ids.split(",") if user_id] or None)
+
+    async def run(self):
+        attempt = 0
+        while True:
+            connection = None
+            try:
+                connection = await self.connect()
+                await connection.add_listener(BALANCE_CHANNEL, self.on_notification)
+                self.cache.invalidate()
+                self.cache.listening = True
+                attempt = 0
+                while not connection.is_closed():
+                    await asyncio.sleep(self.check_interval)
+                raise ConnectionError("LISTEN connection closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.cache.listening = False
+                self.reconnects += 1
+                backoff = min(self.max_backoff, self.base_backoff * 2**attempt)
+                attempt += 1
+                logger.warning(f"Balance cache listener disconnected: {e}, reconnecting in ~{backoff:.1f}s")
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+            finally:
+                self.cache.listening = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def metrics(self) -> dict:
+        return {
+            "listening": self.cache.listening,
+            "notifications": self.notifications,
+            "own_notifications": self.own_notifications,
+            "reconnects": self.reconnects,
+        }
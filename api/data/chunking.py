@@ -0,0 +1,221 @@
+import os
+import bisect
+import logging
+import itertools
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .openai_client import OpenAIClient, EMBEDDING_MODEL
+
+try:
+    import tiktoken
+except ImportError:  # listed in requirements.txt; without it token counts fall back to UTF-8 byte counts
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+POOLING_STRATEGIES = ("mean", "max", "first")
+
+# text-embedding-ada-002 accepts 8191 tokens per input; leave headroom for tokenizer drift
+MAX_INPUT_TOKENS = 8000
+# The embeddings endpoint caps a request at 2048 inputs and 300k tokens in total
+MAX_REQUEST_INPUTS = 2048
+MAX_REQUEST_TOKENS = 250_000
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(model_name: str):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads encodings on first use; without network access fall back to estimates
+        logger.warning(f"Could not load tiktoken encoding for {model_name}, estimating tokens instead: {e}")
+        return None
+
+
+def _encoding(model_name: str):
+    if tiktoken is None:
+        return None
+    return _load_encoding(model_name)
+
+
+def max_token_count(text: str) -> int:
+    """
+    Upper bound on the token count of text under any byte-level BPE: a token covers at least one
+    UTF-8 byte. A character can be several tokens (CJK, emoji), so characters are no bound.
+    """
+    return len(text.encode("utf-8"))
+
+
+def count_tokens(text: str, model_name: str = EMBEDDING_MODEL) -> int:
+    """Exact token count with tiktoken, else the conservative max_token_count."""
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return max_token_count(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _byte_windows(text: str, size: int, overlap: int) -> List[str]:
+    # offsets[i] is the number of UTF-8 bytes before character i, so text[a:b] spans offsets[b] - offsets[a]
+    offsets = [0, *itertools.accumulate(len(char.encode("utf-8")) for char in text)]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = max(bisect.bisect_right(offsets, offsets[start] + size) - 1, start + 1)
+        if end < len(text):
+            # Prefer to cut at whitespace in the last fifth of the window
+            cut = text.rfind(" ", start + (end - start) * 4 // 5, end)
+            end = cut if cut > start else end
+        chunks.append(text[start:end])
+        if end == len(text):
+            break
+        start = max(bisect.bisect_left(offsets, offsets[end] - overlap), start + 1)
+    return chunks
+
+
+def chunk_by_tokens(
+    text: str, max_tokens: int = MAX_INPUT_TOKENS, overlap_tokens: int = 200, model_name: str = EMBEDDING_MODEL
+) -> List[str]:
+    """
+    Split text into windows of at most max_tokens tokens, consecutive windows sharing overlap_tokens.
+
+    Uses the model's tiktoken encoding, so windows end on token boundaries and never exceed the
+    model's input limit. If tiktoken is missing, windows are sized by UTF-8 bytes, an upper bound
+    on tokens, so they stay under the limit for any script; they are cut at whitespace where possible.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+    encoding = _encoding(model_name)
+    if encoding is None:
+        return _byte_windows(text, max_tokens, overlap_tokens) or [text]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return [text]
+    step = max_tokens - overlap_tokens
+    return [encoding.decode(tokens[start : start + max_tokens]) for start in range(0, len(tokens) - overlap_tokens, step)]
+
+
+def pool_vectors(vectors: Sequence[Sequence[float]], strategy: str = "mean", weights: Optional[Sequence[float]] = None):
+    """
+    Combine chunk embeddings into one vector.
+
+    mean averages the chunks (weighted by `weights`, e.g. token counts, when given), max takes the
+    element-wise maximum and first keeps the first chunk. The result is L2-normalized like the
+    model's own embeddings, so cosine scores stay comparable with unchunked texts.
+    """
+    if strategy not in POOLING_STRATEGIES:
+        raise ValueError(f"Unknown pooling strategy {strategy!r}, expected one of {', '.join(POOLING_STRATEGIES)}")
+    matrix = np.asarray(vectors, dtype=np.float64)
+    if matrix.ndim != 2 or len(matrix) == 0:
+        raise ValueError(f"Expected a non-empty list of vectors, got shape {matrix.shape}")
+    if strategy == "mean":
+        pooled = np.average(matrix, axis=0, weights=weights)
+    elif strategy == "max":
+        pooled = matrix.max(axis=0)
+    else:
+        pooled = matrix[0]
+    norm = np.linalg.norm(pooled)
+    return (pooled / norm if norm > 0 else pooled).tolist()
+
+
+def as_point_vector(embedding) -> List[float]:
+    """Validate that an embedding is a single flat vector before it is written as a point."""
+    vector = np.asarray(embedding, dtype=np.float64)
+    if vector.ndim != 1 or len(vector) == 0:
+        raise ValueError(f"A point needs one flat vector, got an embedding of shape {vector.shape}; pool chunk vectors first")
+    return vector.tolist()
+
+
+class ChunkedEmbedder:
+    """
+    Embeds texts of any length: inputs are split on token boundaries and all chunks are sent in as
+    few embeddings requests as the API limits allow, usually one.
+
+    Args:
+        openai_client (OpenAIClient): Client used for the embeddings requests.
+        model_name (str): Embedding model.
+        max_tokens (int): Maximum tokens per chunk.
+        overlap_tokens (int): Tokens shared by consecutive chunks.
+        pooling (str): Default strategy used by embed(); one of mean, max, first.
+    """
+
+    def __init__(
+        self,
+        openai_client: OpenAIClient,
+        model_name: str = EMBEDDING_MODEL,
+        max_tokens: int = MAX_INPUT_TOKENS,
+        overlap_tokens: int = 200,
+        pooling: str = "mean",
+    ):
+        if pooling not in POOLING_STRATEGIES:
+            raise ValueError(f"Unknown pooling strategy {pooling!r}, expected one of {', '.join(POOLING_STRATEGIES)}")
+        self.openai_client = openai_client
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.pooling = pooling
+        self.requests_sent = 0
+        self.chunks_embedded = 0
+
+    @classmethod
+    def from_env(cls, openai_client: OpenAIClient) -> "ChunkedEmbedder":
+        return cls(
+            openai_client,
+            max_tokens=int(os.environ.get("EMBEDDING_CHUNK_MAX_TOKENS", str(MAX_INPUT_TOKENS))),
+            overlap_tokens=int(os.environ.get("EMBEDDING_CHUNK_OVERLAP_TOKENS", "200")),
+            pooling=os.environ.get("EMBEDDING_POOLING", "mean"),
+        )
+
+    def needs_chunking(self, text: str) -> bool:
+        # Cheap upper bound first; only long texts pay for an exact token count
+        if max_token_count(text) <= self.max_tokens:
+            return False
+        return count_tokens(text, self.model_name) > self.max_tokens
+
+    def chunk(self, text: str) -> List[str]:
+        return chunk_by_tokens(text, self.max_tokens, self.overlap_tokens, self.model_name)
+
+    async def embed_chunks(self, text: str):
+        """
+        Returns (chunks, vectors) with one vector per chunk.
+
+        Raises:
+            RuntimeError: If an embeddings request fails.
+        """
+        chunks = self.chunk(text)
+        vectors = []
+        for request in self._requests(chunks):
+            self.requests_sent += 1
+            response = await self.openai_client.embed_many(request, self.model_name)
+            if response is None:
+                raise RuntimeError(f"Failed to embed {len(request)} chunks")
+            vectors.extend(response)
+        self.chunks_embedded += len(chunks)
+        return chunks, vectors
+
+    def _requests(self, chunks: List[str]):
+        request, request_tokens = [], 0
+        for chunk in chunks:
+            tokens = min(self.max_tokens, max_token_count(chunk))
+            if request and (len(request) >= MAX_REQUEST_INPUTS or request_tokens + tokens > MAX_REQUEST_TOKENS):
+                yield request
+                request, request_tokens = [], 0
+            request.append(chunk)
+            request_tokens += tokens
+        if request:
+            yield request
+
+    async def embed(self, text: str, pooling: Optional[str] = None) -> List[float]:
+        """One vector for the whole text, pooling the chunk vectors."""
+        chunks, vectors = await self.embed_chunks(text)
+        if len(vectors) == 1:
+            return vectors[0]
+        return pool_vectors(vectors, pooling or self.pooling, weights=[len(chunk) for chunk in chunks])
+
+    def stats(self) -> dict:
+        return {"requests_sent": self.requests_sent, "chunks_embedded": self.chunks_embedded}
@@ -0,0 +1,90 @@
+import os
+import logging
+from fastapi import Request
+
+from .openai_client import OpenAIClient
+from .qdrant_client import QdrantClient
+from .embedding_cache import EmbeddingCache
+from .embedding_batcher import EmbeddingBatcher
+from .chunking import ChunkedEmbedder
+from .observation_writer import ObservationWriter
+from .search_cache import SearchResultCache
+from .semantic_cache import SemanticSearchCache
+from .balance_cache import BalanceCache
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """
+    Holds the OpenAI and Qdrant clients for one worker process.
+
+    The wrapped AsyncOpenAI / AsyncQdrantClient instances keep their own keep-alive
+    connection pools, so a single registry is created in the app lifespan and shared
+    by every request instead of building new clients per request.
+    """
+
+    def __init__(
+        self,
+        openai_client: OpenAIClient = None,
+        qdrant_client: QdrantClient = None,
+        embedding_cache: EmbeddingCache = None,
+    ):
+        self.openai_client = openai_client if openai_client else OpenAIClient()
+        self.qdrant_client = qdrant_client if qdrant_client else QdrantClient()
+        self.embedding_cache = embedding_cache if embedding_cache else EmbeddingCache.from_env()
+        self.embedding_batcher = EmbeddingBatcher.from_env(self.openai_client)
+        self.chunked_embedder = ChunkedEmbedder.from_env(self.openai_client)
+        self.search_cache = SearchResultCache.from_env()
+        self.semantic_cache = SemanticSearchCache.from_env()
+        self.balance_cache = BalanceCache.from_env()
+        self.observation_writer = ObservationWriter.from_env(
+            self.qdrant_client,
+            self.embedding_batcher,
+            chunked_embedder=self.chunked_embedder,
+            on_write=self.invalidate_search_caches,
+        )
+        logger.info("ClientRegistry initialized")
+
+    def invalidate_search_caches(self):
+        """Called after this worker writes points, so cached search hits never predate the write."""
+        for cache in (self.search_cache, self.semantic_cache):
+            if cache is not None:
+                cache.invalidate()
+
+    async def start(self):
+        await self.observation_writer.start()
+
+    async def close(self):
+        await self.observation_writer.stop()
+        await self.embedding_batcher.close()
+        await self.openai_client.close()
+        await self.qdrant_client.close()
+        self.embedding_cache.close()
+        logger.info("ClientRegistry closed")
+
+    def metrics(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "embedding_cache": self.embedding_cache.stats(),
+            "embedding_batcher": self.embedding_batcher.stats(),
+            "chunked_embedder": self.chunked_embedder.stats(),
+            "search_cache": self.search_cache.stats() if self.search_cache else None,
+            "semantic_cache": self.semantic_cache.stats() if self.semantic_cache else None,
+            "balance_cache": self.balance_cache.stats() if self.balance_cache else None,
+            "observation_writer": self.observation_writer.metrics(),
+        }
+
+
+def get_clients(request: Request) -> ClientRegistry:
+    """
+    Dependency returning the registry created by the app lifespan.
+
+    Falls back to creating (and storing) one when the lifespan has not run, e.g. when the
+    app is driven by a TestClient that was not entered as a context manager.
+    """
+    clients = getattr(request.app.state, "clients", None)
+    if clients is None:
+        clients = ClientRegistry()
+        request.app.state.clients = clients
+    return clients
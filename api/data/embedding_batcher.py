@@ -0,0 +1,140 @@
+import os
+import asyncio
+import logging
+from typing import List, Optional
+
+from .openai_client import OpenAIClient, EMBEDDING_MODEL
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough count (~4 characters per token for English text) used only to size batches
+    return len(text) // 4 + 1
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embed calls into batched embeddings requests.
+
+    Callers awaiting embed() within max_delay seconds of each other share one API request. A batch
+    is sent early once it holds max_batch_size texts or would exceed max_batch_tokens. A batch that
+    fails is bisected and retried, so a single bad input does not fail the other callers.
+
+    Args:
+        openai_client (OpenAIClient): Client used to send the batched requests.
+        model_name (str): Embedding model.
+        max_batch_size (int): Maximum number of texts per request.
+        max_delay (float): Seconds to wait for more texts before sending a partial batch.
+        max_batch_tokens (int): Approximate token budget per request.
+    """
+
+    def __init__(
+        self,
+        openai_client: OpenAIClient,
+        model_name: str = EMBEDDING_MODEL,
+        max_batch_size: int = 64,
+        max_delay: float = 0.005,
+        max_batch_tokens: int = 8000,
+    ):
+        self.openai_client = openai_client
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_batch_tokens = max_batch_tokens
+        self.batches_sent = 0
+        self.texts_sent = 0
+        self.batches_split = 0
+        self._pending: List[tuple] = []
+        self._pending_tokens = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._in_flight: set = set()
+
+    @classmethod
+    def from_env(cls, openai_client: OpenAIClient) -> "EmbeddingBatcher":
+        return cls(
+            openai_client,
+            max_batch_size=int(os.environ.get("EMBEDDING_BATCH_SIZE", "64")),
+            max_delay=float(os.environ.get("EMBEDDING_BATCH_DELAY_MS", "5")) / 1000,
+            max_batch_tokens=int(os.environ.get("EMBEDDING_BATCH_MAX_TOKENS", "8000")),
+        )
+
+    async def embed(self, input_text: str) -> Optional[List[float]]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        tokens = estimate_tokens(input_text)
+
+        if self._pending and self._pending_tokens + tokens > self.max_batch_tokens:
+            self._flush()
+        self._pending.append((input_text, future))
+        self._pending_tokens += tokens
+
+        if len(self._pending) >= self.max_batch_size or self._pending_tokens >= self.max_batch_tokens:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_delay, self._flush)
+
+        return await future
+
+    async def embed_many(self, input_texts: List[str]) -> List[Optional[List[float]]]:
+        return list(await asyncio.gather(*(self.embed(text) for text in input_texts)))
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: List[tuple]):
+        """
+        Send one batch and resolve its callers' futures. A failed batch is split in half and each
+        half retried, down to single texts, so one bad or oversized input fails only its own caller.
+        """
+        texts = [text for text, _ in batch]
+        self.batches_sent += 1
+        self.texts_sent += len(texts)
+        error = None
+        try:
+            vectors = await self.openai_client.embed_many(texts, self.model_name)
+        except Exception as e:
+            error, vectors = e, None
+
+        if vectors is not None and len(vectors) == len(batch):
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+            return
+
+        if len(batch) > 1:
+            self.batches_split += 1
+            logger.warning(f"Batched embedding request for {len(batch)} texts failed ({error}), retrying in halves")
+            middle = len(batch) // 2
+            await asyncio.gather(self._send(batch[:middle]), self._send(batch[middle:]))
+            return
+
+        _, future = batch[0]
+        logger.error(f"Embedding request failed: {error}")
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+    async def close(self):
+        self._flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "batches_sent": self.batches_sent,
+            "texts_sent": self.texts_sent,
+            "avg_batch_size": self.texts_sent / self.batches_sent if self.batches_sent else 0.0,
+            "batches_split": self.batches_split,
+            "pending": len(self._pending),
+        }
@@ -0,0 +1,181 @@
+import os
+import time
+import asyncio
+import array
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from typing import List, Optional
+
+from ..utils._cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def embedding_cache_key(model_name: str, text: str) -> str:
+    """
+    Content hash identifying an embedding: the same normalized text embedded by the same model
+    always maps to the same key.
+    """
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SQLiteEmbeddingStore:
+    """
+    Shared embedding tier backed by a SQLite file, so several workers on one host reuse each
+    other's embeddings and the cache survives restarts.
+
+    Any object with the same get/set/close methods can be used as the shared tier instead. The
+    methods are blocking; EmbeddingCache.get_async/set_async call them from a worker thread.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_rows: Optional[int] = None):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        blob, created_at = row
+        if self.ttl is not None and time.time() - created_at > self.ttl:
+            self.delete(key)
+            return None
+        return array.array("d", blob).tolist()
+
+    def set(self, key: str, vector: List[float]):
+        blob = array.array("d", vector).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                (key, blob, time.time()),
+            )
+            if self.max_rows is not None:
+                # Drop the oldest rows beyond the size limit
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,),
+                )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model name, normalized text hash).
+
+    Lookups go to the in-process LRU first, then to the optional shared store; shared hits are
+    promoted into the LRU. Async callers use get_async/set_async, which do the blocking shared
+    store I/O in a worker thread so the event loop keeps serving other requests.
+
+    Args:
+        max_size (int): Entries kept in the in-process LRU.
+        ttl (Optional[float]): Seconds an embedding stays valid in either tier.
+        shared_store: Optional shared tier exposing get(key), set(key, vector) and close().
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = 86400, shared_store=None):
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self.shared_store = shared_store
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingCache":
+        max_size = int(os.environ.get("EMBEDDING_CACHE_SIZE", "10000"))
+        ttl_env = os.environ.get("EMBEDDING_CACHE_TTL_SECONDS", "86400")
+        ttl = float(ttl_env) if ttl_env else None
+        sqlite_path = os.environ.get("EMBEDDING_CACHE_SQLITE_PATH")
+        shared_max_rows = os.environ.get("EMBEDDING_CACHE_SQLITE_MAX_ROWS")
+        shared_store = None
+        if sqlite_path:
+            try:
+                shared_store = SQLiteEmbeddingStore(
+                    sqlite_path, ttl=ttl, max_rows=int(shared_max_rows) if shared_max_rows else None
+                )
+            except sqlite3.Error as e:
+                logger.error(f"Failed to open shared embedding cache at {sqlite_path}: {e}")
+        return cls(max_size=max_size, ttl=ttl, shared_store=shared_store)
+
+    def _shared_get(self, key: str) -> Optional[List[float]]:
+        try:
+            return self.shared_store.get(key)
+        except Exception as e:
+            logger.error(f"Shared embedding cache read failed: {e}")
+            return None
+
+    def _shared_set(self, key: str, vector: List[float]):
+        try:
+            self.shared_store.set(key, vector)
+        except Exception as e:
+            logger.error(f"Shared embedding cache write failed: {e}")
+
+    def _promote(self, key: str, vector: Optional[List[float]]) -> Optional[List[float]]:
+        if vector is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        self.local.set(key, vector)
+        return vector
+
+    def get(self, model_name: str, text: str) -> Optional[List[float]]:
+        key = embedding_cache_key(model_name, text)
+        vector = self.local.get(key)
+        if vector is not None or self.shared_store is None:
+            return vector
+        return self._promote(key, self._shared_get(key))
+
+    async def get_async(self, model_name: str, text: str) -> Optional[List[float]]:
+        key = embedding_cache_key(model_name, text)
+        vector = self.local.get(key)
+        if vector is not None or self.shared_store is None:
+            return vector
+        return self._promote(key, await asyncio.to_thread(self._shared_get, key))
+
+    def set(self, model_name: str, text: str, vector: List[float]):
+        key = embedding_cache_key(model_name, text)
+        self.local.set(key, vector)
+        if self.shared_store is not None:
+            self._shared_set(key, vector)
+
+    async def set_async(self, model_name: str, text: str, vector: List[float]):
+        key = embedding_cache_key(model_name, text)
+        self.local.set(key, vector)
+        if self.shared_store is not None:
+            await asyncio.to_thread(self._shared_set, key, vector)
+
+    def stats(self) -> dict:
+        return {**self.local.stats(), "shared_hits": self.shared_hits, "shared_misses": self.shared_misses}
+
+    def close(self):
+        if self.shared_store is not None:
+            self.shared_store.close()
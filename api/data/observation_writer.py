@@ -0,0 +1,386 @@
+import os
+import json
+import uuid
+import random
+import asyncio
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from qdrant_client import models
+
+from .qdrant_client import QdrantClient, message_payload
+from .embedding_batcher import EmbeddingBatcher
+from .chunking import ChunkedEmbedder
+
+logger = logging.getLogger(__name__)
+
+
+class ObservationSpool:
+    """
+    Append-only JSONL log of observations that have been accepted but not yet written to Qdrant.
+
+    Each worker process writes its own spool file. On startup a worker adopts the spool files of
+    processes that are no longer running, so pending observations survive restarts. Orphaned files
+    are claimed with an atomic rename first, so workers starting together never replay the same
+    file twice.
+
+    The methods do blocking file I/O (append fsyncs); ObservationWriter runs them on its spool thread.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f"spool-{os.getpid()}.jsonl")
+
+    def append(self, record: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def mark_done(self, observation_ids: List[str]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for observation_id in observation_ids:
+                f.write(json.dumps({"done": observation_id}) + "\n")
+
+    def compact(self, pending: List[dict]):
+        """Atomically rewrite this worker's file to hold only the still pending records."""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in pending:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _claim(self, name: str) -> Optional[str]:
+        # spool-<pid>.jsonl of a dead worker, or claimed-<pid>-<token>.jsonl of a worker that died
+        # while recovering; a rename is atomic, so exactly one live worker gets each file
+        if name.startswith("spool-"):
+            owner = name[len("spool-") : -len(".jsonl")]
+        elif name.startswith("claimed-"):
+            owner = name.split("-")[1]
+        else:
+            return None
+        if owner == str(os.getpid()) or _process_alive(owner):
+            return None
+        claimed = os.path.join(self.directory, f"claimed-{os.getpid()}-{uuid.uuid4().hex}.jsonl")
+        try:
+            os.rename(os.path.join(self.directory, name), claimed)
+        except FileNotFoundError:
+            return None  # Another worker claimed it first
+        return claimed
+
+    def recover(self) -> List[dict]:
+        """Return pending observations from this and orphaned spool files, compacted into this worker's file."""
+        os.makedirs(self.directory, exist_ok=True)
+        paths = [self.path] if os.path.exists(self.path) else []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".jsonl") and os.path.join(self.directory, name) != self.path:
+                claimed = self._claim(name)
+                if claimed is not None:
+                    paths.append(claimed)
+
+        pending = {}
+        for path in paths:
+            for record in _read_records(path):
+                if "done" in record:
+                    pending.pop(record["done"], None)
+                else:
+                    pending[record["id"]] = record
+
+        # Claimed files are removed only once their records are safe in this worker's file
+        self.compact(list(pending.values()))
+        for path in paths:
+            if path != self.path:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return list(pending.values())
+
+
+def _process_alive(pid: str) -> bool:
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _log_spool_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Observation spool write failed: {future.exception()}")
+
+
+def _read_records(path: str) -> List[dict]:
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn final line from a crash mid-write
+                logger.warning(f"Skipping unreadable spool line in {path}")
+    return records
+
+
+class ObservationWriter:
+    """
+    Write-behind queue for Vowel Loop observations.
+
+    submit() returns immediately; a background task embeds queued observations and upserts them
+    to Qdrant in batches, retrying failed batches with exponential backoff and jitter. A batch
+    that still fails is retried again on a later flush rather than dropped.
+
+    Accepted observations are appended to the spool by a dedicated spool thread, so its fsyncs
+    never block the event loop; the thread handles spool operations in order, so an observation's
+    append always precedes its done marker. Once nothing is pending, or after `compact_after`
+    done markers, the spool is rewritten to hold only the pending observations.
+
+    Args:
+        qdrant_client (QdrantClient): Destination for the observation points.
+        embedding_batcher (EmbeddingBatcher): Used to embed each batch.
+        spool_dir (Optional[str]): Directory for the durable spool. None keeps observations in memory only.
+        max_queue_size (int): Observations held in memory before further ones wait in the spool only.
+        batch_size (int): Maximum observations per upsert.
+        flush_interval (float): Seconds to wait for a batch to fill before writing it.
+        max_retries (int): Attempts per flush before the batch is set aside for a later flush.
+        retry_interval (float): Seconds a set-aside batch waits for new observations before it is retried alone.
+        compact_after (int): Done markers appended before the spool is compacted.
+        chunked_embedder (Optional[ChunkedEmbedder]): Embeds observations over the model's input limit
+            as one pooled vector. Without it every observation goes through the batcher as is.
+        on_write (Optional[Callable]): Called after each batch is written, e.g. to invalidate search caches.
+    """
+
+    def __init__(
+        self,
+        qdrant_client: QdrantClient,
+        embedding_batcher: EmbeddingBatcher,
+        spool_dir: Optional[str] = None,
+        max_queue_size: int = 1000,
+        batch_size: int = 32,
+        flush_interval: float = 0.5,
+        max_retries: int = 5,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        retry_interval: float = 30.0,
+        compact_after: int = 1000,
+        chunked_embedder: Optional[ChunkedEmbedder] = None,
+        on_write: Optional[Callable] = None,
+    ):
+        self.qdrant_client = qdrant_client
+        self.embedding_batcher = embedding_batcher
+        self.chunked_embedder = chunked_embedder
+        self.spool = ObservationSpool(spool_dir) if spool_dir else None
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retry_interval = retry_interval
+        self.compact_after = compact_after
+        self.on_write = on_write
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._worker: Optional[asyncio.Task] = None
+        self._spool_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="observation-spool")
+        # Spooled observations not yet written, and failed ones waiting for a later flush
+        self._pending = {}
+        self._retry: List[dict] = []
+        self._done_since_compaction = 0
+        self.submitted = 0
+        self.written = 0
+        self.retries = 0
+        self.failed = 0
+        self.overflowed = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_env(
+        cls,
+        qdrant_client: QdrantClient,
+        embedding_batcher: EmbeddingBatcher,
+        chunked_embedder: Optional[ChunkedEmbedder] = None,
+        on_write: Optional[Callable] = None,
+    ) -> "ObservationWriter":
+        return cls(
+            qdrant_client,
+            embedding_batcher,
+            chunked_embedder=chunked_embedder,
+            on_write=on_write,
+            spool_dir=os.environ.get("OBSERVATION_SPOOL_DIR", ".observation_spool") or None,
+            max_queue_size=int(os.environ.get("OBSERVATION_QUEUE_SIZE", "1000")),
+            batch_size=int(os.environ.get("OBSERVATION_BATCH_SIZE", "32")),
+            max_retries=int(os.environ.get("OBSERVATION_MAX_RETRIES", "5")),
+        )
+
+    async def start(self):
+        """Replay observations left in the spool by earlier processes and start the background writer."""
+        if self._worker is not None:
+            return
+        if self.spool:
+            recovered = await asyncio.get_running_loop().run_in_executor(self._spool_thread, self.spool.recover)
+            if recovered:
+                logger.info(f"Recovered {len(recovered)} pending observations from spool")
+            for record in recovered:
+                self._pending[record["id"]] = record
+                self._enqueue(record)
+        self._worker = asyncio.create_task(self._run())
+
+    def submit(self, content: str, payload: Optional[dict] = None) -> str:
+        """Accept an observation for writing and return its point id without waiting on Qdrant."""
+        if self._worker is None:
+            # Not started by the app lifespan (e.g. a standalone registry); start without spool replay
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        record = {
+            "id": str(uuid.uuid4()),
+            "content": content,
+            "payload": payload or {},
+            "created_at": datetime.now().isoformat(),
+        }
+        if self.spool:
+            self._pending[record["id"]] = record
+            self._spool(self.spool.append, record)
+        self.submitted += 1
+        self._enqueue(record)
+        return record["id"]
+
+    def _spool(self, fn, *args) -> asyncio.Future:
+        future = asyncio.get_running_loop().run_in_executor(self._spool_thread, fn, *args)
+        future.add_done_callback(_log_spool_error)
+        return future
+
+    def _enqueue(self, record: dict):
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            if self.spool is None:
+                self.dropped += 1
+                logger.warning("Observation queue full and no spool configured, dropping observation")
+                return
+            # Still durable in the spool; written after the next restart
+            self.overflowed += 1
+            logger.warning("Observation queue full, leaving observation in spool")
+
+    async def _next_batch(self):
+        """Up to batch_size observations: set-aside ones first, then queued ones. Returns (batch, dequeued)."""
+        batch = self._retry[: self.batch_size]
+        del self._retry[: len(batch)]
+        dequeued = 0
+        if not batch:
+            batch.append(await self.queue.get())
+            dequeued += 1
+        elif self.queue.empty():
+            # Give new observations a chance to join the retry rather than hammering a failing store
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), self.retry_interval))
+                dequeued += 1
+            except asyncio.TimeoutError:
+                pass
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                dequeued += 1
+            except asyncio.TimeoutError:
+                break
+        return batch, dequeued
+
+    async def _run(self):
+        while True:
+            batch, dequeued = await self._next_batch()
+            await self._write_with_retry(batch)
+            for _ in range(dequeued):
+                self.queue.task_done()
+
+    async def _write_with_retry(self, batch: List[dict]):
+        for attempt in range(self.max_retries):
+            try:
+                await self._write_batch(batch)
+                self.written += len(batch)
+                if self.spool:
+                    self._spooled_done(batch)
+                return
+            except Exception as e:
+                self.retries += 1
+                backoff = min(self.max_backoff, self.base_backoff * 2**attempt)
+                logger.error(f"Observation batch write failed (attempt {attempt + 1}): {e}, retrying in ~{backoff}s")
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+        self.failed += len(batch)
+        self._retry.extend(batch)
+        logger.error(f"Giving up on {len(batch)} observations for now; they are retried on a later flush")
+
+    def _spooled_done(self, batch: List[dict]):
+        for record in batch:
+            self._pending.pop(record["id"], None)
+        self._done_since_compaction += len(batch)
+        if not self._pending or self._done_since_compaction >= self.compact_after:
+            # Snapshot now: every append queued on the spool thread so far is for a record in it
+            self._spool(self.spool.compact, list(self._pending.values()))
+            self._done_since_compaction = 0
+        else:
+            self._spool(self.spool.mark_done, [record["id"] for record in batch])
+
+    async def _embed_batch(self, contents: List[str]):
+        # Observations over the model's input limit are chunked and pooled; the rest share one batched request
+        is_long = [self.chunked_embedder is not None and self.chunked_embedder.needs_chunking(c) for c in contents]
+        short = iter(await self.embedding_batcher.embed_many([c for c, long in zip(contents, is_long) if not long]))
+        pooled = iter(
+            await asyncio.gather(*(self.chunked_embedder.embed(c) for c, long in zip(contents, is_long) if long))
+        )
+        return [next(pooled) if long else next(short) for long in is_long]
+
+    async def _write_batch(self, batch: List[dict]):
+        embeddings = await self._embed_batch([record["content"] for record in batch])
+        if any(embedding is None for embedding in embeddings):
+            raise RuntimeError("Failed to embed observation batch")
+        points = [
+            models.PointStruct(
+                id=record["id"],
+                payload=message_payload(record["content"], record["created_at"], record["payload"]),
+                vector=embedding,
+            )
+            for record, embedding in zip(batch, embeddings)
+        ]
+        await self.qdrant_client.upsert_points(points)
+        if self.on_write:
+            self.on_write()
+
+    async def stop(self, timeout: float = 5.0):
+        """Give queued observations a moment to flush, then stop the worker. Unwritten ones stay spooled."""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.queue.qsize()} observations still queued at shutdown")
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        # The spool thread runs in order, so this returns once every queued spool write has landed
+        await asyncio.get_running_loop().run_in_executor(self._spool_thread, lambda: None)
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "submitted": self.submitted,
+            "written": self.written,
+            "retries": self.retries,
+            "failed": self.failed,
+            "awaiting_retry": len(self._retry),
+            "overflowed": self.overflowed,
+            "dropped": self.dropped,
+        }
@@ -1,6 +1,9 @@
 import os
 from openai import AsyncOpenAI, OpenAIError
 
+EMBEDDING_MODEL = "text-embedding-ada-002"
+CHAT_MODEL = "gpt-4o"
+
 
 class OpenAIClient:
     def __init__(self, openai_api_key=None):
@@ -11,7 +14,7 @@ class OpenAIClient:
             print(f"Failed to initialize OpenAI client: {e}")
             self.client = None
 
-    async def embed(self, input_text, model_name="text-embedding-ada-002"):
+    async def embed(self, input_text, model_name=EMBEDDING_MODEL):
         if not self.client:
             print("OpenAI client is not initialized.")
             return None
@@ -21,3 +24,53 @@ class OpenAIClient:
         except OpenAIError as e:
             print(f"Failed to retrieve embedding: {e}")
             return None
+
+    async def embed_many(self, input_texts, model_name=EMBEDDING_MODEL):
+        """Embed a list of texts in one request, returning vectors in input order."""
+        if not self.client:
+            print("OpenAI client is not initialized.")
+            return None
+        try:
+            embedding_response = await self.client.embeddings.create(input=list(input_texts), model=model_name)
+            return [item.embedding for item in sorted(embedding_response.data, key=lambda item: item.index)]
+        except OpenAIError as e:
+            print(f"Failed to retrieve embeddings: {e}")
+            return None
+
+    async def chat_completion(self, messages, model=CHAT_MODEL, max_tokens=4000, n=1, stop=None, temperature=0.7):
+        if not self.client:
+            print("OpenAI client is not initialized.")
+            return None
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            n=n,
+            stop=stop,
+            temperature=temperature,
+        )
+        return response.choices[0].message.content.strip()
+
+    async def chat_completion_stream(self, messages, model=CHAT_MODEL, max_tokens=4000, stop=None, temperature=0.7):
+        """Yield the completion's content deltas as they are produced."""
+        if not self.client:
+            print("OpenAI client is not initialized.")
+            return
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            stop=stop,
+            temperature=temperature,
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    async def close(self):
+        if self.client:
+            await self.client.close()
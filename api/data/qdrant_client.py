@@ -1,9 +1,114 @@
 import os
+import random
+import asyncio
 import logging
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Any, AsyncIterable, Iterable, List, Union
 from qdrant_client import AsyncQdrantClient, models
 from qdrant_client.http.exceptions import ApiException, UnexpectedResponse
 
+from .chunking import as_point_vector
+
+
+@dataclass
+class BatchFailure:
+    batch_index: int
+    ids: List[Any]
+    error: str
+    attempts: int
+
+
+@dataclass
+class BulkUpsertReport:
+    batches: int = 0
+    points: int = 0
+    failures: List[BatchFailure] = field(default_factory=list)
+
+    @property
+    def failed_points(self) -> int:
+        return sum(len(failure.ids) for failure in self.failures)
+
+
+async def _batched(points: Union[Iterable, AsyncIterable], batch_size: int):
+    batch = []
+    if hasattr(points, "__aiter__"):
+        async for point in points:
+            batch.append(point)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    else:
+        for point in points:
+            batch.append(point)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+FUSION_METHODS = ("rrf", "max")
+
+# Payload fields the message views read. The full revisions list is never fetched for a search;
+# its length is kept in revisions_count on write.
+MESSAGE_PAYLOAD_FIELDS = ("content", "created_at", "voice", "revisions_count")
+# For passes that only score hits and never show or dedup their text
+SCORING_PAYLOAD_FIELDS = ("created_at", "voice", "revisions_count")
+
+
+def payload_selector(payload_fields):
+    """with_payload value for a field projection; None fetches the whole payload."""
+    if payload_fields is None:
+        return True
+    return models.PayloadSelectorInclude(include=list(payload_fields))
+
+
+def with_revisions_count(payload: dict) -> dict:
+    """Set revisions_count from the revisions list when the payload carries one."""
+    if "revisions" in payload:
+        return {**payload, "revisions_count": len(payload["revisions"] or [])}
+    return payload
+
+
+def message_payload(content: str, created_at, payload: dict = None) -> dict:
+    """Payload of a new message point, with revisions_count maintained alongside revisions."""
+    return with_revisions_count({"content": content, "created_at": created_at, "revisions_count": 0, **(payload or {})})
+
+
+def fuse_scored_points(result_lists, method: str = "rrf", limit: int = None, rrf_k: int = 60):
+    """
+    Merge the hit lists of several queries into one ranking, deduplicated by point id.
+
+    rrf (reciprocal rank fusion) scores a point by the sum of 1 / (rrf_k + rank) over the lists
+    it appears in, rewarding points that several chunks agree on. max ranks each point by its
+    best similarity score in any list. Each point is returned once, as its highest-scoring hit.
+
+    Args:
+        result_lists: One list of ScoredPoints per query; None entries are skipped.
+        method (str): "rrf" or "max".
+        limit (int): Maximum number of fused points to return.
+        rrf_k (int): Rank offset damping the weight of the top ranks in rrf.
+
+    Returns:
+        list: ScoredPoints ordered by fused score, highest first.
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method {method!r}, expected one of {', '.join(FUSION_METHODS)}")
+    fused = {}
+    best = {}
+    for results in result_lists:
+        for rank, point in enumerate(results or [], start=1):
+            key = str(point.id)
+            if method == "rrf":
+                fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            else:
+                fused[key] = max(fused.get(key, point.score), point.score)
+            if key not in best or point.score > best[key].score:
+                best[key] = point
+    ranked = sorted(fused, key=fused.get, reverse=True)
+    return [best[key] for key in ranked[:limit]]
+
 
 class QdrantClient:
     def __init__(self, collection_name="choir", qdrant_url=None, qdrant_api_key=None):
@@ -12,13 +117,19 @@ class QdrantClient:
         self.client = AsyncQdrantClient(url=self.qdrant_url, api_key=self.qdrant_api_key)
         self.collection_name = collection_name
 
-    async def search(self, embedding, search_limit=200, with_vectors=False):
+    async def search(self, embedding, search_limit=200, with_vectors=False, payload_fields=MESSAGE_PAYLOAD_FIELDS):
+        """
+        Search by vector, fetching only `payload_fields` of each hit (None for the whole payload).
+
+        Pass SCORING_PAYLOAD_FIELDS to skip the content text on scoring-only passes.
+        """
         try:
             search_results = await self.client.search(
                 collection_name=self.collection_name,
                 query_vector=embedding,
                 limit=search_limit,
                 with_vectors=with_vectors,
+                with_payload=payload_selector(payload_fields),
             )
             return search_results
         except (ApiException, UnexpectedResponse) as e:
@@ -26,32 +137,159 @@ class QdrantClient:
             # Handle the error as needed, e.g., retry, return a default value, etc.
             return None
 
-    async def retrieve(self, ids):
+    async def search_batch(self, embeddings, search_limit=40, with_vectors=False, payload_fields=MESSAGE_PAYLOAD_FIELDS):
+        """
+        Search with several query vectors in one request, fetching only `payload_fields` of each hit.
+
+        Returns:
+            list: One list of ScoredPoints per embedding, in input order, or None on error.
+        """
+        requests = [
+            models.QueryRequest(
+                query=list(embedding),
+                limit=search_limit,
+                with_payload=payload_selector(payload_fields),
+                with_vector=with_vectors,
+            )
+            for embedding in embeddings
+        ]
+        if not requests:
+            return []
         try:
-            return await self.client.retrieve(collection_name=self.collection_name, ids=ids)
+            responses = await self.client.query_batch_points(collection_name=self.collection_name, requests=requests)
+            return [response.points for response in responses]
+        except (ApiException, UnexpectedResponse) as e:
+            logging.error(f"Error during batch search operation: {e}")
+            return None
+
+    async def retrieve(self, ids, payload_fields=MESSAGE_PAYLOAD_FIELDS):
+        try:
+            return await self.client.retrieve(
+                collection_name=self.collection_name, ids=ids, with_payload=payload_selector(payload_fields)
+            )
         except (ApiException, UnexpectedResponse) as e:
             logging.error(f"Error during retrieve operation: {e}")
             return None
 
     async def set_payload(self, payload, points):
         try:
-            await self.client.set_payload(collection_name=self.collection_name, payload=payload, points=points)
+            await self.client.set_payload(
+                collection_name=self.collection_name, payload=with_revisions_count(payload), points=points
+            )
         except (ApiException, UnexpectedResponse) as e:
             logging.error(f"Error during set_payload operation: {e}")
             # Decide on how to handle the error
 
-    async def upsert(self, id, input_string, embedding):
+    async def upsert(self, id, input_string, embedding, payload=None):
+        # Fail loudly on a list of chunk vectors rather than writing a malformed point
+        vector = as_point_vector(embedding)
         try:
             await self.client.upsert(
                 collection_name=self.collection_name,
                 points=[
                     models.PointStruct(
                         id=id,
-                        payload={"content": input_string, "created_at": datetime.now()},
-                        vector=embedding,
+                        payload=message_payload(input_string, datetime.now(), payload),
+                        vector=vector,
                     )
                 ],
             )
+            return True
         except (ApiException, UnexpectedResponse) as e:
             logging.error(f"Error during upsert operation: {e}")
-            # Handle the error as needed
+            return False
+
+    async def delete(self, ids):
+        """
+        Delete points by id; ids that do not exist are ignored. Errors are raised so callers can retry.
+        """
+        await self.client.delete(collection_name=self.collection_name, points_selector=models.PointIdsList(points=ids))
+
+    async def upsert_points(self, points):
+        """
+        Upsert a batch of PointStructs in one request. Errors are raised so callers can retry.
+        """
+        await self.client.upsert(collection_name=self.collection_name, points=points)
+
+    async def bulk_upsert(
+        self,
+        points: Union[Iterable, AsyncIterable],
+        batch_size: int = 256,
+        parallelism: int = 4,
+        max_retries: int = 3,
+        base_backoff: float = 0.5,
+    ) -> BulkUpsertReport:
+        """
+        Upsert a stream of (id, text, vector, payload) tuples in batches, several batches in flight at once.
+
+        The source is consumed lazily, so at most `parallelism` batches are held in memory. A batch
+        that still fails after `max_retries` attempts is recorded in the report and skipped.
+
+        Args:
+            points: Iterable or async iterable of (id, text, vector, payload) tuples.
+            batch_size (int): Points per upsert request.
+            parallelism (int): Maximum concurrent upsert requests.
+            max_retries (int): Attempts per batch.
+            base_backoff (float): Seconds before the first retry, doubled on each further attempt.
+
+        Returns:
+            BulkUpsertReport: Counts of batches and points written plus per-batch failures.
+        """
+        report = BulkUpsertReport()
+        in_flight = set()
+
+        async def write(batch_index, batch):
+            structs = [
+                models.PointStruct(
+                    id=id,
+                    payload=message_payload(text, datetime.now(), payload),
+                    vector=vector,
+                )
+                for id, text, vector, payload in batch
+            ]
+            for attempt in range(1, max_retries + 1):
+                try:
+                    await self.upsert_points(structs)
+                    report.batches += 1
+                    report.points += len(structs)
+                    return
+                except Exception as e:
+                    logging.error(f"Bulk upsert batch {batch_index} failed (attempt {attempt}/{max_retries}): {e}")
+                    if attempt == max_retries:
+                        report.failures.append(BatchFailure(batch_index, [p[0] for p in batch], str(e), attempt))
+                        return
+                    await asyncio.sleep(base_backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+        batch_index = 0
+        async for batch in _batched(points, batch_size):
+            if len(in_flight) >= parallelism:
+                _, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            in_flight.add(asyncio.create_task(write(batch_index, batch)))
+            batch_index += 1
+        if in_flight:
+            await asyncio.wait(in_flight)
+        return report
+
+    async def scroll_payloads(self, payload_fields=None, batch_size=256):
+        """
+        Yield pages of Records over the whole collection, with `payload_fields` and no vectors.
+        """
+        offset = None
+        while True:
+            records, offset = await self.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=payload_selector(payload_fields),
+                with_vectors=False,
+            )
+            if records:
+                yield records
+            if offset is None:
+                return
+
+    async def close(self):
+        try:
+            await self.client.close()
+        except Exception as e:
+            logging.error(f"Error while closing Qdrant client: {e}")
@@ -0,0 +1,81 @@
+import os
+import hashlib
+import logging
+import threading
+from typing import List, Optional
+
+from ..utils._cache import LRUCache
+from .embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+def search_cache_key(text: str, search_limit: int) -> str:
+    digest = hashlib.sha256(normalize_text(text).lower().encode("utf-8")).hexdigest()
+    return f"{search_limit}:{digest}"
+
+
+class SearchResultCache:
+    """
+    Per-worker cache of raw Qdrant hits keyed by normalized query text and search limit.
+
+    Hits are stored before dedup and rerank because reranking depends on the current time; callers
+    re-score the cached points on every read, which costs far less than an embed plus a search.
+
+    Entries are versioned rather than deleted: every write to the collection from this worker
+    bumps the version, and entries stored under an older version are never served. A search that
+    started before a write stores its result under the version it started with, so it cannot
+    resurrect pre-write hits. Writes made by other workers are bounded by the TTL.
+
+    Args:
+        max_size (int): Maximum number of cached queries per worker.
+        ttl (float): Seconds a cached result is served for.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: float = 30.0):
+        self._cache = LRUCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["SearchResultCache"]:
+        """Build from SEARCH_CACHE_SIZE and SEARCH_CACHE_TTL_SECONDS; a size or TTL of 0 disables the cache."""
+        max_size = int(os.environ.get("SEARCH_CACHE_SIZE", "2048"))
+        ttl = float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "30"))
+        if max_size <= 0 or ttl <= 0:
+            return None
+        return cls(max_size=max_size, ttl=ttl)
+
+    def get(self, text: str, search_limit: int) -> Optional[List]:
+        entry = self._cache.get(search_cache_key(text, search_limit))
+        if entry is None or entry[0] != self.version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, text: str, search_limit: int, hits: List, version: int):
+        """Store hits fetched while the cache was at `version` (read it before searching)."""
+        if version == self.version:
+            self._cache.set(search_cache_key(text, search_limit), (version, hits))
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "max_size": self._cache.max_size,
+            "evictions": self._cache.evictions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "version": self.version,
+            "invalidations": self.invalidations,
+        }
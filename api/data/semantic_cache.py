@@ -0,0 +1,170 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticSearchCache:
+    """
+    Per-worker cache of Qdrant hits for recent query embeddings, matched by cosine similarity.
+
+    The last `capacity` query embeddings are kept L2-normalized in a NumPy matrix (a ring buffer),
+    so a lookup is one matrix-vector product. A new query whose best match has cosine similarity
+    of at least `threshold`, for the same search limit, reuses that query's hits instead of
+    searching Qdrant, which also catches paraphrases an exact text key misses.
+
+    Reused hits are approximate. A fraction `audit_rate` of cache hits also runs the fresh search
+    in the background and records the recall of the cached result against it, so the threshold
+    can be tuned from data. Entries expire after `ttl` seconds and every write to the collection
+    from this worker invalidates them, as for SearchResultCache.
+
+    Args:
+        capacity (int): Number of recent query embeddings kept.
+        threshold (float): Minimum cosine similarity for a query to reuse cached hits.
+        ttl (float): Seconds a cached result is served for.
+        audit_rate (float): Fraction of cache hits re-checked against a fresh search.
+    """
+
+    def __init__(self, capacity: int = 1024, threshold: float = 0.97, ttl: float = 300.0, audit_rate: float = 0.01):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.audit_rate = audit_rate
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # allocated on first insert, once the dimension is known
+        self._hits: List = [None] * capacity
+        self._limits = np.full(capacity, -1, dtype=np.int64)
+        self._versions = np.full(capacity, -1, dtype=np.int64)
+        self._stored_at = np.zeros(capacity, dtype=np.float64)
+        self._next = 0
+        self._size = 0
+        self._audits = set()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.audited = 0
+        self.recall_total = 0.0
+        self.recall_min = None
+
+    @classmethod
+    def from_env(cls) -> Optional["SemanticSearchCache"]:
+        """Build from SEMANTIC_CACHE_* env vars. Off unless SEMANTIC_CACHE_SIZE is set above 0."""
+        capacity = int(os.environ.get("SEMANTIC_CACHE_SIZE", "0"))
+        if capacity <= 0:
+            return None
+        return cls(
+            capacity=capacity,
+            threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.97")),
+            ttl=float(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", "300")),
+            audit_rate=float(os.environ.get("SEMANTIC_CACHE_AUDIT_RATE", "0.01")),
+        )
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def lookup(self, embedding, search_limit: int):
+        """Return (hits, similarity) of the closest live cached query above the threshold, or None."""
+        query = self._normalize(embedding)
+        with self._lock:
+            if query is None or self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                return None
+            n = self._size
+            similarity = self._vectors[:n] @ query
+            live = (
+                (self._limits[:n] == search_limit)
+                & (self._versions[:n] == self.version)
+                & (time.monotonic() - self._stored_at[:n] <= self.ttl)
+            )
+            similarity = np.where(live, similarity, -np.inf)
+            best = int(np.argmax(similarity))
+            if similarity[best] < self.threshold:
+                return None
+            return self._hits[best], float(similarity[best])
+
+    def insert(self, embedding, search_limit: int, hits: List, version: int):
+        """Store hits fetched while the cache was at `version` (read it before searching)."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            if vector is None or version != self.version:
+                return
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+                self._size = self._next = 0
+            slot = self._next
+            self._vectors[slot] = vector
+            self._hits[slot] = hits
+            self._limits[slot] = search_limit
+            self._versions[slot] = version
+            self._stored_at[slot] = time.monotonic()
+            self._next = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+
+    async def search(self, embedding, search_limit: int, search: Callable[..., Awaitable]):
+        """
+        Serve `search(embedding, search_limit)` from the cache when a close enough query was seen recently.
+        """
+        cached = self.lookup(embedding, search_limit)
+        if cached is not None:
+            self.hits += 1
+            hits, _ = cached
+            if self.audit_rate > 0 and random.random() < self.audit_rate:
+                task = asyncio.create_task(self._audit(embedding, search_limit, hits, search))
+                self._audits.add(task)
+                task.add_done_callback(self._audits.discard)
+            return hits
+        self.misses += 1
+        version = self.version
+        hits = await search(embedding, search_limit)
+        if hits is not None:
+            self.insert(embedding, search_limit, hits, version)
+        return hits
+
+    async def _audit(self, embedding, search_limit: int, cached_hits: List, search: Callable[..., Awaitable]):
+        try:
+            fresh_hits = await search(embedding, search_limit)
+        except Exception as e:
+            logger.warning(f"Semantic cache audit search failed: {e}")
+            return
+        if not fresh_hits:
+            return
+        self.record_recall(recall(cached_hits, fresh_hits))
+
+    def record_recall(self, value: float):
+        self.audited += 1
+        self.recall_total += value
+        self.recall_min = value if self.recall_min is None else min(self.recall_min, value)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": self._size,
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "audited": self.audited,
+            "mean_recall": self.recall_total / self.audited if self.audited else None,
+            "min_recall": self.recall_min,
+        }
+
+
+def recall(cached_hits: List, fresh_hits: List) -> float:
+    """Fraction of the fresh search's point ids that the cached result also contains."""
+    fresh_ids = {str(hit.id) for hit in fresh_hits}
+    cached_ids = {str(hit.id) for hit in cached_hits or []}
+    return len(fresh_ids & cached_ids) / len(fresh_ids)
@@ -1,13 +1,19 @@
 import uuid
+import asyncio
 import logging
 import math
 from typing import List, Optional
-from ._sqlalchemy_models import MESSAGE, USER
-from .qdrant_client import QdrantClient
-from .openai_client import OpenAIClient
+from ._sqlalchemy_models import MESSAGE, MESSAGE_METADATA, USER, utcnow
+from .client_registry import ClientRegistry
+from .openai_client import EMBEDDING_MODEL
+from ._voice_balances import apply_voice_deltas, apply_voice_increments, notify_balance_change
+from ._reward_events import enqueue_reward_events
+from ._message_pages import message_page_statement, metadata_page_statement, split_page
+from ._message_metadata import MESSAGE_METADATA_PROJECTION, metadata_from_payload
 from ..models._message import Message, Revision
+from sqlalchemy import delete, func, select
 from sqlalchemy.orm import Session
-from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -25,41 +31,190 @@ class MessageDeletionException(Exception):
     """Exception raised when there is an error deleting a message."""
 
 
+def _credit_author_and_queue_rewards(db: Session, user_id, voice_amount: float, source_message_id, rewards, origin=""):
+    # Both writes join the caller's transaction; the caller commits once
+    applied = apply_voice_deltas(db, [(user_id, math.floor(voice_amount))], origin)
+    return applied, enqueue_reward_events(db, source_message_id, rewards)
+
+
+def _summary_statement(user_id):
+    message_count = select(func.count()).select_from(MESSAGE).where(MESSAGE.user_id == USER.id).scalar_subquery()
+    return select(USER.voice, message_count.label("message_count")).where(USER.id == uuid.UUID(str(user_id)))
+
+
 class ThoughtSpaceData:
-    def __init__(self, db: Session):
-        self.qdrant_client = QdrantClient()
-        self.openai_client = OpenAIClient()
+    def __init__(self, db: Session, clients: Optional[ClientRegistry] = None, async_db: Optional[AsyncSession] = None):
+        # Reuse the worker's shared clients when given; a standalone instance builds its own
+        clients = clients if clients else ClientRegistry()
+        self.qdrant_client = clients.qdrant_client
+        self.openai_client = clients.openai_client
+        self.embedding_cache = clients.embedding_cache
+        self.embedding_batcher = clients.embedding_batcher
+        self.chunked_embedder = clients.chunked_embedder
+        self.search_cache = clients.search_cache
+        self.semantic_cache = clients.semantic_cache
+        self.invalidate_search_caches = clients.invalidate_search_caches
+        self.balance_cache = clients.balance_cache
         self.db = db
+        # The *_async methods use this session when given and otherwise run the sync ones in a worker thread
+        self.async_db = async_db
+        # Keep message_metadata_table in step with new messages and read dashboards from it
+        self.metadata_projection = MESSAGE_METADATA_PROJECTION
         logger.info("ThoughtSpaceData initialized")
 
     async def embed_text(self, input_text: str) -> Optional[List[float]]:
+        cached = await self.embedding_cache.get_async(EMBEDDING_MODEL, input_text)
+        if cached is not None:
+            return cached
         try:
-            return await self.openai_client.embed(input_text)
+            if self.chunked_embedder.needs_chunking(input_text):
+                # Over the model's input limit: embed the token chunks in one request and pool them
+                embedding = await self.chunked_embedder.embed(input_text)
+            else:
+                # Concurrent requests share one batched embeddings call
+                embedding = await self.embedding_batcher.embed(input_text)
+            if embedding is not None:
+                await self.embedding_cache.set_async(EMBEDDING_MODEL, input_text, embedding)
+            return embedding
         except Exception as e:
             logger.error(f"Failed to embed text: {e}")
             raise
 
     async def search_similar_messages(self, embedding: List[float], search_limit: int = 40, with_vectors: bool = False):
         logger.info(f"Searching for similar messages with search limit {search_limit} and with_vectors={with_vectors}")
+        if self.semantic_cache is not None and not with_vectors:
+            # Near-duplicate recent queries reuse their hits instead of searching Qdrant again
+            return await self.semantic_cache.search(embedding, search_limit, self.qdrant_client.search)
         return await self.qdrant_client.search(embedding, search_limit, with_vectors)
 
+    async def search_by_text(self, input_text: str, search_limit: int = 40):
+        """
+        Embed and search, serving repeated queries from the worker's search result cache.
+
+        Returns the raw hits before dedup and rerank, so callers can score them against the current time.
+        """
+        if self.search_cache is None:
+            return await self.search_similar_messages(await self.embed_text(input_text), search_limit)
+        hits = self.search_cache.get(input_text, search_limit)
+        if hits is not None:
+            return hits
+        # Read the version before searching so a write that lands mid-search discards this result
+        version = self.search_cache.version
+        hits = await self.search_similar_messages(await self.embed_text(input_text), search_limit)
+        if hits is not None:
+            self.search_cache.set(input_text, search_limit, hits, version)
+        return hits
+
     async def retrieve_messages(self, ids: List[str]):
         logger.info(f"Retrieving messages with IDs: {ids}")
         return await self.qdrant_client.retrieve(ids)
 
     async def upsert_message(self, id: str, input_string: str, embedding: List[float]):
         logger.info(f"Upserting message with ID {id}")
-        await self.qdrant_client.upsert(id, input_string, embedding)
+        stored = await self.qdrant_client.upsert(id, input_string, embedding)
+        self.invalidate_search_caches()
+        if stored is False:
+            raise MessageCreationException(f"Failed to upsert message {id}")
+
+    async def delete_message_point(self, id: str):
+        logger.info(f"Deleting message point with ID {id}")
+        await self.qdrant_client.delete([id])
+        self.invalidate_search_caches()
+
+    @property
+    def _cache_origin(self) -> str:
+        return self.balance_cache.origin if self.balance_cache is not None else ""
+
+    def _invalidate_balances(self, user_ids):
+        # Called after commit; other workers learn of the change from the NOTIFY sent in the transaction
+        if self.balance_cache is not None and user_ids:
+            self.balance_cache.invalidate(list(user_ids))
+
+    def _message_rows(self, user_id: str, message_id: str, content: Optional[str]):
+        created_at = utcnow()
+        rows = [MESSAGE(user_id=uuid.UUID(str(user_id)), id=uuid.UUID(str(message_id)), created_at=created_at)]
+        if self.metadata_projection and content is not None:
+            # Same transaction as the message row, so the projection never misses a message
+            rows.append(MESSAGE_METADATA(**metadata_from_payload(message_id, user_id, created_at, {"content": content})))
+        return rows
 
-    def create_message(self, user_id: str, message_id: str):
+    def create_message(self, user_id: str, message_id: str, content: Optional[str] = None):
+        """
+        Record the author of a new message. With the metadata projection enabled, pass the
+        message's content to write its message_metadata_table row too.
+        """
         try:
             logger.info(f"Creating message with ID {message_id} for user {user_id}")
-            new_message = MESSAGE(user_id=user_id, id=message_id)
-            self.db.add(new_message)
+            self.db.add_all(self._message_rows(user_id, message_id, content))
+            notify_balance_change(self.db, [user_id], self._cache_origin)
             self.db.commit()
         except Exception as e:
             logger.error(f"Failed to create message: {e}")
             raise MessageCreationException(f"Failed to create message: {e}")
+        self._invalidate_balances([user_id])
+
+    async def create_message_async(self, user_id: str, message_id: str, content: Optional[str] = None):
+        if self.async_db is None:
+            # The sync session blocks, and new_message runs this alongside other steps
+            return await asyncio.to_thread(self.create_message, user_id, message_id, content)
+        try:
+            logger.info(f"Creating message with ID {message_id} for user {user_id}")
+            self.async_db.add_all(self._message_rows(user_id, message_id, content))
+            await self.async_db.run_sync(notify_balance_change, [user_id], self._cache_origin)
+            await self.async_db.commit()
+        except Exception as e:
+            await self.async_db.rollback()
+            logger.error(f"Failed to create message: {e}")
+            raise MessageCreationException(f"Failed to create message: {e}")
+        self._invalidate_balances([user_id])
+
+    def _remove_message_statements(self, message_id: str):
+        message_id = uuid.UUID(str(message_id))
+        return (
+            delete(MESSAGE_METADATA).where(MESSAGE_METADATA.message_id == message_id),
+            delete(MESSAGE).where(MESSAGE.id == message_id),
+        )
+
+    def remove_message(self, user_id: str, message_id: str) -> bool:
+        """
+        Undo create_message, e.g. when the message's Qdrant upsert failed. Removing a message that
+        was never created is a no-op.
+
+        Returns:
+            bool: Whether a messages_table row was deleted.
+        """
+        try:
+            delete_metadata, delete_message = self._remove_message_statements(message_id)
+            self.db.execute(delete_metadata)
+            removed = self.db.execute(delete_message).rowcount > 0
+            if removed:
+                notify_balance_change(self.db, [user_id], self._cache_origin)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to remove message: {e}")
+            raise MessageDeletionException(f"Failed to remove message: {e}")
+        if removed:
+            self._invalidate_balances([user_id])
+        return removed
+
+    async def remove_message_async(self, user_id: str, message_id: str) -> bool:
+        if self.async_db is None:
+            return await asyncio.to_thread(self.remove_message, user_id, message_id)
+        try:
+            delete_metadata, delete_message = self._remove_message_statements(message_id)
+            await self.async_db.execute(delete_metadata)
+            removed = (await self.async_db.execute(delete_message)).rowcount > 0
+            if removed:
+                await self.async_db.run_sync(notify_balance_change, [user_id], self._cache_origin)
+            await self.async_db.commit()
+        except Exception as e:
+            await self.async_db.rollback()
+            logger.error(f"Failed to remove message: {e}")
+            raise MessageDeletionException(f"Failed to remove message: {e}")
+        if removed:
+            self._invalidate_balances([user_id])
+        return removed
 
     def get_message(self, message_id: str):
         print("in get_message")
@@ -106,6 +261,13 @@ class ThoughtSpaceData:
         print(f"message_user_mapping {message_user_mapping}")
         return message_user_mapping
 
+    async def get_messages_user_mapping_async(self, message_ids):
+        if self.async_db is None:
+            return await asyncio.to_thread(self.get_messages_user_mapping, message_ids)
+        ids = [uuid.UUID(str(message_id)) for message_id in message_ids]
+        result = await self.async_db.execute(select(MESSAGE.id, MESSAGE.user_id).where(MESSAGE.id.in_(ids)))
+        return {str(message.id): message.user_id for message in result}
+
     def get_messages_by_user_id(self, user_id: str):
         try:
             logger.info(f"Getting messages for user ID {user_id}")
@@ -129,43 +291,220 @@ class ThoughtSpaceData:
             logger.error(f"Failed to delete message: {e}")
             raise MessageDeletionException(f"Failed to delete message: {e}")
 
-    def get_user_voice_balance_and_messages(self, user_id: str):
-        user = self.db.query(USER).filter(USER.id == user_id).first()
-        if not user:
+    def _store_summary(self, user_id: str, row, version: int) -> Optional[dict]:
+        if row is None:
             logger.error(f"User with ID {user_id} not found")
             return None
+        summary = {"voice_balance": row.voice, "message_count": row.message_count}
+        if self.balance_cache is not None:
+            self.balance_cache.set(user_id, summary, version)
+        return summary
+
+    def get_user_summary(self, user_id: str) -> Optional[dict]:
+        """
+        The user's voice balance and message count, from the worker's balance cache when possible.
+
+        Returns:
+            dict: voice_balance and message_count, or None if the user does not exist.
+        """
+        cached = self.balance_cache.get(user_id) if self.balance_cache is not None else None
+        if cached is not None:
+            return cached
+        # Read the version before querying so a write that lands meanwhile discards this result
+        version = self.balance_cache.version if self.balance_cache is not None else 0
+        return self._store_summary(user_id, self.db.execute(_summary_statement(user_id)).first(), version)
+
+    async def get_user_summary_async(self, user_id: str) -> Optional[dict]:
+        if self.async_db is None:
+            return await asyncio.to_thread(self.get_user_summary, user_id)
+        cached = self.balance_cache.get(user_id) if self.balance_cache is not None else None
+        if cached is not None:
+            return cached
+        version = self.balance_cache.version if self.balance_cache is not None else 0
+        row = (await self.async_db.execute(_summary_statement(user_id))).first()
+        return self._store_summary(user_id, row, version)
+
+    def get_user_voice_balance_and_messages(self, user_id: str):
+        summary = self.get_user_summary(user_id)
+        if summary is None:
+            return None
         messages = self.db.query(MESSAGE.id).filter(MESSAGE.user_id == user_id).all()
         message_ids = [message.id for message in messages]
-        return {"voice_balance": user.voice, "message_ids": message_ids}
+        return {"voice_balance": summary["voice_balance"], "message_ids": message_ids}
+
+    async def get_user_voice_balance_and_messages_async(self, user_id: str):
+        if self.async_db is None:
+            return await asyncio.to_thread(self.get_user_voice_balance_and_messages, user_id)
+        summary = await self.get_user_summary_async(user_id)
+        if summary is None:
+            return None
+        statement = select(MESSAGE.id).where(MESSAGE.user_id == uuid.UUID(str(user_id)))
+        message_ids = (await self.async_db.execute(statement)).scalars()
+        return {"voice_balance": summary["voice_balance"], "message_ids": list(message_ids)}
+
+    def get_user_voice_balance(self, user_id: str) -> Optional[int]:
+        summary = self.get_user_summary(user_id)
+        return None if summary is None else summary["voice_balance"]
+
+    async def get_user_voice_balance_async(self, user_id: str) -> Optional[int]:
+        summary = await self.get_user_summary_async(user_id)
+        return None if summary is None else summary["voice_balance"]
+
+    def get_message_page(self, user_id: str, limit: int, cursor: Optional[str] = None):
+        """
+        One page of the user's message ids, newest first.
+
+        Returns:
+            tuple: (message_ids, next_cursor); next_cursor is None on the last page.
+
+        Raises:
+            InvalidCursorException: If the cursor cannot be decoded.
+        """
+        rows, next_cursor = split_page(self.db.execute(message_page_statement(user_id, limit, cursor)).all(), limit)
+        return [row.id for row in rows], next_cursor
+
+    async def get_message_page_async(self, user_id: str, limit: int, cursor: Optional[str] = None):
+        if self.async_db is None:
+            return await asyncio.to_thread(self.get_message_page, user_id, limit, cursor)
+        statement = message_page_statement(user_id, limit, cursor)
+        rows, next_cursor = split_page((await self.async_db.execute(statement)).all(), limit)
+        return [row.id for row in rows], next_cursor
+
+    def get_metadata_page(self, user_id: str, limit: int, cursor: Optional[str] = None):
+        """
+        One page of the user's message metadata rows (id, created_at, content_preview, voice,
+        revisions_count), newest first, from a single indexed query. Messages without a projection
+        row are included with content_preview None.
+
+        Returns:
+            tuple: (rows, next_cursor); next_cursor is None on the last page.
+        """
+        return split_page(self.db.execute(metadata_page_statement(user_id, limit, cursor)).all(), limit)
+
+    async def get_metadata_page_async(self, user_id: str, limit: int, cursor: Optional[str] = None):
+        if self.async_db is None:
+            return await asyncio.to_thread(self.get_metadata_page, user_id, limit, cursor)
+        return split_page((await self.async_db.execute(metadata_page_statement(user_id, limit, cursor))).all(), limit)
 
     def update_user_voice_balance(self, user_id: str, voice_amount: float):
-        print("before_query")
-
-        user = self.db.query(USER).filter(USER.id == user_id).first()
-        print(f"user: {user}")
-        if user:
-            # Calculate the floor of the voice_amount and add it to the user's voice score
-            print(f"voice_amount {voice_amount}")
-            voice_to_add = math.floor(voice_amount)
-            user.voice += voice_to_add
-            print(f"user.voice {user.voice}")
+        """
+        Add the floor of voice_amount to the user's balance with an in-database increment.
+        """
+        voice_to_add = math.floor(voice_amount)
+        try:
+            applied = apply_voice_deltas(self.db, [(user_id, voice_to_add)], self._cache_origin)
             self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to update voice balance for user {user_id}: {e}")
+            raise Exception(f"Failed to update voice balance for user {user_id}: {e}")
+        self._invalidate_balances(applied)
+        if applied:
             logger.info(f"Added {voice_to_add} VOICE to user {user_id}'s balance.")
-        else:
-            logger.error(f"User with ID {user_id} not found")
+
+    async def update_user_voice_balance_async(self, user_id: str, voice_amount: float):
+        if self.async_db is None:
+            return await asyncio.to_thread(self.update_user_voice_balance, user_id, voice_amount)
+        voice_to_add = math.floor(voice_amount)
+        try:
+            applied = await self.async_db.run_sync(apply_voice_deltas, [(user_id, voice_to_add)], self._cache_origin)
+            await self.async_db.commit()
+        except Exception as e:
+            await self.async_db.rollback()
+            logger.error(f"Failed to update voice balance for user {user_id}: {e}")
+            raise Exception(f"Failed to update voice balance for user {user_id}: {e}")
+        self._invalidate_balances(applied)
+
+    def apply_voice_deltas(self, deltas):
+        """
+        Apply any number of (user_id, delta) pairs to voice balances in one statement and commit.
+
+        Args:
+            deltas: Mapping of user_id to delta, or an iterable of (user_id, delta) pairs.
+
+        Returns:
+            dict: The per-user totals that were applied.
+        """
+        try:
+            applied = apply_voice_deltas(self.db, deltas, self._cache_origin)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to apply voice deltas: {e}")
+            raise Exception(f"Failed to apply voice deltas: {e}")
+        self._invalidate_balances(applied)
+        return applied
 
     def bulk_update_user_voice_balances(self, voice_rewards):
-        print("bulk update started")
-        # Start a transaction
-        with self.db.begin() as transaction:
-            try:
-                print("trying update")
-                for user_id, voice_reward in voice_rewards.items():
-                    # Assuming USER model has a column 'voice' for voice balance
-                    self.db.execute(update(USER).where(USER.id == user_id).values(voice=USER.voice + voice_reward))
-                # Commit the transaction
-                transaction.commit()
-            except Exception as e:
-                transaction.rollback()
-                logger.error(f"Failed to bulk update user voice balances: {e}")
-                raise Exception(f"Failed to bulk update user voice balances: {e}")
+        """
+        Add each author's aggregated reward to their balance in a single UPDATE statement.
+
+        Args:
+            voice_rewards (dict): Mapping of user_id to the voice to add; fractional rewards are floored.
+        """
+        logger.info(f"Applying voice rewards to {len(voice_rewards)} users")
+        try:
+            applied = apply_voice_increments(self.db, voice_rewards, self._cache_origin)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to bulk update user voice balances: {e}")
+            raise Exception(f"Failed to bulk update user voice balances: {e}")
+        self._invalidate_balances(applied)
+
+    def enqueue_reward_events(self, source_message_id: str, rewards):
+        """
+        Queue (message_id, author_id, amount) rewards for the settlement worker.
+        """
+        try:
+            count = enqueue_reward_events(self.db, source_message_id, rewards)
+            self.db.commit()
+            logger.info(f"Queued {count} reward events for message {source_message_id}")
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to queue reward events: {e}")
+            raise Exception(f"Failed to queue reward events: {e}")
+
+    def settle_new_message(self, user_id: str, voice_amount: float, source_message_id: str, rewards):
+        """
+        Credit the author of a new message and queue the rewards for the messages its search
+        surfaced, in one transaction.
+        """
+        try:
+            applied, count = _credit_author_and_queue_rewards(
+                self.db, user_id, voice_amount, source_message_id, rewards, self._cache_origin
+            )
+            self.db.commit()
+            logger.info(f"Credited user {user_id} and queued {count} reward events for message {source_message_id}")
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to settle message {source_message_id}: {e}")
+            raise Exception(f"Failed to settle message {source_message_id}: {e}")
+        self._invalidate_balances(applied)
+
+    async def settle_new_message_async(self, user_id: str, voice_amount: float, source_message_id: str, rewards):
+        if self.async_db is None:
+            return await asyncio.to_thread(self.settle_new_message, user_id, voice_amount, source_message_id, rewards)
+        try:
+            applied, count = await self.async_db.run_sync(
+                _credit_author_and_queue_rewards, user_id, voice_amount, source_message_id, rewards, self._cache_origin
+            )
+            await self.async_db.commit()
+            logger.info(f"Credited user {user_id} and queued {count} reward events for message {source_message_id}")
+        except Exception as e:
+            await self.async_db.rollback()
+            logger.error(f"Failed to settle message {source_message_id}: {e}")
+            raise Exception(f"Failed to settle message {source_message_id}: {e}")
+        self._invalidate_balances(applied)
+
+    async def enqueue_reward_events_async(self, source_message_id: str, rewards):
+        if self.async_db is None:
+            return await asyncio.to_thread(self.enqueue_reward_events, source_message_id, rewards)
+        try:
+            count = await self.async_db.run_sync(enqueue_reward_events, source_message_id, rewards)
+            await self.async_db.commit()
+            logger.info(f"Queued {count} reward events for message {source_message_id}")
+        except Exception as e:
+            await self.async_db.rollback()
+            logger.error(f"Failed to queue reward events: {e}")
+            raise Exception(f"Failed to queue reward events: {e}")
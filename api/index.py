@@ -1,17 +1,35 @@
+from contextlib import asynccontextmanager
 from typing import Annotated, Optional
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi import Depends, FastAPI, HTTPException, Query, Form
+from fastapi import Depends, FastAPI, HTTPException, Query, Form, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 
+import json
 import uuid
 from uuid import UUID
 
-from api.service.thoughtspace_service import ThoughtSpaceService
-from api.models._message import MessagesResponse, NewMessageRequest, RevisionRequest
-
-from api.data._db_config import get_db
+from api.service.thoughtspace_service import ThoughtSpaceService, DASHBOARD_MAX_PAGE_SIZE, DASHBOARD_PAGE_SIZE
+from api.service._steps import StepTimeoutException
+from api.service.reward_settlement import RewardSettlementWorker
+from api.models._message import MessagesResponse, NewMessageRequest, RevisionRequest, VowelLoopRequest
+from api.vowel_loop import VowelLoop
+
+from api.data._db_config import (
+    get_async_db,
+    get_lazy_async_db,
+    SessionLocal,
+    db_availability,
+    dispose_async_engine,
+    listen_connection_factory,
+    pool_metrics,
+)
+from api.data.balance_cache import BalanceInvalidationListener
+from api.data.client_registry import ClientRegistry, get_clients
+from api.data._message_pages import InvalidCursorException
 from api.models._user_auth import RegisterUser, UserOutput, LoginResonse, GPTToken
 from api.service._user_auth import (
     service_signup_users,
@@ -20,12 +38,42 @@ from api.service._user_auth import (
     gpt_tokens_service,
 )
 
-from api.utils._helpers import get_current_user_dep
+from api.utils._helpers import get_current_user_dep, format_sse, password_hasher, until_disconnected
 import logging
 
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create the OpenAI and Qdrant clients once per worker and close them on shutdown, and run the
+    reward settlement worker and the database health probe for the lifetime of the app.
+    """
+    app.state.clients = ClientRegistry()
+    await app.state.clients.start()
+    app.state.reward_settlement = RewardSettlementWorker.from_env(SessionLocal)
+    app.state.reward_settlement.start()
+    db_availability.start()
+    app.state.balance_listener = None
+    listen_connect = listen_connection_factory()
+    if app.state.clients.balance_cache is not None and listen_connect is not None:
+        # Other workers' balance writes invalidate this worker's cache over LISTEN/NOTIFY
+        app.state.balance_listener = BalanceInvalidationListener(app.state.clients.balance_cache, listen_connect)
+        app.state.balance_listener.start()
+    try:
+        yield
+    finally:
+        if app.state.balance_listener is not None:
+            await app.state.balance_listener.stop()
+        await db_availability.stop()
+        await app.state.reward_settlement.stop()
+        await app.state.clients.close()
+        password_hasher.shutdown()
+        await dispose_async_engine()
+
+
 app = FastAPI(
     title="Choir",
     description="Choir Chat",
@@ -42,6 +90,7 @@ app = FastAPI(
         {"url": "https://choirchat.azurewebsites.net/", "description": "Production server"},
     ],
     docs_url="/api/docs",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -76,18 +125,42 @@ async def hello_world():
     return {"message": "Hello, World!"}
 
 
+@app.get("/api/metrics", tags=["Metrics"])
+async def metrics(user_id: UUID = Depends(get_current_user_dep), clients: ClientRegistry = Depends(get_clients)):
+    """
+    Per-worker runtime metrics (caches, embedding batcher, observation queue depth, reward settlement,
+    database pool checkouts, wait time, overflow and invalidations, database circuit breaker,
+    balance cache listener, password hashing pool), for authenticated users only since they expose
+    internals. /api/hello is the liveness check.
+
+    Returns:
+        dict: Metrics for the worker that served the request
+    """
+    metrics = clients.metrics()
+    reward_settlement = getattr(app.state, "reward_settlement", None)
+    if reward_settlement is not None:
+        metrics["reward_settlement"] = reward_settlement.metrics()
+    metrics["db_pool"] = pool_metrics()
+    metrics["db_availability"] = db_availability.metrics()
+    metrics["password_hasher"] = password_hasher.metrics()
+    balance_listener = getattr(app.state, "balance_listener", None)
+    if balance_listener is not None:
+        metrics["balance_listener"] = balance_listener.metrics()
+    return metrics
+
+
 # user_auth.py web layer routes
 @app.post("/api/oauth/login", response_model=LoginResonse, tags=["OAuth2 Authentication"])
 async def login_authorization(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Authorization URL for OAuth2
 
     Args:
         form_data (Annotated[OAuth2PasswordRequestForm, Depends()]): Form Data
-        db (Session, optional): Dependency Injection
+        db (AsyncSession, optional): Dependency Injection
 
     Returns:
         LoginResonse: Login Response
@@ -136,13 +209,13 @@ async def get_temp_code(user_id: UUID):
 
 
 @app.post("/api/oauth/signup", response_model=UserOutput, tags=["OAuth2 Authentication"])
-async def signup_users(user_data: RegisterUser, db: Session = Depends(get_db)):
+async def signup_users(user_data: RegisterUser, db: AsyncSession = Depends(get_async_db)):
     """
     Signup Users
 
     Args:
         user_data (RegisterUser): User Data
-        db (Session, optional):  Dependency Injection
+        db (AsyncSession, optional):  Dependency Injection
 
     Returns:
         UserOutput: User Output
@@ -153,62 +226,197 @@ async def signup_users(user_data: RegisterUser, db: Session = Depends(get_db)):
 @app.post("/api/new_message")
 async def new_message_endpoint(
     request: NewMessageRequest,
-    db: Session = Depends(get_db),  # Inject the DB session here
+    async_db: AsyncSession = Depends(get_async_db),  # Inject the DB session here
     user_id: UUID = Depends(get_current_user_dep),
+    clients: ClientRegistry = Depends(get_clients),
 ):
     """
     Send a new message for authenticated users.
     """
     try:
-        service = ThoughtSpaceService(db=db)  # Initialize the service with the db session
+        # Async session only: every data call new_message makes has an *_async variant
+        service = ThoughtSpaceService(db=None, clients=clients, async_db=async_db)
         response = await service.new_message(request.input_text, str(user_id))
         return response
+    except StepTimeoutException as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/dashboard", tags=["Dashboard"])
 async def dashboard(
-    db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db),
     user_id: UUID = Depends(get_current_user_dep),
+    clients: ClientRegistry = Depends(get_clients),
+    limit: Optional[int] = Query(None, ge=1, le=DASHBOARD_MAX_PAGE_SIZE, description="Messages per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    stream: bool = Query(False, description="Stream every message as NDJSON"),
 ):
     """
     Dashboard endpoint to get the user's voice balance and messages.
 
+    Without limit, cursor or stream, all messages are returned in one response. With limit or
+    cursor, one page of messages is returned newest first, with a next_cursor for the following
+    page. With stream, the response is NDJSON: a {"voice_balance": ...} line, then one line per
+    message, newest first.
+
     Args:
-        db (Session, optional): Dependency Injection
+        async_db (AsyncSession, optional): Dependency Injection
         user_id (UUID, optional): Dependency Injection
+        clients (ClientRegistry, optional): Shared OpenAI and Qdrant clients
+        limit (int, optional): Page size
+        cursor (str, optional): Cursor of the page to fetch
+        stream (bool, optional): Stream all messages as NDJSON
 
     Returns:
         dict: User's voice balance and messages
     """
     try:
-        service = ThoughtSpaceService(db=db)
-        dashboard_data = await service.get_dashboard_data(str(user_id))
+        service = ThoughtSpaceService(db=None, clients=clients, async_db=async_db)
+        if stream:
+            voice_balance = await service.get_voice_balance(str(user_id))
+            if voice_balance is None:
+                raise HTTPException(status_code=404, detail="User not found or no messages available.")
+            return StreamingResponse(
+                ndjson_dashboard_stream(service, str(user_id), voice_balance), media_type="application/x-ndjson"
+            )
+        if limit is not None or cursor is not None:
+            dashboard_data = await service.get_dashboard_page(str(user_id), limit or DASHBOARD_PAGE_SIZE, cursor)
+        else:
+            dashboard_data = await service.get_dashboard_data(str(user_id))
         if dashboard_data is None:
             raise HTTPException(status_code=404, detail="User not found or no messages available.")
         return dashboard_data
+    except HTTPException:
+        raise
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/dashboard/summary", tags=["Dashboard"])
+async def dashboard_summary(
+    async_db: AsyncSession = Depends(get_lazy_async_db),
+    user_id: UUID = Depends(get_current_user_dep),
+    clients: ClientRegistry = Depends(get_clients),
+):
+    """
+    The user's voice balance and message count, for polling. Usually answered from the worker's
+    balance cache without a query.
+
+    Returns:
+        dict: voice_balance and message_count
+    """
+    service = ThoughtSpaceService(db=None, clients=clients, async_db=async_db)
+    summary = await service.get_dashboard_summary(str(user_id))
+    if summary is None:
+        raise HTTPException(status_code=404, detail="User not found.")
+    return summary
+
+
+async def ndjson_dashboard_stream(service: ThoughtSpaceService, user_id: str, voice_balance: int):
+    yield json.dumps({"voice_balance": voice_balance}) + "\n"
+    try:
+        async for message in service.stream_dashboard_messages(user_id):
+            yield json.dumps(message) + "\n"
+    except Exception as e:
+        logger.error(f"Dashboard stream failed: {e}")
+        yield json.dumps({"error": str(e)}) + "\n"
+
+
 @app.post("/api/resonance_search")
 async def resonance_search_endpoint(
     request: NewMessageRequest,
-    db: Session = Depends(get_db),
+    clients: ClientRegistry = Depends(get_clients),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of results to return"),
 ):
     """
     Endpoint for similarity search accessible to all users, including unauthenticated ones.
     """
     try:
         anonymous_user_id = "anonymous"  # Handle as needed for anonymous searches
-        service = ThoughtSpaceService(db=db)
-        response = await service.search(request.input_text)
+        # Search only reads from Qdrant, so no database session is checked out
+        service = ThoughtSpaceService(db=None, clients=clients)
+        response = await service.search(request.input_text, limit)
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/vowel_loop", tags=["Vowel Loop"])
+async def vowel_loop_endpoint(
+    request: VowelLoopRequest,
+    user_id: UUID = Depends(get_current_user_dep),
+    clients: ClientRegistry = Depends(get_clients),
+):
+    """
+    Run the Vowel Loop on the user's prompt and return the final response, for authenticated users.
+
+    The loop runs at most VOWEL_LOOP_MAX_LOOPS iterations (or the request's lower max_loops).
+
+    Args:
+        request (VowelLoopRequest): The user's prompt and optional iteration limit
+        user_id (UUID): The authenticated user
+        clients (ClientRegistry, optional): Shared OpenAI and Qdrant clients
+
+    Returns:
+        dict: The synthesized final response, the loop's status ("returned" or "max_loops") and
+            the number of iterations run
+    """
+    try:
+        loop = VowelLoop(clients, max_loops=request.max_loops)
+        response = await loop.run(request.user_prompt)
+        return {"response": response, "status": loop.status, "loops": loop.loops}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/vowel_loop/stream", tags=["Vowel Loop"])
+async def vowel_loop_stream_endpoint(
+    http_request: Request,
+    request: VowelLoopRequest,
+    user_id: UUID = Depends(get_current_user_dep),
+    clients: ClientRegistry = Depends(get_clients),
+):
+    """
+    Run the Vowel Loop and stream each stage's tokens as server-sent events, for authenticated users.
+
+    Events are produced only as fast as the client reads them, and the remaining stages are
+    abandoned as soon as the client disconnects, including while a stage is still waiting on
+    OpenAI or Qdrant. The loop runs at most VOWEL_LOOP_MAX_LOOPS iterations (or the request's
+    lower max_loops).
+
+    Args:
+        http_request (Request): Used to detect client disconnects
+        request (VowelLoopRequest): The user's prompt and optional iteration limit
+        user_id (UUID): The authenticated user
+        clients (ClientRegistry, optional): Shared OpenAI and Qdrant clients
+
+    Returns:
+        StreamingResponse: text/event-stream of stage_start, token, stage_end and done events; done
+            carries the loop's status ("returned" or "max_loops") and the number of iterations run
+    """
+
+    async def event_stream():
+        events = until_disconnected(http_request, VowelLoop(clients, max_loops=request.max_loops).stream(request.user_prompt))
+        try:
+            async for event in events:
+                yield format_sse(event)
+        except Exception as e:
+            logger.error(f"Vowel Loop stream failed: {e}")
+            yield format_sse({"event": "error", "data": str(e)})
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # @app.post("/api/revise_message_proposal", tags=["Message Revision"])
 # async def revise_message_proposal(
 #     revision_request: RevisionRequest,  # Assuming RevisionRequest is a Pydantic model you've defined
@@ -8,6 +8,12 @@ class NewMessageRequest(BaseModel):
     input_text: str
 
 
+class VowelLoopRequest(BaseModel):
+    user_prompt: str
+    # Clients may ask for fewer iterations; the server caps this at VOWEL_LOOP_MAX_LOOPS
+    max_loops: Optional[int] = Field(None, ge=1)
+
+
 class Revision(BaseModel):
     user_id: str
     message_id: str
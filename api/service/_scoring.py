@@ -0,0 +1,238 @@
+import uuid
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+from ..models._message import Message
+
+logger = logging.getLogger(__name__)
+
+
+def parse_point_id(point_id) -> uuid.UUID:
+    try:
+        if isinstance(point_id, int):
+            logger.info("scored_point.id is int, handling case")
+            return uuid.uuid4()
+        return point_id if isinstance(point_id, uuid.UUID) else uuid.UUID(point_id)
+    except ValueError:
+        logger.error(f"Invalid UUID format: {point_id}")
+        return uuid.uuid4()  # Fallback to generating a new UUID
+
+
+def parse_voice(payload: dict) -> Optional[int]:
+    # Same rules as scored_point_to_message + the Message voice validator
+    voice = payload.get("voice", 0)
+    voice = voice if voice != 0 else None
+    return None if voice is None else int(round(voice))
+
+
+def parse_revisions_count(payload: dict) -> Optional[int]:
+    # Prefer the count maintained on write; points written before it existed still carry the list
+    revisions_count = payload.get("revisions_count")
+    if revisions_count is None:
+        revisions_count = len(payload.get("revisions") or [])
+    return revisions_count or None
+
+
+@dataclass(slots=True)
+class MessageRecord:
+    """
+    Compact internal form of a search hit or stored message.
+
+    Used through dedup, rerank, reward calculation and sparse serialization; a Pydantic Message
+    is only built from it at the API boundary.
+    """
+
+    id: uuid.UUID
+    content: str
+    similarity_score: Optional[float]
+    voice: Optional[int]
+    revisions_count: Optional[int]
+    created_at: datetime
+    reranking_score: Optional[float] = None
+
+    @classmethod
+    def from_point(cls, point, similarity_score: Optional[float] = None) -> "MessageRecord":
+        """Build from a Qdrant ScoredPoint or Record. Records carry no score, so pass one explicitly."""
+        payload = point.payload or {}
+        return cls(
+            id=parse_point_id(point.id),
+            content=payload.get("content", ""),
+            similarity_score=similarity_score if similarity_score is not None else getattr(point, "score", None),
+            voice=parse_voice(payload),
+            revisions_count=parse_revisions_count(payload),
+            created_at=datetime.fromisoformat(payload.get("created_at", datetime.now().isoformat())),
+        )
+
+    def to_message(self) -> Message:
+        return Message(
+            id=self.id,
+            content=self.content,
+            similarity_score=self.similarity_score,
+            reranking_score=self.reranking_score,
+            voice=self.voice,
+            revisions_count=self.revisions_count,
+            created_at=self.created_at,
+        )
+
+
+class ScoredColumns:
+    """
+    Struct-of-arrays view of Qdrant search hits used for vectorized dedup and rerank.
+
+    voice and revisions_count use NaN where the Message field would be None.
+    """
+
+    def __init__(self, points, contents, similarity, voice, revisions_count, created_at):
+        self.points = points
+        self.contents = contents
+        self.similarity = similarity
+        self.voice = voice
+        self.revisions_count = revisions_count
+        self.created_at = created_at
+
+    @classmethod
+    def from_scored_points(cls, points) -> "ScoredColumns":
+        n = len(points)
+        contents = []
+        similarity = np.empty(n, dtype=np.float64)
+        voice = np.full(n, np.nan)
+        revisions_count = np.full(n, np.nan)
+        created_at = np.empty(n, dtype="datetime64[us]")
+        for i, point in enumerate(points):
+            payload = point.payload or {}
+            contents.append(payload.get("content", ""))
+            similarity[i] = point.score
+            point_voice = parse_voice(payload)
+            if point_voice is not None:
+                voice[i] = point_voice
+            point_revisions = parse_revisions_count(payload)
+            if point_revisions is not None:
+                revisions_count[i] = point_revisions
+            created_at[i] = datetime.fromisoformat(payload.get("created_at", datetime.now().isoformat()))
+        return cls(list(points), contents, similarity, voice, revisions_count, created_at)
+
+    def __len__(self):
+        return len(self.points)
+
+    def take(self, indices: np.ndarray) -> "ScoredColumns":
+        return ScoredColumns(
+            [self.points[i] for i in indices],
+            [self.contents[i] for i in indices],
+            self.similarity[indices],
+            self.voice[indices],
+            self.revisions_count[indices],
+            self.created_at[indices],
+        )
+
+
+def dedup_indices(columns: ScoredColumns) -> np.ndarray:
+    """
+    Indices of the earliest hit for each normalized content, in created_at order.
+    """
+    if len(columns) == 0:
+        return np.empty(0, dtype=np.intp)
+    order = np.argsort(columns.created_at, kind="stable")
+    normalized = np.array([columns.contents[i].strip().lower() for i in order], dtype=object)
+    _, first = np.unique(normalized, return_index=True)
+    return order[np.sort(first)]
+
+
+def rerank_scores(columns: ScoredColumns, now: Optional[datetime] = None) -> np.ndarray:
+    """
+    log(1 + (100 * similarity * voice ** 0.1) ** revisions_count / age_seconds), computed column-wise.
+
+    A missing voice counts as a factor of 1 and a missing revisions_count as an exponent of 1.
+    """
+    now = np.datetime64(now if now is not None else datetime.now(), "us")
+    age_seconds = (now - columns.created_at).astype(np.int64) / 1e6
+    voice_value = np.where(np.isnan(columns.voice), 1.0, np.power(np.nan_to_num(columns.voice), 0.1))
+    exponent = np.where(np.isnan(columns.revisions_count), 1.0, columns.revisions_count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rerank = np.power(100 * columns.similarity * voice_value, exponent) / age_seconds
+        return np.log(rerank + 1)  # in case 0 < rerank < 1
+
+
+def novelty_scores(similarity: np.ndarray, reranking: np.ndarray) -> np.ndarray:
+    # similarity score for exact matches = 1.000001, and this messes with math
+    with np.errstate(invalid="ignore"):
+        return np.sqrt((1.0001 - similarity) * reranking)
+
+
+def top_k(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """
+    Indices of the k highest scores, highest first. Ties keep their original order, matching a
+    stable sort, so the result equals sorted(..., reverse=True)[:k].
+    """
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    kth_value = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    above = np.flatnonzero(scores > kth_value)
+    ties = np.flatnonzero(scores == kth_value)[: k - len(above)]
+    selected = np.sort(np.concatenate([above, ties]))
+    return selected[np.argsort(-scores[selected], kind="stable")]
+
+
+class RankedResults:
+    """
+    Deduplicated, reranked search hits in final order. Messages and sparse dicts are only built
+    for these rows.
+    """
+
+    def __init__(self, columns: ScoredColumns, reranking: np.ndarray):
+        self.columns = columns
+        self.reranking = reranking
+        self.novelty = novelty_scores(columns.similarity, reranking)
+        self.ids = [parse_point_id(point.id) for point in columns.points]
+
+    @classmethod
+    def from_scored_points(cls, points, limit: Optional[int] = None, now: Optional[datetime] = None):
+        columns = ScoredColumns.from_scored_points(points)
+        columns = columns.take(dedup_indices(columns))
+        scores = rerank_scores(columns, now)
+        order = top_k(scores, limit)
+        return cls(columns.take(order), scores[order])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _optional_int(self, column: np.ndarray, i: int) -> Optional[int]:
+        return None if np.isnan(column[i]) else int(column[i])
+
+    def to_records(self) -> List[MessageRecord]:
+        return [
+            MessageRecord(
+                id=self.ids[i],
+                content=self.columns.contents[i],
+                similarity_score=float(self.columns.similarity[i]),
+                voice=self._optional_int(self.columns.voice, i),
+                revisions_count=self._optional_int(self.columns.revisions_count, i),
+                created_at=self.columns.created_at[i].astype(datetime),
+                reranking_score=float(self.reranking[i]),
+            )
+            for i in range(len(self))
+        ]
+
+    def to_messages(self) -> List[Message]:
+        return [record.to_message() for record in self.to_records()]
+
+    def to_sparse_dicts(self) -> List[dict]:
+        sparse_dicts = []
+        for i in range(len(self)):
+            fields = {
+                "id": str(self.ids[i]),
+                "content": self.columns.contents[i],
+                "reranking": float(self.reranking[i]),
+                "similarity": float(self.columns.similarity[i]),
+                "voice": self._optional_int(self.columns.voice, i),
+                "revisions_count": self._optional_int(self.columns.revisions_count, i),
+                "novelty": float(self.novelty[i]),
+            }
+            sparse_dicts.append({k: v for k, v in fields.items() if v is not None})
+        return sparse_dicts
@@ -0,0 +1,72 @@
+import os
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Tuple
+
+
+class StepTimeoutException(Exception):
+    """Exception raised when one step of a request exceeds its timeout."""
+
+    def __init__(self, step: str, timeout: float):
+        self.step = step
+        self.timeout = timeout
+        super().__init__(f"{step} timed out after {timeout}s")
+
+
+@dataclass
+class NewMessageTimeouts:
+    """Per-step timeouts of ThoughtSpaceService.new_message, in seconds."""
+
+    embed: float = 10.0
+    search: float = 5.0
+    write: float = 5.0
+    settle: float = 5.0
+
+    @classmethod
+    def from_env(cls) -> "NewMessageTimeouts":
+        return cls(
+            embed=float(os.environ.get("NEW_MESSAGE_EMBED_TIMEOUT_SECONDS", "10")),
+            search=float(os.environ.get("NEW_MESSAGE_SEARCH_TIMEOUT_SECONDS", "5")),
+            write=float(os.environ.get("NEW_MESSAGE_WRITE_TIMEOUT_SECONDS", "5")),
+            settle=float(os.environ.get("NEW_MESSAGE_SETTLE_TIMEOUT_SECONDS", "5")),
+        )
+
+
+async def run_step(step: str, awaitable: Awaitable, timeout: float):
+    """
+    Await one step, raising StepTimeoutException if it takes longer than timeout seconds.
+    """
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError as e:
+        raise StepTimeoutException(step, timeout) from e
+
+
+async def run_to_completion(*steps: Tuple[str, Awaitable, float]) -> list:
+    """
+    Run independent (name, awaitable, timeout) steps at once and return their results in order.
+
+    No step is ever cancelled, so a write is never interrupted mid-statement or left in flight:
+    a failing step leaves the others running, and a step that overruns its timeout is still
+    awaited until it finishes. The caller therefore knows every write has settled before it
+    undoes any of them. Failures are returned in place of their results, with
+    StepTimeoutException for a step that overran, whatever it eventually returned.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    tasks = [asyncio.ensure_future(awaitable) for _, awaitable, _ in steps]
+    overran = set()
+    for index, ((_, _, timeout), task) in enumerate(zip(steps, tasks)):
+        # asyncio.wait, unlike wait_for, leaves the task running when the timeout expires
+        done, _ = await asyncio.wait({task}, timeout=max(0.0, started + timeout - loop.time()))
+        if not done:
+            overran.add(index)
+    # Shielded so that even cancelling the caller does not interrupt a write
+    await asyncio.shield(asyncio.gather(*tasks, return_exceptions=True))
+    results = []
+    for index, ((step, _, timeout), task) in enumerate(zip(steps, tasks)):
+        if index in overran:
+            results.append(StepTimeoutException(step, timeout))
+        else:
+            results.append(task.exception() or task.result())
+    return results
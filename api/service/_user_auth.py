@@ -1,7 +1,10 @@
 from datetime import datetime, timedelta, timezone
 from typing import Annotated, Optional
 
+from sqlalchemy import update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
@@ -10,21 +13,26 @@ from jose import JWTError, jwt
 from uuid import UUID
 from dotenv import load_dotenv, find_dotenv
 import os
+import logging
 
 from ..models._user_auth import TokenData, RegisterUser
 from ..data._db_config import get_db
+from ..data._sqlalchemy_models import USER
 from ..utils._helpers import (
     verify_password,
+    verify_and_update_password_async,
     credentials_exception,
     create_refresh_token,
     validate_refresh_token,
     get_current_user_dep,
 )
 
-from ..data._user_auth import get_user, db_signup_users, InvalidUserException
+from ..data._user_auth import get_user, get_user_async, db_signup_users, db_signup_users_async, InvalidUserException
 
 _: bool = load_dotenv(find_dotenv())
 
+logger = logging.getLogger(__name__)
+
 # to get a string like this run:
 # openssl rand -hex 32
 SECRET_KEY = os.environ.get("SECRET_KEY")
@@ -61,6 +69,35 @@ def authenticate_user(db, username: str, password: str):
     return user
 
 
+async def authenticate_user_async(db: AsyncSession, username: str, password: str):
+    """
+    Same as authenticate_user, awaiting the user lookup on an AsyncSession.
+
+    The password is checked in the password hasher's pool rather than on the event loop. A stored
+    hash that uses an outdated scheme or cost is replaced with a fresh one on successful login;
+    if storing it fails, the login still succeeds and the rehash is retried on the next one.
+    """
+    user = await get_user_async(db, username)
+    if not user:
+        return False
+    valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not valid:
+        return False
+    if new_hash is not None:
+        # Detached while rehashing, so a rollback cannot expire the attributes the caller reads
+        db.expunge(user)
+        try:
+            await db.execute(update(USER).where(USER.id == user.id).values(hashed_password=new_hash))
+            await db.commit()
+            set_committed_value(user, "hashed_password", new_hash)
+        except Exception as e:
+            await db.rollback()
+            logger.warning(f"Failed to store rehashed password for user {user.id}: {e}")
+        finally:
+            db.add(user)
+    return user
+
+
 def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None):
     """
     Create an access token using the provided data and expiration delta.
@@ -131,7 +168,10 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Se
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = get_user(db, username=token_data.username)
+    if isinstance(db, AsyncSession):
+        user = await get_user_async(db, username=token_data.username)
+    else:
+        user = get_user(db, username=token_data.username)
     if user is None:
         raise credentials_exception
     return user
@@ -146,12 +186,15 @@ async def service_login_for_access_token(
 
     Args:
         form_data (OAuth2PasswordRequestForm): The form data containing the username and password.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
+        db (Session | AsyncSession, optional): The database session. Defaults to Depends(get_db).
 
     Returns:
         dict: A dictionary containing the access token, token type, and user information.
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    if isinstance(db, AsyncSession):
+        user = await authenticate_user_async(db, form_data.username, form_data.password)
+    else:
+        user = authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -182,7 +225,7 @@ async def service_signup_users(user_data: RegisterUser, db: Session = Depends(ge
 
     Args:
         user_data (RegisterUser): The user data to be registered.
-        db (Session, optional): The database session. Defaults to Depends(get_db).
+        db (Session | AsyncSession, optional): The database session. Defaults to Depends(get_db).
 
     Returns:
         The result of the user registration.
@@ -191,6 +234,8 @@ async def service_signup_users(user_data: RegisterUser, db: Session = Depends(ge
         HTTPException: If there is an invalid user exception or any other unforeseen exception.
     """
     try:
+        if isinstance(db, AsyncSession):
+            return await db_signup_users_async(user_data, db)
         return await db_signup_users(user_data, db)
     except InvalidUserException as e:
         # Catch the InvalidUserException and raise an HTTPException
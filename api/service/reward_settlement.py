@@ -0,0 +1,83 @@
+import os
+import random
+import asyncio
+import logging
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from ..data._reward_events import settle_reward_events
+
+logger = logging.getLogger(__name__)
+
+
+class RewardSettlementWorker:
+    """
+    Background task that settles queued reward events into user voice balances.
+
+    Batches are settled back to back while the queue is full and then polled every `interval`
+    seconds, so balances catch up within a few seconds of /api/new_message returning. Failures back
+    off exponentially; unsettled events simply stay queued.
+
+    Args:
+        session_factory (Callable[[], Session]): Creates a session per batch, e.g. SessionLocal.
+        interval (float): Seconds between polls once the queue is drained.
+        batch_size (int): Maximum events settled per transaction.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], interval: float = 1.0, batch_size: int = 500):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.settled = 0
+        self.failures = 0
+        self._task = None
+
+    @classmethod
+    def from_env(cls, session_factory: Callable[[], Session]) -> "RewardSettlementWorker":
+        return cls(
+            session_factory,
+            interval=float(os.environ.get("REWARD_SETTLEMENT_INTERVAL_SECONDS", "1.0")),
+            batch_size=int(os.environ.get("REWARD_SETTLEMENT_BATCH_SIZE", "500")),
+        )
+
+    def settle_once(self) -> int:
+        with self.session_factory() as db:
+            return settle_reward_events(db, self.batch_size)
+
+    async def run(self):
+        consecutive_failures = 0
+        while True:
+            try:
+                # The sync session runs in a thread so settlement never blocks the event loop
+                settled = await asyncio.to_thread(self.settle_once)
+                self.settled += settled
+                consecutive_failures = 0
+                if settled >= self.batch_size:
+                    continue
+                await asyncio.sleep(self.interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                consecutive_failures += 1
+                backoff = min(60.0, self.interval * 2**consecutive_failures)
+                logger.error(f"Reward settlement failed: {e}, retrying in ~{backoff:.1f}s")
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def metrics(self) -> dict:
+        return {"settled": self.settled, "failures": self.failures}
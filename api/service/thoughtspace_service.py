@@ -1,21 +1,39 @@
-from typing import List
+from typing import List, Optional
 
 # import tiktoken
 from ..data.thoughtspace_data import ThoughtSpaceData
+from ..data.client_registry import ClientRegistry
+from ._scoring import RankedResults, MessageRecord, parse_revisions_count
+from ._steps import NewMessageTimeouts, run_step, run_to_completion
 from ..models._message import Message, Revision, MessagesResponse, RevisionRequest
 from datetime import datetime
 from qdrant_client.http.models import ScoredPoint
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+import os
 import math
 import uuid
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+DASHBOARD_PAGE_SIZE = int(os.environ.get("DASHBOARD_PAGE_SIZE", "50"))
+DASHBOARD_MAX_PAGE_SIZE = int(os.environ.get("DASHBOARD_MAX_PAGE_SIZE", "500"))
+# Message ids fetched from Postgres and retrieved from Qdrant per round trip when streaming
+DASHBOARD_STREAM_CHUNK_SIZE = int(os.environ.get("DASHBOARD_STREAM_CHUNK_SIZE", "256"))
+
 
 class ThoughtSpaceService:
-    def __init__(self, db: Session):
-        self.thoughtspace_data = ThoughtSpaceData(db=db)
+    def __init__(
+        self,
+        db: Session,
+        clients: Optional[ClientRegistry] = None,
+        async_db: Optional[AsyncSession] = None,
+        timeouts: Optional[NewMessageTimeouts] = None,
+    ):
+        self.thoughtspace_data = ThoughtSpaceData(db=db, clients=clients, async_db=async_db)
+        self.timeouts = timeouts if timeouts else NewMessageTimeouts.from_env()
 
     async def embed_and_search_messages(
         self, input_text: str, search_limit: int = 200, with_vectors: bool = False
@@ -61,6 +79,12 @@ class ThoughtSpaceService:
         print("done ranking")
         return sorted(messages, key=lambda msg: msg.reranking_score, reverse=True)
 
+    def rank_search_results(self, search_results, limit: Optional[int] = None) -> RankedResults:
+        """
+        Columnar equivalent of rerank(dedup(messages)), keeping only the top `limit` results.
+        """
+        return RankedResults.from_scored_points(search_results or [], limit)
+
     def scored_point_to_message(self, scored_point: ScoredPoint) -> Message:
         try:
             if isinstance(scored_point.id, int):
@@ -75,7 +99,6 @@ class ThoughtSpaceService:
         content = scored_point.payload.get("content", "")
         similarity_score = scored_point.score  # Assuming ScoredPoint has a 'score' attribute
         voice = scored_point.payload.get("voice", 0)
-        revisions_payload = scored_point.payload.get("revisions", [])
         created_at_str = scored_point.payload.get(
             "created_at", datetime.now().isoformat()
         )  # Default to now if not present
@@ -87,7 +110,7 @@ class ThoughtSpaceService:
         voice = voice if voice != 0 else None
 
         # Replace list of revisions with count, only include if count is not 0
-        revisions_count = len(revisions_payload) if revisions_payload else None
+        revisions_count = parse_revisions_count(scored_point.payload)
 
         return Message(
             id=message_id,
@@ -104,12 +127,11 @@ class ThoughtSpaceService:
         # Assuming there's no similarity_score in the record, so we set a default or calculate it differently
         similarity_score = 0  # or some other default value or calculation
         voice = record.payload.get("voice", 0)  # Assuming voice might be in the payload
-        revisions_payload = record.payload.get("revisions", [])
         created_at_str = record.payload.get("created_at", datetime.now().isoformat())
 
         created_at = datetime.fromisoformat(created_at_str)
         voice = voice if voice != 0 else None
-        revisions_count = len(revisions_payload) if revisions_payload else None
+        revisions_count = parse_revisions_count(record.payload)
 
         return Message(
             id=message_id,
@@ -137,8 +159,8 @@ class ThoughtSpaceService:
         return {k: v for k, v in fields.items() if v is not None}
 
     def records_to_sparse_dicts(self, records):
-
-        messages = [self.record_to_message(record) for record in records]
+        # Compact records skip Pydantic validation; there is no similarity score for stored records
+        messages = [MessageRecord.from_point(record, similarity_score=0) for record in records]
         print(f"messages {messages}")
         # Assuming reranking_score and other calculations are handled elsewhere or set to defaults
         sparse_dicts = [self.message_to_sparse_dict(message) for message in messages]
@@ -150,34 +172,14 @@ class ThoughtSpaceService:
         novelty_scores = [1 - result.score for result in search_results]
         return novelty_scores
 
-    async def reward_authors_of_relevant_messages(self, relevant_messages):
-        print("reward_authors_of_relevant_messages")
-        voice_rewards = {}  # Dictionary to hold aggregated voice rewards
-
-        # Step 1: Batch fetch user IDs for message authors
-        message_ids = [str(msg.id) for msg in relevant_messages]
-        message_user_mapping = self.thoughtspace_data.get_messages_user_mapping(message_ids)
-
-        # Process each message_id in the mapping
+    def voice_reward_events(self, messages_by_id, message_user_mapping):
+        rewards = []
         for message_id, author_id in message_user_mapping.items():
-            # Find the relevant message object to calculate its voice reward
-            relevant_message = next((msg for msg in relevant_messages if str(msg.id) == message_id), None)
+            relevant_message = messages_by_id.get(message_id)
             if relevant_message is None:
-                print("relevant_message is none")
                 continue  # Skip if the message object is not found in the relevant_messages list
-
-            voice_reward = self.calculate_voice_reward(relevant_message)
-
-            # Aggregate voice rewards by author_id
-            if author_id in voice_rewards:
-                voice_rewards[author_id] += voice_reward
-            else:
-                voice_rewards[author_id] = voice_reward
-
-        # Bulk update voice balances
-        self.thoughtspace_data.bulk_update_user_voice_balances(voice_rewards)
-        print(f"Processed rewards for {len(message_user_mapping)} messages")
-        # Bulk update voice balances
+            rewards.append((relevant_message.id, author_id, self.calculate_voice_reward(relevant_message)))
+        return rewards
 
     def calculate_voice_reward(self, message):
         # Example reward calculation based on reranking score
@@ -194,29 +196,97 @@ class ThoughtSpaceService:
 
         # Ensure the reward is a positive number
         reward = max(reward, 0)
-        print(f"reward {reward} for message {message.id}")
 
         return reward
 
-    async def new_message(self, input_text: str, user_id: str):
-        embedding = await self.thoughtspace_data.embed_text(input_text)
-        search_results = await self.thoughtspace_data.search_similar_messages(embedding)
-        messages = [self.scored_point_to_message(result) for result in search_results]
+    async def new_message(self, input_text: str, user_id: str, limit: Optional[int] = None):
+        """
+        Store a new message and return the ranked messages it resonates with.
+
+        Runs as a dependency graph rather than a sequence: once the input is embedded, the search,
+        the Qdrant upsert and the message row insert run concurrently, since none of them needs
+        another's result. The author's balance and the rewards for the surfaced messages are then
+        written in one transaction. Each step has its own timeout (see NewMessageTimeouts).
+
+        The two writes are never cancelled: a write that overruns its timeout counts as failed but
+        is still awaited until it finishes. Once both have finished, if either failed, whichever
+        landed is removed again so Qdrant and messages_table stay consistent, and the error is
+        raised. The request can therefore take longer than the write timeout; the Qdrant and
+        database clients' own timeouts bound how long. A failed
+        search does not lose the message: it is stored without related messages or rewards.
+
+        Raises:
+            StepTimeoutException: If embedding or one of the writes exceeds its timeout.
+            MessageCreationException: If one of the writes fails.
+        """
         message_id = str(uuid.uuid4())
-        await self.thoughtspace_data.upsert_message(message_id, input_text, embedding)
-        self.thoughtspace_data.create_message(user_id, message_id)
-        relevant_messages = self.rerank(self.dedup(messages))
-        self.reward_authors_of_relevant_messages(relevant_messages)
-        sparse_messages = [self.message_to_sparse_dict(msg) for msg in relevant_messages]
+        embedding = await run_step("embed", self.thoughtspace_data.embed_text(input_text), self.timeouts.embed)
+        search = asyncio.ensure_future(
+            run_step("search", self.thoughtspace_data.search_similar_messages(embedding), self.timeouts.search)
+        )
+        try:
+            write_results = await run_to_completion(
+                ("upsert", self.thoughtspace_data.upsert_message(message_id, input_text, embedding), self.timeouts.write),
+                (
+                    "create_message",
+                    self.thoughtspace_data.create_message_async(user_id, message_id, input_text),
+                    self.timeouts.write,
+                ),
+            )
+            failures = [result for result in write_results if isinstance(result, BaseException)]
+            if failures:
+                await self.discard_new_message(message_id, user_id)
+                raise failures[0]
+            try:
+                search_results = await search
+            except Exception as e:
+                logger.warning(f"Search for new message {message_id} failed, storing it without related messages: {e}")
+                search_results = []
+        finally:
+            search.cancel()
+        # The search races the upsert, so it may already see the new message itself
+        search_results = [point for point in search_results or [] if str(point.id) != message_id]
+        ranked = self.rank_search_results(search_results, limit)
         # token_count = len(tiktoken.get_encoding("cl100k_base").encode(input_text))
         token_count = 100
-        self.thoughtspace_data.update_user_voice_balance(user_id, token_count)
+        await run_step(
+            "settle", self.settle_new_message(ranked.to_records(), message_id, user_id, token_count), self.timeouts.settle
+        )
 
-        return {"token_count": token_count, "messages": sparse_messages}
+        return {"token_count": token_count, "messages": ranked.to_sparse_dicts()}
+
+    async def discard_new_message(self, message_id: str, user_id: str):
+        """
+        Remove both writes of a new message once neither is still running. Both removals are
+        idempotent, so this is safe whichever write landed, including one that finished after
+        its timeout.
+        """
+        results = await asyncio.gather(
+            self.thoughtspace_data.delete_message_point(message_id),
+            self.thoughtspace_data.remove_message_async(user_id, message_id),
+            return_exceptions=True,
+        )
+        for store, result in zip(("Qdrant point", "messages_table row"), results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to remove the {store} of abandoned message {message_id}: {result}")
+
+    async def settle_new_message(self, relevant_messages, source_message_id: str, user_id: str, voice_amount: float):
+        messages_by_id = {str(msg.id): msg for msg in relevant_messages}
+        message_user_mapping = await self.thoughtspace_data.get_messages_user_mapping_async(list(messages_by_id))
+        rewards = self.voice_reward_events(messages_by_id, message_user_mapping)
+        await self.thoughtspace_data.settle_new_message_async(user_id, voice_amount, source_message_id, rewards)
 
     async def get_dashboard_data(self, user_id: str):
+        if self.thoughtspace_data.metadata_projection:
+            # Served from Postgres; Qdrant is only asked for messages missing from the projection
+            voice_balance = await self.get_voice_balance(user_id)
+            if voice_balance is None:
+                return None
+            messages = [message async for message in self.stream_dashboard_messages(user_id)]
+            return {"voice_balance": voice_balance, "messages": messages}
+
         # Fetch user voice balance and message IDs from the database
-        user_data = self.thoughtspace_data.get_user_voice_balance_and_messages(user_id)
+        user_data = await self.thoughtspace_data.get_user_voice_balance_and_messages_async(user_id)
         if not user_data:
             return None  # Or handle the case where the user or messages are not found
 
@@ -231,15 +301,97 @@ class ThoughtSpaceService:
         # Return the user's voice balance and their messages in sparse dictionary form
         return {"voice_balance": user_data["voice_balance"], "messages": sparse_messages}
 
-    async def search(self, input_text: str) -> List[dict]:
-        # Embed the input text
-        embedding = await self.thoughtspace_data.embed_text(input_text)
-        # Search Qdrant for similar messages
-        search_results = await self.thoughtspace_data.search_similar_messages(embedding)
-        # Convert search results to Message instances
-        messages = [self.scored_point_to_message(result) for result in search_results]
-        # Deduplicate and rerank messages
-        resonant_messages = self.rerank(self.dedup(messages))
+    async def get_voice_balance(self, user_id: str) -> Optional[int]:
+        return await self.thoughtspace_data.get_user_voice_balance_async(user_id)
+
+    async def get_dashboard_summary(self, user_id: str) -> Optional[dict]:
+        """Voice balance and message count, usually served from the worker's balance cache."""
+        return await self.thoughtspace_data.get_user_summary_async(user_id)
+
+    async def _retrieve_sparse_dicts(self, message_ids) -> List[dict]:
+        records = await self.thoughtspace_data.retrieve_messages([str(message_id) for message_id in message_ids])
+        records_by_id = {str(record.id): record for record in records or []}
+        # Qdrant returns records in no particular order; keep the page's newest-first order
+        ordered = [records_by_id[str(message_id)] for message_id in message_ids if str(message_id) in records_by_id]
+        messages = [MessageRecord.from_point(record, similarity_score=0) for record in ordered]
+        return [self.message_to_sparse_dict(message) for message in messages]
+
+    def _metadata_sparse_dicts(self, rows) -> List[dict]:
+        # Same sparse form as records_to_sparse_dicts, built from message_metadata_table rows
+        messages = [
+            MessageRecord(
+                id=row.id,
+                content=row.content_preview,
+                similarity_score=0,
+                voice=row.voice or None,
+                revisions_count=row.revisions_count or None,
+                created_at=row.created_at,
+            )
+            for row in rows
+        ]
+        return [self.message_to_sparse_dict(message) for message in messages]
+
+    async def _projected_sparse_dicts(self, rows) -> List[dict]:
+        # Messages without a projection row are retrieved from Qdrant, in the page's order
+        missing = [row.id for row in rows if row.content_preview is None]
+        retrieved = {message["id"]: message for message in await self._retrieve_sparse_dicts(missing)} if missing else {}
+        projected = iter(self._metadata_sparse_dicts([row for row in rows if row.content_preview is not None]))
+        messages = []
+        for row in rows:
+            message = next(projected) if row.content_preview is not None else retrieved.get(str(row.id))
+            if message is not None:
+                messages.append(message)
+        return messages
+
+    async def _dashboard_page(self, user_id: str, limit: int, cursor: Optional[str]):
+        """
+        (sparse_dicts, next_cursor) from the metadata projection when enabled, else ids from Postgres plus a Qdrant retrieve.
+
+        Projected messages carry their content_preview (truncated to MESSAGE_PREVIEW_CHARS) as
+        content; those without a projection row are retrieved from Qdrant with their full content.
+        """
+        if self.thoughtspace_data.metadata_projection:
+            rows, next_cursor = await self.thoughtspace_data.get_metadata_page_async(user_id, limit, cursor)
+            return await self._projected_sparse_dicts(rows), next_cursor
+        message_ids, next_cursor = await self.thoughtspace_data.get_message_page_async(user_id, limit, cursor)
+        return (await self._retrieve_sparse_dicts(message_ids) if message_ids else []), next_cursor
+
+    async def get_dashboard_page(self, user_id: str, limit: int = DASHBOARD_PAGE_SIZE, cursor: Optional[str] = None):
+        """
+        The user's voice balance and one page of their messages, newest first.
+
+        Returns:
+            dict: voice_balance, message_count, messages and next_cursor (None on the last page), or None if the user does not exist.
+
+        Raises:
+            InvalidCursorException: If the cursor cannot be decoded.
+        """
+        summary = await self.get_dashboard_summary(user_id)
+        if summary is None:
+            return None
+        messages, next_cursor = await self._dashboard_page(user_id, limit, cursor)
+        return {**summary, "messages": messages, "next_cursor": next_cursor}
+
+    async def stream_dashboard_messages(self, user_id: str, chunk_size: int = DASHBOARD_STREAM_CHUNK_SIZE):
+        """
+        Yield all of the user's messages as sparse dicts, newest first.
+
+        Walks the keyset pages chunk_size messages at a time and finishes each chunk before reading
+        the next, so memory stays bounded by one chunk however long the history is.
+        """
+        cursor = None
+        while True:
+            messages, cursor = await self._dashboard_page(user_id, chunk_size, cursor)
+            for message in messages:
+                yield message
+            if cursor is None:
+                return
+
+    async def search(self, input_text: str, limit: Optional[int] = None) -> List[dict]:
+        # Embed and search Qdrant, or reuse this worker's cached hits for a repeated query
+        search_results = await self.thoughtspace_data.search_by_text(input_text)
+        # Deduplicate and rerank against the current time, building Message instances only for the returned rows
+        resonant_messages = self.rank_search_results(search_results, limit).to_messages()
         # Convert messages to sparse format
         # sparse_messages = [self.message_to_sparse_dict(msg) for msg in resonant_messages]
         # print("sparse now")
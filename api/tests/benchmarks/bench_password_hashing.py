@@ -0,0 +1,74 @@
+"""
+Benchmark for password hashing cost and its effect on the event loop.
+
+Run with: python -m api.tests.benchmarks.bench_password_hashing
+
+For each scheme and cost, reports the time of one hash, then runs a burst of LOGINS concurrent verifications
+through PasswordHasher and measures the worst event loop stall seen by a 5 ms ticker meanwhile. Verifying
+inline (the old path) stalls the loop for the whole burst; the process pool should keep the stall near one
+tick. Pick PASSWORD_HASH_SCHEMES and PASSWORD_HASH_ROUNDS from the single-hash times, aiming for a login
+that costs tens of milliseconds, and rehash-on-login migrates existing users.
+"""
+
+import asyncio
+import time
+
+from api.utils._passwords import PasswordHasher, build_context
+
+# (scheme, rounds); None is passlib's default cost. bcrypt and argon2 are skipped unless installed.
+CONFIGS = [("sha256_crypt", None), ("sha256_crypt", 100_000), ("sha256_crypt", 20_000), ("bcrypt", 12), ("argon2", None)]
+LOGINS = 8
+
+
+async def worst_stall(run):
+    stalls = []
+
+    async def ticker():
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(0.005)
+            now = time.perf_counter()
+            stalls.append(now - last - 0.005)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await run()
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(0.01)  # let the ticker record a stall the burst itself caused
+    task.cancel()
+    return elapsed, max(stalls)
+
+
+async def main():
+    print(f"{'scheme':>14} {'rounds':>8} {'hash ms':>9} {'mode':>8} {'burst ms':>9} {'stall ms':>9}")
+    for scheme, rounds in CONFIGS:
+        try:
+            context = build_context((scheme,), rounds)
+            hashed = context.hash("password")
+        except Exception as e:
+            print(f"{scheme:>14} skipped: {e}")
+            continue
+        start = time.perf_counter()
+        context.verify("password", hashed)
+        hash_ms = (time.perf_counter() - start) * 1000
+
+        async def inline():
+            for _ in range(LOGINS):
+                context.verify("password", hashed)
+
+        hasher = PasswordHasher((scheme,), rounds, max_workers=2, executor="process")
+        await hasher.verify_and_update("password", hashed)  # start the worker processes
+
+        async def pooled():
+            await asyncio.gather(*(hasher.verify_and_update("password", hashed) for _ in range(LOGINS)))
+
+        for mode, run in (("inline", inline), ("process", pooled)):
+            elapsed, stall = await worst_stall(run)
+            print(f"{scheme:>14} {str(rounds):>8} {hash_ms:>9.1f} {mode:>8} {elapsed * 1000:>9.1f} {stall * 1000:>9.1f}")
+        hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
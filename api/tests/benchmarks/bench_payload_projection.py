@@ -0,0 +1,65 @@
+"""
+Benchmark for payload projection in Qdrant searches.
+
+Run with: python -m api.tests.benchmarks.bench_payload_projection
+
+Compares the size and parse time of a search response carrying full payloads, including the
+revisions list, against one projected to MESSAGE_PAYLOAD_FIELDS. Parsing goes through the same
+pydantic models qdrant-client uses for REST responses.
+"""
+
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import List
+
+from pydantic import TypeAdapter
+from qdrant_client.http import models
+
+from api.data.qdrant_client import MESSAGE_PAYLOAD_FIELDS
+
+LIMITS = [40, 200]
+REVISIONS = 20
+REPEATS = 20
+
+
+def make_hits(n):
+    hits = []
+    for i in range(n):
+        revisions = [{"content": f"revision {j} of message {i} " * 8, "voice": j} for j in range(REVISIONS)]
+        payload = {
+            "content": f"message {i} " * 40,
+            "created_at": datetime.now().isoformat(),
+            "voice": i % 50,
+            "revisions": revisions,
+            "revisions_count": len(revisions),
+        }
+        hits.append({"id": str(uuid.uuid4()), "version": 1, "score": 0.9, "payload": payload})
+    return hits
+
+
+def project(hits):
+    return [{**hit, "payload": {k: v for k, v in hit["payload"].items() if k in MESSAGE_PAYLOAD_FIELDS}} for hit in hits]
+
+
+def best_parse_ms(body, adapter):
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        adapter.validate_json(body)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    adapter = TypeAdapter(List[models.ScoredPoint])
+    print(f"{'limit':>6} {'payload':>10} {'KiB':>10} {'parse ms':>10}")
+    for limit in LIMITS:
+        hits = make_hits(limit)
+        for label, body in (("full", json.dumps(hits)), ("projected", json.dumps(project(hits)))):
+            print(f"{limit:>6} {label:>10} {len(body) / 1024:>10.1f} {best_parse_ms(body, adapter):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
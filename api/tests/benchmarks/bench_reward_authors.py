@@ -0,0 +1,60 @@
+"""
+Benchmark for building the reward events of ThoughtSpaceService.settle_new_message.
+
+Run with: python -m api.tests.benchmarks.bench_reward_authors
+
+The database calls are stubbed out, so the timings cover indexing and building reward events only. Time per
+message should stay roughly flat as the number of relevant messages grows.
+"""
+
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+from api.data.client_registry import ClientRegistry
+from api.service._scoring import MessageRecord
+from api.service.thoughtspace_service import ThoughtSpaceService
+
+SIZES = [200, 2_000, 20_000]
+AUTHORS = 500
+REPEATS = 5
+
+
+def make_records(n):
+    return [
+        MessageRecord(
+            id=uuid.uuid4(),
+            content=f"message {i}",
+            similarity_score=0.9,
+            voice=None,
+            revisions_count=None,
+            created_at=datetime.now(),
+            reranking_score=float(i % 7),
+        )
+        for i in range(n)
+    ]
+
+
+def main():
+    clients = ClientRegistry(openai_client=AsyncMock(), qdrant_client=AsyncMock())
+    service = ThoughtSpaceService(db=MagicMock(), clients=clients)
+    authors = [uuid.uuid4() for _ in range(AUTHORS)]
+    service.thoughtspace_data.settle_new_message = MagicMock()
+
+    print(f"{'messages':>10} {'best ms':>10} {'us/message':>12}")
+    for n in SIZES:
+        records = make_records(n)
+        mapping = {str(record.id): authors[i % AUTHORS] for i, record in enumerate(records)}
+        service.thoughtspace_data.get_messages_user_mapping = MagicMock(return_value=mapping)
+        best = float("inf")
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            asyncio.run(service.settle_new_message(records, uuid.uuid4(), authors[0], 100))
+            best = min(best, time.perf_counter() - started)
+        print(f"{n:>10} {best * 1000:>10.2f} {best / n * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import uuid
+import asyncio
+import pytest
+import pytest_asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from api.data._sqlalchemy_models import Base, USER
+from api.data._voice_balances import BALANCE_CHANNEL, notify_balance_change
+from api.data.balance_cache import BalanceCache, BalanceInvalidationListener
+from api.data.client_registry import ClientRegistry
+from api.data.thoughtspace_data import ThoughtSpaceData
+
+USER_ID = uuid.uuid4()
+
+
+def test_reads_that_race_a_write_are_not_stored():
+    cache = BalanceCache()
+    version = cache.version
+    cache.invalidate([USER_ID])
+    cache.set(USER_ID, {"voice_balance": 1, "message_count": 0}, version)
+
+    assert cache.get(USER_ID) is None
+
+
+def test_a_read_stored_between_commit_and_invalidation_is_not_counted_twice():
+    cache = BalanceCache()
+    other = uuid.uuid4()
+    cache.set(other, {"voice_balance": 1, "message_count": 1}, cache.version)
+    # The reader reads the version, then queries after the write has committed 10 -> 15 ...
+    version = cache.version
+    cache.set(USER_ID, {"voice_balance": 15, "message_count": 2}, version)
+    # ... and the writer's post-commit invalidation lands afterwards
+    cache.invalidate([str(USER_ID)])
+
+    assert cache.get(USER_ID) is None
+    assert cache.get(other) == {"voice_balance": 1, "message_count": 1}
+
+
+def test_cache_only_serves_while_its_listener_is_connected():
+    cache = BalanceCache()
+    cache.set(USER_ID, {"voice_balance": 10, "message_count": 2}, cache.version)
+    BalanceInvalidationListener(cache, connect=AsyncMock())
+
+    assert cache.get(USER_ID) is None
+    cache.listening = True
+    assert cache.get(USER_ID) == {"voice_balance": 10, "message_count": 2}
+
+
+def test_notifications_invalidate_other_workers_writes_only():
+    cache = BalanceCache()
+    listener = BalanceInvalidationListener(cache, connect=AsyncMock())
+    cache.listening = True
+    other = uuid.uuid4()
+    for user_id in (USER_ID, other):
+        cache.set(user_id, {"voice_balance": 1, "message_count": 1}, cache.version)
+
+    listener.on_notification(None, 1, BALANCE_CHANNEL, f"{cache.origin}:{USER_ID}")
+    assert cache.get(USER_ID) is not None
+    listener.on_notification(None, 1, BALANCE_CHANNEL, f":{USER_ID}")
+
+    assert cache.get(USER_ID) is None
+    assert cache.get(other) is not None
+    assert (listener.notifications, listener.own_notifications) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_listener_reconnects_and_clears_the_cache():
+    cache = BalanceCache()
+    connections = []
+
+    async def connect():
+        connection = MagicMock()
+        connection.add_listener = AsyncMock()
+        connection.close = AsyncMock()
+        # The first connection drops straight away, the second stays up
+        connection.is_closed.return_value = not connections
+        connections.append(connection)
+        return connection
+
+    listener = BalanceInvalidationListener(cache, connect, check_interval=0.01, base_backoff=0.001)
+    listener.start()
+    for _ in range(100):
+        if cache.listening:
+            break
+        await asyncio.sleep(0.01)
+    await listener.stop()
+
+    assert len(connections) == 2 and listener.reconnects == 1
+    connections[1].add_listener.assert_awaited_once_with(BALANCE_CHANNEL, listener.on_notification)
+    connections[1].close.assert_awaited_once()
+    assert not cache.listening
+
+
+def test_notify_is_chunked_on_postgres_and_skipped_elsewhere():
+    db = MagicMock()
+    db.get_bind.return_value.dialect.name = "postgresql"
+    notify_balance_change(db, [uuid.uuid4() for _ in range(250)], origin="worker")
+    payloads = [call.args[0].compile().params["pg_notify_3"] for call in db.execute.call_args_list]
+
+    assert len(payloads) == 2
+    assert all(payload.startswith("worker:") for payload in payloads)
+    assert sum(len(payload.split(":")[1].split(",")) for payload in payloads) == 250
+
+    db.get_bind.return_value.dialect.name = "sqlite"
+    db.execute.reset_mock()
+    notify_balance_change(db, [uuid.uuid4()])
+    db.execute.assert_not_called()
+
+
+@pytest_asyncio.fixture
+async def async_db():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        session.statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: session.statements.append(args[2]))
+        yield session
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_and_the_next_read_refills_the_cache(async_db):
+    user = USER(id=uuid.uuid4(), username="u", email="u@example.com", full_name="U", hashed_password="h", voice=10)
+    async_db.add(user)
+    await async_db.commit()
+    clients = ClientRegistry(openai_client=AsyncMock(), qdrant_client=AsyncMock())
+    clients.balance_cache = BalanceCache()
+    data = ThoughtSpaceData(db=None, clients=clients, async_db=async_db)
+
+    assert await data.get_user_summary_async(str(user.id)) == {"voice_balance": 10, "message_count": 0}
+    await data.update_user_voice_balance_async(str(user.id), 3.5)
+    await data.create_message_async(str(user.id), str(uuid.uuid4()))
+    assert data.balance_cache.get(str(user.id)) is None
+
+    assert await data.get_user_summary_async(str(user.id)) == {"voice_balance": 13, "message_count": 1}
+    async_db.statements.clear()
+    assert await data.get_user_voice_balance_async(str(user.id)) == 13
+    assert async_db.statements == []
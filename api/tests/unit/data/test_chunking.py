@@ -0,0 +1,85 @@
+import pytest
+import numpy as np
+from unittest.mock import AsyncMock
+
+from api.data import chunking
+from api.data.chunking import ChunkedEmbedder, as_point_vector, chunk_by_tokens, pool_vectors
+
+
+@pytest.fixture(params=["tiktoken", "fallback"])
+def tokenizer(request, monkeypatch):
+    if request.param == "tiktoken":
+        pytest.importorskip("tiktoken")
+        if chunking._encoding(chunking.EMBEDDING_MODEL) is None:
+            pytest.skip("tiktoken encoding not available offline")
+    else:
+        monkeypatch.setattr(chunking, "tiktoken", None)
+    return request.param
+
+
+def test_short_text_is_one_chunk(tokenizer):
+    assert chunk_by_tokens("hello world", max_tokens=100, overlap_tokens=10) == ["hello world"]
+
+
+def test_chunks_respect_the_token_limit_and_cover_the_text(tokenizer):
+    text = " ".join(f"word{i}" for i in range(3000))
+
+    chunks = chunk_by_tokens(text, max_tokens=500, overlap_tokens=50)
+
+    assert len(chunks) > 1
+    assert all(chunking.count_tokens(chunk) <= 500 + 1 for chunk in chunks)
+    assert chunks[0].startswith("word0 ") and chunks[-1].endswith("word2999")
+
+
+def test_overlap_must_be_smaller_than_the_window():
+    with pytest.raises(ValueError):
+        chunk_by_tokens("text", max_tokens=10, overlap_tokens=10)
+
+
+@pytest.mark.parametrize(
+    "strategy, expected",
+    [("mean", [0.6, 0.8]), ("max", [1 / np.sqrt(2), 1 / np.sqrt(2)]), ("first", [1.0, 0.0])],
+)
+def test_pool_vectors(strategy, expected):
+    pooled = pool_vectors([[1.0, 0.0], [0.0, 1.0]], strategy, weights=[3, 4] if strategy == "mean" else None)
+
+    np.testing.assert_allclose(pooled, expected)
+
+
+def test_pool_vectors_rejects_unknown_strategy():
+    with pytest.raises(ValueError):
+        pool_vectors([[1.0]], "median")
+
+
+def test_as_point_vector_rejects_nested_embeddings():
+    assert as_point_vector([0.1, 0.2]) == [0.1, 0.2]
+    with pytest.raises(ValueError):
+        as_point_vector([[0.1, 0.2], [0.3, 0.4]])
+
+
+@pytest.mark.asyncio
+async def test_long_text_is_embedded_in_one_request_and_pooled(monkeypatch):
+    monkeypatch.setattr(chunking, "tiktoken", None)
+    openai_client = AsyncMock()
+    openai_client.embed_many.side_effect = lambda texts, model_name: [[1.0, float(i)] for i in range(len(texts))]
+    embedder = ChunkedEmbedder(openai_client, max_tokens=100, overlap_tokens=10, pooling="first")
+
+    vector = await embedder.embed("word " * 400)
+
+    assert openai_client.embed_many.await_count == 1
+    assert len(openai_client.embed_many.await_args.args[0]) > 1
+    assert vector == [1.0, 0.0]
+    assert not embedder.needs_chunking("short")
+
+
+def test_fallback_never_undercounts_non_latin_text(monkeypatch):
+    monkeypatch.setattr(chunking, "tiktoken", None)
+    text = "漢字のテキスト" * 700  # 4900 characters, three UTF-8 bytes each
+    embedder = ChunkedEmbedder(AsyncMock(), max_tokens=8000, overlap_tokens=200)
+
+    chunks = chunk_by_tokens(text, max_tokens=500, overlap_tokens=50)
+
+    # A character count would call this one input; any tokenizer may need up to 14700 tokens
+    assert embedder.needs_chunking(text)
+    assert all(len(chunk.encode("utf-8")) <= 500 for chunk in chunks)
+    assert chunks[0].startswith("漢字") and text.endswith(chunks[-1])
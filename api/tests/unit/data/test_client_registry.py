@@ -0,0 +1,32 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from api.data.client_registry import ClientRegistry, get_clients
+from api.data.thoughtspace_data import ThoughtSpaceData
+
+
+@pytest.fixture
+def clients():
+    return ClientRegistry(openai_client=AsyncMock(), qdrant_client=AsyncMock())
+
+
+def test_thoughtspace_data_uses_shared_clients(clients):
+    data = ThoughtSpaceData(db=MagicMock(), clients=clients)
+
+    assert data.openai_client is clients.openai_client
+    assert data.qdrant_client is clients.qdrant_client
+
+
+def test_get_clients_returns_registry_from_app_state(clients):
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(clients=clients)))
+
+    assert get_clients(request) is clients
+
+
+@pytest.mark.asyncio
+async def test_close_closes_both_clients(clients):
+    await clients.close()
+
+    clients.openai_client.close.assert_awaited_once()
+    clients.qdrant_client.close.assert_awaited_once()
@@ -0,0 +1,101 @@
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine, exc, text
+
+from api.data._db_pool import PoolSettings, TimedQueuePool, TimedAsyncAdaptedQueuePool, instrument_engine
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    engines = []
+
+    def make(settings, **kwargs):
+        engine = create_engine(f"sqlite:///{tmp_path}/pool.db", poolclass=TimedQueuePool, **kwargs)
+        engines.append(engine)
+        return engine, instrument_engine(engine, settings)
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "Never")
+
+    settings = PoolSettings.from_env()
+
+    assert (settings.pool_size, settings.max_overflow, settings.pre_ping) == (20, 0, "never")
+
+
+def test_settings_reject_unknown_pre_ping_policy(monkeypatch):
+    monkeypatch.setenv("DB_POOL_PRE_PING", "sometimes")
+
+    with pytest.raises(ValueError):
+        PoolSettings.from_env()
+
+
+def test_engine_kwargs_size_queue_pools_only():
+    settings = PoolSettings(pool_size=3, max_overflow=1, pre_ping="always")
+
+    postgres = settings.engine_kwargs("postgresql://db/app")
+    postgres_async = settings.engine_kwargs("postgresql+asyncpg://db/app", is_async=True)
+    sqlite = settings.engine_kwargs("sqlite://")
+
+    assert postgres["poolclass"] is TimedQueuePool and postgres["pool_size"] == 3
+    assert postgres_async["poolclass"] is TimedAsyncAdaptedQueuePool
+    assert sqlite == {"pool_pre_ping": True, "pool_recycle": 1800}
+
+
+def test_checkout_counters_and_timeouts(make_engine):
+    engine, telemetry = make_engine(PoolSettings(pre_ping="never"), pool_size=1, max_overflow=0, pool_timeout=0.01)
+
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        assert telemetry.metrics()["checked_out"] == 1
+
+    metrics = telemetry.metrics()
+    assert metrics["checkouts"] == 1
+    assert metrics["timeouts"] == 1
+    assert metrics["wait_ms_max"] >= 10
+    assert metrics["pre_pings"] == 0
+
+
+def test_idle_pre_ping_replaces_dead_connections(make_engine):
+    engine, telemetry = make_engine(PoolSettings(pre_ping="idle", pre_ping_idle_seconds=0), pool_size=1)
+    with engine.connect() as conn:
+        conn.execute(text("select 1"))
+
+    with patch.object(engine.dialect, "do_ping", return_value=False) as do_ping:
+        with engine.connect() as conn:
+            conn.execute(text("select 1"))
+
+    # Only the idle connection is pinged; its fresh replacement is used as is
+    do_ping.assert_called_once()
+    metrics = telemetry.metrics()
+    assert metrics["pre_pings"] == 1
+    assert metrics["pre_ping_failures"] == 1
+    assert metrics["invalidations"] == 1
+    assert metrics["connects"] == 2
+
+
+def test_recently_used_connections_skip_pre_ping(make_engine):
+    engine, telemetry = make_engine(PoolSettings(pre_ping="idle", pre_ping_idle_seconds=60), pool_size=1)
+
+    for _ in range(3):
+        with engine.connect() as conn:
+            conn.execute(text("select 1"))
+
+    assert telemetry.metrics()["pre_pings"] == 0
+
+
+def test_telemetry_survives_dispose(make_engine):
+    engine, telemetry = make_engine(PoolSettings(pre_ping="never"), pool_size=2)
+    engine.dispose()
+
+    with engine.connect():
+        assert telemetry.metrics()["checked_out"] == 1
+
+    assert telemetry.metrics()["checkouts"] == 1
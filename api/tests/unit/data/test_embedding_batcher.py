@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from api.data.embedding_batcher import EmbeddingBatcher
+
+
+def fake_openai_client():
+    client = AsyncMock()
+    client.embed_many.side_effect = lambda texts, model_name: [[float(len(text))] for text in texts]
+    return client
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_request():
+    client = fake_openai_client()
+    batcher = EmbeddingBatcher(client, max_delay=0.01)
+
+    results = await asyncio.gather(batcher.embed("a"), batcher.embed("bb"), batcher.embed("ccc"))
+
+    assert results == [[1.0], [2.0], [3.0]]
+    client.embed_many.assert_awaited_once()
+    assert batcher.stats()["batches_sent"] == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_is_sent_when_size_limit_is_reached():
+    client = fake_openai_client()
+    batcher = EmbeddingBatcher(client, max_batch_size=2, max_delay=10)
+
+    results = await asyncio.gather(batcher.embed("a"), batcher.embed("bb"))
+
+    assert results == [[1.0], [2.0]]
+
+
+@pytest.mark.asyncio
+async def test_token_budget_splits_batches():
+    client = fake_openai_client()
+    batcher = EmbeddingBatcher(client, max_delay=0.01, max_batch_tokens=10)
+
+    await asyncio.gather(batcher.embed("x" * 24), batcher.embed("y" * 24))
+
+    assert client.embed_many.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_failure_propagates_to_every_caller():
+    client = AsyncMock()
+    client.embed_many.side_effect = RuntimeError("boom")
+    batcher = EmbeddingBatcher(client, max_delay=0.01)
+
+    results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_a_bad_input_fails_only_its_own_caller():
+    client = AsyncMock()
+
+    async def embed_many(texts, model_name):
+        if "bad" in texts:
+            raise RuntimeError("input too long")
+        return [[float(len(text))] for text in texts]
+
+    client.embed_many.side_effect = embed_many
+    batcher = EmbeddingBatcher(client, max_delay=0.01)
+
+    results = await asyncio.gather(*(batcher.embed(text) for text in ["a", "bb", "bad", "dddd", "eeeee"]), return_exceptions=True)
+
+    assert results[:2] == [[1.0], [2.0]] and results[3:] == [[4.0], [5.0]]
+    assert isinstance(results[2], RuntimeError)
+    assert batcher.stats()["batches_split"] == 2
+
+
+@pytest.mark.asyncio
+async def test_a_rejected_input_gets_none_and_the_others_their_vectors():
+    client = AsyncMock()
+    # The OpenAI client returns None for a request the API rejected
+    client.embed_many.side_effect = lambda texts, model_name: None if "bad" in texts else [[1.0] for _ in texts]
+    batcher = EmbeddingBatcher(client, max_delay=0.01)
+
+    results = await asyncio.gather(batcher.embed("bad"), batcher.embed("good"))
+
+    assert results == [None, [1.0]]
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from api.data.client_registry import ClientRegistry
+from api.data.embedding_cache import EmbeddingCache, SQLiteEmbeddingStore, embedding_cache_key
+from api.data.thoughtspace_data import ThoughtSpaceData
+
+
+def test_key_depends_on_model_and_normalized_text():
+    assert embedding_cache_key("m", "hello ") == embedding_cache_key("m", "  hello")
+    assert embedding_cache_key("m", "hello") != embedding_cache_key("other", "hello")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = EmbeddingCache(max_size=2, ttl=None)
+    cache.set("m", "a", [1.0])
+    cache.set("m", "b", [2.0])
+    cache.get("m", "a")
+    cache.set("m", "c", [3.0])
+
+    assert cache.get("m", "b") is None
+    assert cache.get("m", "a") == [1.0]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    cache = EmbeddingCache(max_size=10, ttl=10)
+    with patch("api.utils._cache.time.monotonic", return_value=100.0):
+        cache.set("m", "a", [1.0])
+    with patch("api.utils._cache.time.monotonic", return_value=105.0):
+        assert cache.get("m", "a") == [1.0]
+    with patch("api.utils._cache.time.monotonic", return_value=111.0):
+        assert cache.get("m", "a") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_shared_store_hit_is_promoted(tmp_path):
+    store = SQLiteEmbeddingStore(str(tmp_path / "embeddings.db"))
+    EmbeddingCache(shared_store=store).set("m", "a", [0.1, 0.2])
+
+    cache = EmbeddingCache(shared_store=store)
+    assert cache.get("m", "a") == [0.1, 0.2]
+    assert cache.shared_hits == 1
+    assert cache.get("m", "a") == [0.1, 0.2]
+    assert cache.stats()["hits"] == 1
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_async_shared_store_io_runs_off_the_event_loop(tmp_path):
+    store = SQLiteEmbeddingStore(str(tmp_path / "embeddings.db"))
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def recording(method):
+        def call(*args):
+            threads.append(threading.get_ident())
+            return method(*args)
+
+        return call
+
+    store.get, store.set = recording(store.get), recording(store.set)
+    await EmbeddingCache(shared_store=store).set_async("m", "a", [0.1, 0.2])
+
+    cache = EmbeddingCache(shared_store=store)
+    assert await cache.get_async("m", "a") == [0.1, 0.2]
+    assert await cache.get_async("m", "a") == [0.1, 0.2]
+    assert cache.shared_hits == 1
+    assert len(threads) == 2 and loop_thread not in threads
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_embed_text_consults_cache_first():
+    openai_client = AsyncMock()
+    openai_client.embed_many.return_value = [[0.5, 0.5]]
+    clients = ClientRegistry(openai_client=openai_client, qdrant_client=AsyncMock(), embedding_cache=EmbeddingCache())
+    data = ThoughtSpaceData(db=MagicMock(), clients=clients)
+
+    assert await data.embed_text("same text") == [0.5, 0.5]
+    assert await data.embed_text("same text") == [0.5, 0.5]
+    openai_client.embed_many.assert_awaited_once()
@@ -0,0 +1,117 @@
+import uuid
+import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from api import backfill
+from api.data import _db_config
+from api.data._message_metadata import (
+    content_preview,
+    metadata_from_payload,
+    payload_created_at,
+    restore_created_at,
+    upsert_message_metadata,
+)
+from api.data._sqlalchemy_models import Base, MESSAGE, MESSAGE_METADATA, USER
+
+CREATED_AT = datetime.datetime(2024, 6, 1)
+
+
+def test_payload_maps_to_a_projection_row():
+    row = metadata_from_payload(uuid.uuid4(), uuid.uuid4(), CREATED_AT, {"content": "hi", "voice": 3.6, "revisions": ["a", "b"]})
+
+    assert (row["content_preview"], row["voice"], row["revisions_count"]) == ("hi", 4, 2)
+    assert content_preview("word " * 100, max_chars=20).endswith("…")
+    assert len(content_preview("word " * 100, max_chars=20)) <= 20
+
+
+def make_db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    return sessionmaker(engine)
+
+
+def test_upsert_is_idempotent_and_refreshes_payload_fields():
+    db = make_db()()
+    user_id, message_id = uuid.uuid4(), uuid.uuid4()
+    db.add(USER(id=user_id, username="u", email="u@example.com", full_name="U", hashed_password="h", voice=0))
+    db.add(MESSAGE(id=message_id, user_id=user_id, created_at=CREATED_AT))
+    db.commit()
+
+    upsert_message_metadata(db, [metadata_from_payload(message_id, user_id, CREATED_AT, {"content": "v1"})])
+    upsert_message_metadata(db, [metadata_from_payload(message_id, user_id, CREATED_AT, {"content": "v2", "voice": 5})])
+    db.commit()
+
+    rows = db.execute(select(MESSAGE_METADATA.content_preview, MESSAGE_METADATA.voice)).all()
+    assert [tuple(row) for row in rows] == [("v2", 5)]
+
+
+def test_payload_created_at_is_naive_utc():
+    assert payload_created_at({"created_at": "2024-06-01T12:00:00+02:00"}) == datetime.datetime(2024, 6, 1, 10)
+    assert payload_created_at({"created_at": "not a date"}) is None
+    assert payload_created_at({}) is None
+
+
+@pytest.mark.asyncio
+async def test_restore_created_at_replaces_the_migration_placeholder(monkeypatch):
+    Session = make_db()
+    db = Session()
+    user_id = uuid.uuid4()
+    migrated_at = datetime.datetime(2024, 6, 10)
+    message_ids = [uuid.uuid4() for _ in range(3)]
+    db.add(USER(id=user_id, username="u", email="u@example.com", full_name="U", hashed_password="h", voice=0))
+    db.add_all(MESSAGE(id=message_id, user_id=user_id, created_at=migrated_at) for message_id in message_ids)
+    db.add(MESSAGE_METADATA(**metadata_from_payload(message_ids[0], user_id, migrated_at, {"content": "hi"})))
+    db.commit()
+    db.close()
+    # The last message's point has no created_at, so it keeps the placeholder
+    created = {str(message_ids[0]): "2024-01-02T03:04:05+00:00", str(message_ids[1]): "2023-05-06T07:08:09+00:00"}
+    qdrant_client = AsyncMock()
+    qdrant_client.retrieve.side_effect = lambda ids, payload_fields: [
+        SimpleNamespace(id=i, payload={"created_at": created[i]} if i in created else {}) for i in ids
+    ]
+    monkeypatch.setattr(backfill, "QdrantClient", lambda collection_name: qdrant_client)
+    monkeypatch.setattr(_db_config, "SessionLocal", Session)
+
+    assert await backfill.restore_message_created_at(SimpleNamespace(collection="choir", batch_size=2)) == 0
+
+    db = Session()
+    restored = dict(db.execute(select(MESSAGE.id, MESSAGE.created_at)).all())
+    assert restored == {
+        message_ids[0]: datetime.datetime(2024, 1, 2, 3, 4, 5),
+        message_ids[1]: datetime.datetime(2023, 5, 6, 7, 8, 9),
+        message_ids[2]: migrated_at,
+    }
+    assert db.scalar(select(MESSAGE_METADATA.created_at)) == datetime.datetime(2024, 1, 2, 3, 4, 5)
+    assert restore_created_at(db, {}) == 0
+
+
+@pytest.mark.asyncio
+async def test_project_metadata_takes_created_at_from_the_payload(monkeypatch):
+    Session = make_db()
+    db = Session()
+    user_id, message_id = uuid.uuid4(), uuid.uuid4()
+    migrated_at = datetime.datetime(2024, 6, 10)
+    db.add(USER(id=user_id, username="u", email="u@example.com", full_name="U", hashed_password="h", voice=0))
+    db.add(MESSAGE(id=message_id, user_id=user_id, created_at=migrated_at))
+    # A projection row written by an earlier run, with the placeholder time
+    db.add(MESSAGE_METADATA(**metadata_from_payload(message_id, user_id, migrated_at, {"content": "old"})))
+    db.commit()
+    db.close()
+    qdrant_client = AsyncMock()
+    qdrant_client.retrieve.return_value = [
+        SimpleNamespace(id=str(message_id), payload={"content": "hi", "created_at": "2024-01-02T03:04:05+00:00"})
+    ]
+    monkeypatch.setattr(backfill, "QdrantClient", lambda collection_name: qdrant_client)
+    monkeypatch.setattr(_db_config, "SessionLocal", Session)
+
+    await backfill.project_metadata(SimpleNamespace(collection="choir", batch_size=10))
+
+    db = Session()
+    expected = datetime.datetime(2024, 1, 2, 3, 4, 5)
+    assert db.scalar(select(MESSAGE.created_at)) == expected
+    assert tuple(db.execute(select(MESSAGE_METADATA.created_at, MESSAGE_METADATA.content_preview)).one()) == (expected, "hi")
@@ -0,0 +1,157 @@
+import os
+import json
+import asyncio
+import threading
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from api.data.observation_writer import ObservationSpool, ObservationWriter
+
+
+def fake_batcher():
+    batcher = AsyncMock()
+    batcher.embed_many.side_effect = lambda texts: [[0.1] for _ in texts]
+    return batcher
+
+
+@pytest.mark.asyncio
+async def test_submitted_observations_are_written_in_one_batch(tmp_path):
+    qdrant_client = AsyncMock()
+    on_write = MagicMock()
+    writer = ObservationWriter(
+        qdrant_client, fake_batcher(), spool_dir=str(tmp_path), flush_interval=0.01, on_write=on_write
+    )
+    await writer.start()
+
+    writer.submit("first")
+    writer.submit("second", payload={"agent": "test"})
+    await asyncio.wait_for(writer.queue.join(), 1)
+    await writer.stop()
+
+    points = qdrant_client.upsert_points.await_args.args[0]
+    assert [point.payload["content"] for point in points] == ["first", "second"]
+    assert points[1].payload["agent"] == "test"
+    assert writer.metrics()["written"] == 2
+    on_write.assert_called_once()
+    assert ObservationSpool(str(tmp_path)).recover() == []
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried(tmp_path):
+    qdrant_client = AsyncMock()
+    qdrant_client.upsert_points.side_effect = [RuntimeError("unavailable"), None]
+    writer = ObservationWriter(
+        qdrant_client, fake_batcher(), spool_dir=str(tmp_path), flush_interval=0.01, base_backoff=0.001
+    )
+    await writer.start()
+
+    writer.submit("note")
+    await asyncio.wait_for(writer.queue.join(), 1)
+    await writer.stop()
+
+    assert qdrant_client.upsert_points.await_count == 2
+    assert writer.metrics()["retries"] == 1
+    assert writer.metrics()["written"] == 1
+
+
+@pytest.mark.asyncio
+async def test_unwritten_observations_are_recovered_from_spool(tmp_path):
+    qdrant_client = AsyncMock()
+    qdrant_client.upsert_points.side_effect = RuntimeError("unavailable")
+    writer = ObservationWriter(
+        qdrant_client, fake_batcher(), spool_dir=str(tmp_path), flush_interval=0.01, max_retries=1, base_backoff=0
+    )
+    await writer.start()
+    writer.submit("keep me")
+    await asyncio.wait_for(writer.queue.join(), 1)
+    await writer.stop()
+
+    recovered = ObservationSpool(str(tmp_path)).recover()
+
+    assert [record["content"] for record in recovered] == ["keep me"]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_on_a_later_flush(tmp_path):
+    qdrant_client = AsyncMock()
+    qdrant_client.upsert_points.side_effect = [RuntimeError("unavailable"), None]
+    writer = ObservationWriter(
+        qdrant_client,
+        fake_batcher(),
+        spool_dir=str(tmp_path),
+        flush_interval=0.01,
+        max_retries=1,
+        base_backoff=0,
+        retry_interval=0.01,
+    )
+    await writer.start()
+    writer.submit("try again")
+    for _ in range(100):
+        if writer.metrics()["written"]:
+            break
+        await asyncio.sleep(0.01)
+    await writer.stop()
+
+    assert writer.metrics()["failed"] == 1 and writer.metrics()["written"] == 1
+    # Nothing is pending, so the spool was truncated
+    assert os.path.getsize(writer.spool.path) == 0
+
+
+@pytest.mark.asyncio
+async def test_spool_writes_run_off_the_event_loop(tmp_path):
+    writer = ObservationWriter(AsyncMock(), fake_batcher(), spool_dir=str(tmp_path), flush_interval=0.01)
+    threads = []
+    writer.spool.append = lambda record: threads.append(threading.get_ident())
+    await writer.start()
+
+    writer.submit("note")
+    await asyncio.wait_for(writer.queue.join(), 1)
+    await writer.stop()
+
+    assert threads and threads[0] != threading.get_ident()
+
+
+def write_orphan(tmp_path, contents):
+    # pid 2**22 + 1 is above Linux's pid_max, so no process owns the file
+    path = tmp_path / f"spool-{2**22 + 1}.jsonl"
+    path.write_text("".join(json.dumps({"id": content, "content": content}) + "\n" for content in contents))
+    return path
+
+
+def test_orphaned_spool_is_replayed_by_one_worker_only(tmp_path):
+    write_orphan(tmp_path, ["a", "b"])
+
+    first = ObservationSpool(str(tmp_path)).recover()
+    # A second live worker (pid 1 always exists) starting alongside finds nothing left to adopt
+    with patch("api.data.observation_writer.os.getpid", return_value=1):
+        second = ObservationSpool(str(tmp_path)).recover()
+
+    assert sorted(record["id"] for record in first) == ["a", "b"]
+    assert second == []
+    assert sorted(os.listdir(tmp_path)) == sorted([f"spool-{os.getpid()}.jsonl", "spool-1.jsonl"])
+
+
+def test_recover_skips_files_another_worker_claimed_first(tmp_path):
+    write_orphan(tmp_path, ["a"])
+
+    with patch("api.data.observation_writer.os.rename", side_effect=FileNotFoundError):
+        assert ObservationSpool(str(tmp_path)).recover() == []
+
+
+@pytest.mark.asyncio
+async def test_overflow_without_a_spool_is_counted_as_dropped(tmp_path):
+    writer = ObservationWriter(AsyncMock(), fake_batcher(), max_queue_size=1)
+    writer.submit("queued")
+    writer.submit("dropped")
+
+    assert writer.metrics()["dropped"] == 1
+    assert writer.metrics()["overflowed"] == 0
+
+    spooled = ObservationWriter(AsyncMock(), fake_batcher(), spool_dir=str(tmp_path), max_queue_size=1)
+    spooled.submit("queued")
+    spooled.submit("spooled")
+    await spooled.stop()
+
+    assert (spooled.metrics()["overflowed"], spooled.metrics()["dropped"]) == (1, 0)
+    # The queued observation was written; the overflowing one waits in the spool for the next start
+    assert [record["content"] for record in ObservationSpool(str(tmp_path)).recover()] == ["spooled"]
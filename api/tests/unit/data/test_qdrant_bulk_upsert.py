@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from api.data.qdrant_client import QdrantClient
+
+
+def make_client(upsert_points):
+    client = QdrantClient.__new__(QdrantClient)
+    client.collection_name = "test"
+    client.upsert_points = upsert_points
+    return client
+
+
+def points(n):
+    return ((i, f"text {i}", [0.1], {"source": "test"}) for i in range(n))
+
+
+@pytest.mark.asyncio
+async def test_points_are_grouped_into_batches():
+    upsert_points = AsyncMock()
+    report = await make_client(upsert_points).bulk_upsert(points(10), batch_size=4)
+
+    assert [len(call.args[0]) for call in upsert_points.await_args_list] == [4, 4, 2]
+    assert report.batches == 3
+    assert report.points == 10
+    assert upsert_points.await_args_list[0].args[0][0].payload["source"] == "test"
+
+
+@pytest.mark.asyncio
+async def test_accepts_async_iterables_and_limits_parallelism():
+    in_flight = 0
+    peak = 0
+
+    async def upsert_points(structs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    async def source():
+        for point in points(20):
+            yield point
+
+    report = await make_client(upsert_points).bulk_upsert(source(), batch_size=2, parallelism=3)
+
+    assert report.points == 20
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_are_retried_then_reported():
+    upsert_points = AsyncMock(side_effect=[RuntimeError("timeout"), None, RuntimeError("bad"), RuntimeError("bad")])
+    report = await make_client(upsert_points).bulk_upsert(
+        points(4), batch_size=2, parallelism=1, max_retries=2, base_backoff=0
+    )
+
+    assert report.points == 2
+    assert len(report.failures) == 1
+    assert report.failures[0].ids == [2, 3]
+    assert report.failed_points == 2
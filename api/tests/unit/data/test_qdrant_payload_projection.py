@@ -0,0 +1,65 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from qdrant_client import models
+
+from api.backfill import stale_revision_counts
+from api.data.qdrant_client import MESSAGE_PAYLOAD_FIELDS, SCORING_PAYLOAD_FIELDS, QdrantClient, message_payload
+from api.service._scoring import parse_revisions_count
+
+
+def make_client():
+    client = QdrantClient.__new__(QdrantClient)
+    client.collection_name = "test"
+    client.client = AsyncMock()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_search_fetches_only_the_message_fields_by_default():
+    client = make_client()
+    await client.search([0.1], search_limit=10)
+
+    selector = client.client.search.await_args.kwargs["with_payload"]
+    assert selector == models.PayloadSelectorInclude(include=list(MESSAGE_PAYLOAD_FIELDS))
+    assert "revisions" not in selector.include
+
+
+@pytest.mark.asyncio
+async def test_scoring_passes_skip_content_and_none_fetches_everything():
+    client = make_client()
+    await client.search([0.1], payload_fields=SCORING_PAYLOAD_FIELDS)
+    await client.retrieve(["id"], payload_fields=None)
+
+    assert "content" not in client.client.search.await_args.kwargs["with_payload"].include
+    assert client.client.retrieve.await_args.kwargs["with_payload"] is True
+
+
+@pytest.mark.asyncio
+async def test_revisions_count_is_maintained_on_write():
+    client = make_client()
+    await client.upsert("id", "text", [0.1, 0.2])
+    await client.set_payload({"revisions": ["a", "b"]}, ["id"])
+
+    assert client.client.upsert.await_args.kwargs["points"][0].payload["revisions_count"] == 0
+    assert client.client.set_payload.await_args.kwargs["payload"] == {"revisions": ["a", "b"], "revisions_count": 2}
+    assert message_payload("text", "now", {"revisions": ["a"]})["revisions_count"] == 1
+
+
+def test_parser_prefers_the_stored_count_and_falls_back_to_the_list():
+    assert parse_revisions_count({"revisions_count": 3}) == 3
+    assert parse_revisions_count({"revisions": ["a", "b"]}) == 2
+    assert parse_revisions_count({"revisions_count": 0}) is None
+    assert parse_revisions_count({}) is None
+
+
+def test_backfill_groups_only_stale_points_by_count():
+    records = [
+        SimpleNamespace(id=1, payload={"revisions": ["a"]}),
+        SimpleNamespace(id=2, payload={"revisions": ["a"], "revisions_count": 1}),
+        SimpleNamespace(id=3, payload={}),
+        SimpleNamespace(id=4, payload={"revisions": ["a", "b"], "revisions_count": 1}),
+    ]
+
+    assert stale_revision_counts(records) == {1: [1], 0: [3], 2: [4]}
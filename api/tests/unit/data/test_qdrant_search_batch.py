@@ -0,0 +1,49 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from api.data.qdrant_client import QdrantClient, fuse_scored_points
+
+
+def hit(point_id, score):
+    return SimpleNamespace(id=point_id, score=score, payload={"content": f"text {point_id}"})
+
+
+@pytest.mark.asyncio
+async def test_all_vectors_are_sent_in_one_request():
+    client = QdrantClient.__new__(QdrantClient)
+    client.collection_name = "test"
+    client.client = AsyncMock()
+    client.client.query_batch_points.return_value = [SimpleNamespace(points=[hit(1, 0.9)]), SimpleNamespace(points=[])]
+
+    results = await client.search_batch([[0.1, 0.2], [0.3, 0.4]], search_limit=5)
+
+    client.client.query_batch_points.assert_awaited_once()
+    requests = client.client.query_batch_points.await_args.kwargs["requests"]
+    assert [request.query for request in requests] == [[0.1, 0.2], [0.3, 0.4]]
+    assert all(request.limit == 5 and request.with_payload for request in requests)
+    assert [[point.id for point in points] for points in results] == [[1], []]
+
+
+def test_rrf_rewards_points_found_by_several_queries():
+    fused = fuse_scored_points([[hit(1, 0.95), hit(2, 0.90)], [hit(3, 0.93), hit(2, 0.91)]], method="rrf")
+
+    assert [point.id for point in fused] == [2, 1, 3]
+    assert fused[0].score == 0.91
+
+
+def test_max_fusion_ranks_by_best_score_and_dedups_by_id():
+    fused = fuse_scored_points([[hit(1, 0.80), hit(2, 0.70)], [hit(2, 0.90)], None], method="max", limit=2)
+
+    assert [(point.id, point.score) for point in fused] == [(2, 0.90), (1, 0.80)]
+
+
+def test_identical_content_with_distinct_ids_is_kept():
+    fused = fuse_scored_points([[hit(1, 0.9)], [SimpleNamespace(id=2, score=0.8, payload={"content": "text 1"})]])
+
+    assert [point.id for point in fused] == [1, 2]
+
+
+def test_unknown_fusion_method_is_rejected():
+    with pytest.raises(ValueError):
+        fuse_scored_points([], method="sum")
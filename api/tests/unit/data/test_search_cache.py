@@ -0,0 +1,74 @@
+import pytest
+from unittest.mock import AsyncMock
+
+from api.data.client_registry import ClientRegistry
+from api.data.search_cache import SearchResultCache
+from api.data.thoughtspace_data import ThoughtSpaceData
+
+
+@pytest.fixture
+def clients():
+    qdrant_client = AsyncMock()
+    qdrant_client.search.return_value = ["hit"]
+    clients = ClientRegistry(openai_client=AsyncMock(), qdrant_client=qdrant_client)
+    clients.search_cache = SearchResultCache(max_size=8, ttl=60)
+    clients.embedding_batcher.embed = AsyncMock(return_value=[0.1, 0.2])
+    return clients
+
+
+def test_keys_ignore_case_and_surrounding_whitespace():
+    cache = SearchResultCache()
+    cache.set("  Hello World ", 40, ["hit"], cache.version)
+
+    assert cache.get("hello world", 40) == ["hit"]
+    assert cache.get("hello world", 10) is None
+
+
+def test_invalidate_hides_older_entries():
+    cache = SearchResultCache()
+    cache.set("query", 40, ["old"], cache.version)
+
+    cache.invalidate()
+
+    assert cache.get("query", 40) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_results_fetched_before_a_write_are_not_stored():
+    cache = SearchResultCache()
+    version = cache.version
+    cache.invalidate()
+
+    cache.set("query", 40, ["stale"], version)
+
+    assert cache.get("query", 40) is None
+
+
+def test_cache_can_be_disabled_from_env(monkeypatch):
+    monkeypatch.setenv("SEARCH_CACHE_TTL_SECONDS", "0")
+
+    assert SearchResultCache.from_env() is None
+
+
+@pytest.mark.asyncio
+async def test_repeated_queries_skip_embed_and_search(clients):
+    data = ThoughtSpaceData(db=None, clients=clients)
+
+    assert await data.search_by_text("What is Choir?") == ["hit"]
+    assert await data.search_by_text("what is choir?") == ["hit"]
+
+    clients.qdrant_client.search.assert_awaited_once()
+    clients.embedding_batcher.embed.assert_awaited_once()
+    assert clients.search_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_upsert_invalidates_cached_results(clients):
+    data = ThoughtSpaceData(db=None, clients=clients)
+    await data.search_by_text("What is Choir?")
+
+    await data.upsert_message("id", "Choir is a chorus of messages", [0.3, 0.4])
+    clients.qdrant_client.search.return_value = ["hit", "new hit"]
+
+    assert await data.search_by_text("What is Choir?") == ["hit", "new hit"]
+    assert clients.qdrant_client.search.await_count == 2
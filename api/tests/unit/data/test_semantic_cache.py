@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+import numpy as np
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from api.data.client_registry import ClientRegistry
+from api.data.semantic_cache import SemanticSearchCache, recall
+from api.data.thoughtspace_data import ThoughtSpaceData
+
+
+def hits(*ids):
+    return [SimpleNamespace(id=point_id) for point_id in ids]
+
+
+def rotated(vector, angle):
+    """A unit vector at `angle` radians from `vector`, in the plane of its first two axes."""
+    result = np.zeros_like(vector)
+    result[0], result[1] = np.cos(angle), np.sin(angle)
+    return result
+
+
+def test_near_duplicate_queries_reuse_hits():
+    cache = SemanticSearchCache(capacity=4, threshold=0.99, audit_rate=0)
+    query = np.eye(8)[0]
+    cache.insert(query, 40, hits("a"), cache.version)
+
+    close = cache.lookup(rotated(query, 0.1) * 3, 40)
+    far = cache.lookup(rotated(query, 0.5), 40)
+
+    assert close[0] == hits("a") and close[1] == pytest.approx(np.cos(0.1), rel=1e-6)
+    assert far is None
+    assert cache.lookup(query, 10) is None
+
+
+def test_ring_buffer_keeps_the_most_recent_queries():
+    cache = SemanticSearchCache(capacity=2, threshold=0.99, audit_rate=0)
+    for i in range(3):
+        cache.insert(np.eye(4)[i], 40, hits(str(i)), cache.version)
+
+    assert cache.lookup(np.eye(4)[0], 40) is None
+    assert cache.lookup(np.eye(4)[2], 40)[0] == hits("2")
+    assert cache.stats()["size"] == 2
+
+
+def test_invalidate_and_stale_versions():
+    cache = SemanticSearchCache(capacity=4, audit_rate=0)
+    version = cache.version
+    cache.insert(np.eye(4)[0], 40, hits("a"), version)
+
+    cache.invalidate()
+    cache.insert(np.eye(4)[1], 40, hits("b"), version)
+
+    assert cache.lookup(np.eye(4)[0], 40) is None
+    assert cache.lookup(np.eye(4)[1], 40) is None
+
+
+def test_recall():
+    assert recall(hits("a", "b"), hits("a", "b", "c", "d")) == 0.5
+
+
+@pytest.mark.asyncio
+async def test_audits_record_recall_against_a_fresh_search():
+    cache = SemanticSearchCache(capacity=4, threshold=0.9, audit_rate=1.0)
+    search = AsyncMock(side_effect=[hits("a", "b"), hits("a", "c")])
+
+    assert await cache.search(np.eye(4)[0], 40, search) == hits("a", "b")
+    assert await cache.search(np.eye(4)[0], 40, search) == hits("a", "b")
+    await asyncio.gather(*cache._audits)
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["audited"]) == (1, 1, 1)
+    assert stats["mean_recall"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_search_similar_messages_uses_the_cache_until_an_upsert():
+    qdrant_client = AsyncMock()
+    qdrant_client.search.return_value = hits("a")
+    clients = ClientRegistry(openai_client=AsyncMock(), qdrant_client=qdrant_client)
+    clients.semantic_cache = SemanticSearchCache(capacity=4, threshold=0.99, audit_rate=0)
+    data = ThoughtSpaceData(db=None, clients=clients)
+
+    await data.search_similar_messages([1.0, 0.0])
+    await data.search_similar_messages([1.0, 0.001])
+    assert qdrant_client.search.await_count == 1
+
+    await data.upsert_message("id", "new", [0.0, 1.0])
+    await data.search_similar_messages([1.0, 0.0])
+    assert qdrant_client.search.await_count == 2
+
+    await data.search_similar_messages([1.0, 0.0], with_vectors=True)
+    assert qdrant_client.search.await_count == 3
@@ -0,0 +1,156 @@
+import uuid
+import threading
+import pytest
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+
+from api.data._sqlalchemy_models import Base, USER
+from api.data.client_registry import ClientRegistry
+from api.data.thoughtspace_data import ThoughtSpaceData
+from api.data._reward_events import settle_reward_events
+from api.data._voice_balances import voice_deltas_statement
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def users(db):
+    users = [
+        USER(
+            id=uuid.uuid4(),
+            username=f"user{i}",
+            email=f"user{i}@example.com",
+            full_name=f"User {i}",
+            hashed_password="hash",
+            voice=10,
+        )
+        for i in range(3)
+    ]
+    db.add_all(users)
+    db.commit()
+    return users
+
+
+@pytest.fixture
+def thoughtspace_data(db):
+    return ThoughtSpaceData(db=db, clients=ClientRegistry(openai_client=AsyncMock(), qdrant_client=AsyncMock()))
+
+
+def test_bulk_update_uses_one_statement(db, users, thoughtspace_data):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    thoughtspace_data.bulk_update_user_voice_balances({users[0].id: 2.7, users[1].id: 5})
+
+    assert len([s for s in statements if s.startswith("UPDATE")]) == 1
+    assert [db.get(USER, user.id).voice for user in users] == [12, 15, 10]
+
+
+def test_bulk_update_with_no_rewards_is_a_noop(db, users, thoughtspace_data):
+    thoughtspace_data.bulk_update_user_voice_balances({})
+
+    assert [db.get(USER, user.id).voice for user in users] == [10, 10, 10]
+
+
+def test_reward_events_settle_once(db, users, thoughtspace_data):
+    source_message_id = uuid.uuid4()
+    rewards = [(uuid.uuid4(), users[0].id, 1.5), (uuid.uuid4(), users[0].id, 1.7), (uuid.uuid4(), users[1].id, 2.0)]
+
+    thoughtspace_data.enqueue_reward_events(source_message_id, rewards)
+    # Re-enqueueing the same rewards (e.g. a retried request) is ignored
+    thoughtspace_data.enqueue_reward_events(source_message_id, rewards)
+
+    assert settle_reward_events(db, batch_size=2) == 2
+    assert settle_reward_events(db, batch_size=2) == 1
+    assert settle_reward_events(db) == 0
+    db.expire_all()
+    assert [db.get(USER, user.id).voice for user in users] == [13, 12, 10]
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 500])
+def test_settled_voice_does_not_depend_on_batch_size(db, users, thoughtspace_data, batch_size):
+    rewards = [(uuid.uuid4(), users[0].id, amount) for amount in (1.5, 1.7, 0.4, 0.4)]
+    thoughtspace_data.enqueue_reward_events(uuid.uuid4(), rewards)
+
+    while settle_reward_events(db, batch_size=batch_size):
+        pass
+    db.expire_all()
+    user = db.get(USER, users[0].id)
+
+    assert user.voice == 14
+    assert user.voice_remainder == pytest.approx(0.0)
+
+
+def test_failed_settlement_leaves_events_pending(db, users, thoughtspace_data):
+    thoughtspace_data.enqueue_reward_events(uuid.uuid4(), [(uuid.uuid4(), users[0].id, 3.0)])
+
+    with patch("api.data._reward_events.apply_voice_rewards", side_effect=RuntimeError("db down")):
+        with pytest.raises(RuntimeError):
+            settle_reward_events(db)
+
+    assert settle_reward_events(db) == 1
+    db.expire_all()
+    assert db.get(USER, users[0].id).voice == 13
+
+
+def test_update_user_voice_balance_increments_in_the_database(db, users, thoughtspace_data):
+    user_id = users[0].id
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    thoughtspace_data.update_user_voice_balance(str(user_id), 3.9)
+
+    assert [s.split()[0] for s in statements] == ["UPDATE"]
+    assert db.get(USER, user_id).voice == 13
+
+
+def test_apply_voice_deltas_sums_repeated_users(db, users, thoughtspace_data):
+    applied = thoughtspace_data.apply_voice_deltas([(users[0].id, 1), (users[1].id, 4), (users[0].id, 2)])
+
+    assert applied == {users[0].id: 3, users[1].id: 4}
+    assert [db.get(USER, user.id).voice for user in users] == [13, 14, 10]
+
+
+def test_postgres_voice_deltas_join_unnested_arrays():
+    totals = {uuid.uuid4(): 1, uuid.uuid4(): -2}
+
+    compiled = voice_deltas_statement("postgresql", totals).compile(dialect=postgresql.dialect())
+
+    sql = " ".join(str(compiled).split())
+    assert "FROM unnest(" in sql and "AS deltas(user_id, delta)" in sql
+    assert "SET voice=(users_table.voice + deltas.delta)" in sql
+    assert compiled.params["user_ids"] == list(totals)
+    assert compiled.params["deltas"] == [1, -2]
+
+
+@pytest.mark.parametrize(
+    "method, args",
+    [
+        ("create_message", ("user", "message")),
+        ("remove_message", ("user", "message")),
+        ("get_messages_user_mapping", (["message"],)),
+        ("get_user_summary", ("user",)),
+        ("get_user_voice_balance_and_messages", ("user",)),
+        ("get_message_page", ("user", 10, None)),
+        ("get_metadata_page", ("user", 10, None)),
+        ("update_user_voice_balance", ("user", 1.0)),
+        ("settle_new_message", ("user", 1.0, "message", [])),
+        ("enqueue_reward_events", ("message", [])),
+    ],
+)
+@pytest.mark.asyncio
+async def test_sync_fallbacks_run_off_the_event_loop(thoughtspace_data, method, args):
+    threads = []
+    with patch.object(thoughtspace_data, method, side_effect=lambda *args: threads.append(threading.get_ident())):
+        await getattr(thoughtspace_data, f"{method}_async")(*args)
+
+    assert threads and threads[0] != threading.get_ident()
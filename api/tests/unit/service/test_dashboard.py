@@ -0,0 +1,130 @@
+import uuid
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from api.data._message_pages import InvalidCursorException, decode_cursor, encode_cursor
+from api.data._sqlalchemy_models import Base, MESSAGE, USER
+from api.data.client_registry import ClientRegistry
+from api.service.thoughtspace_service import ThoughtSpaceService
+
+START = datetime(2024, 6, 1)
+
+
+@pytest_asyncio.fixture
+async def async_db():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def history(async_db):
+    """A user with 7 messages, newest first; pairs of messages share a created_at to exercise the id tie-break."""
+    user = USER(id=uuid.uuid4(), username="u", email="u@example.com", full_name="U", hashed_password="h", voice=42)
+    async_db.add(user)
+    messages = [MESSAGE(id=uuid.uuid4(), user_id=user.id, created_at=START + timedelta(minutes=i // 2)) for i in range(7)]
+    async_db.add_all(messages)
+    await async_db.commit()
+    newest_first = sorted(messages, key=lambda m: (m.created_at, m.id.hex), reverse=True)
+    return user, [str(message.id) for message in newest_first]
+
+
+def make_service(async_db):
+    qdrant_client = AsyncMock()
+    # Qdrant returns records in arbitrary order
+    qdrant_client.retrieve.side_effect = lambda ids: [
+        SimpleNamespace(id=i, payload={"content": f"content {i}", "created_at": START.isoformat()}) for i in reversed(ids)
+    ]
+    clients = ClientRegistry(openai_client=AsyncMock(), qdrant_client=qdrant_client)
+    return ThoughtSpaceService(db=None, clients=clients, async_db=async_db), qdrant_client
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_cover_the_history_newest_first(async_db, history):
+    user, expected_ids = history
+    service, _ = make_service(async_db)
+
+    seen, cursor = [], None
+    while True:
+        page = await service.get_dashboard_page(str(user.id), limit=3, cursor=cursor)
+        assert page["voice_balance"] == 42
+        seen.extend(message["id"] for message in page["messages"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected_ids
+
+
+@pytest.mark.asyncio
+async def test_stream_retrieves_in_bounded_chunks(async_db, history):
+    user, expected_ids = history
+    service, qdrant_client = make_service(async_db)
+
+    streamed = [message["id"] async for message in service.stream_dashboard_messages(str(user.id), chunk_size=2)]
+
+    assert streamed == expected_ids
+    assert [len(call.args[0]) for call in qdrant_client.retrieve.await_args_list] == [2, 2, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_unknown_user_has_no_dashboard_page(async_db):
+    service, _ = make_service(async_db)
+    assert await service.get_dashboard_page(str(uuid.uuid4())) is None
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    message_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(START, message_id)) == (START, message_id)
+    # Cursors built from aware timestamps decode to the naive UTC the columns hold
+    aware = START.replace(tzinfo=timezone(timedelta(hours=2)))
+    assert decode_cursor(encode_cursor(aware, message_id)) == (START - timedelta(hours=2), message_id)
+    with pytest.raises(InvalidCursorException):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_projection_serves_the_dashboard_without_qdrant(async_db):
+    user = USER(id=uuid.uuid4(), username="p", email="p@example.com", full_name="P", hashed_password="h", voice=7)
+    async_db.add(user)
+    await async_db.commit()
+    service, qdrant_client = make_service(async_db)
+    service.thoughtspace_data.metadata_projection = True
+    message_ids = [str(uuid.uuid4()) for _ in range(3)]
+    for i, message_id in enumerate(message_ids):
+        await service.thoughtspace_data.create_message_async(str(user.id), message_id, f"message {i} " + "x" * 500)
+
+    first = await service.get_dashboard_page(str(user.id), limit=2)
+    second = await service.get_dashboard_page(str(user.id), limit=2, cursor=first["next_cursor"])
+    full = await service.get_dashboard_data(str(user.id))
+
+    pages = first["messages"] + second["messages"]
+    assert sorted(message["id"] for message in pages) == sorted(message_ids)
+    assert second["next_cursor"] is None
+    assert full == {"voice_balance": 7, "messages": pages}
+    assert all(len(message["content"]) <= 280 for message in pages)
+    qdrant_client.retrieve.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_projection_falls_back_to_qdrant_for_messages_without_a_row(async_db, history):
+    user, expected_ids = history
+    service, qdrant_client = make_service(async_db)
+    service.thoughtspace_data.metadata_projection = True
+    # A message created with the projection enabled, newer than the unprojected history
+    projected_id = str(uuid.uuid4())
+    await service.thoughtspace_data.create_message_async(str(user.id), projected_id, "x" * 500)
+
+    page = await service.get_dashboard_page(str(user.id), limit=3)
+
+    assert [message["id"] for message in page["messages"]] == [projected_id] + expected_ids[:2]
+    assert page["messages"][0]["content"] == "x" * 279 + "…"
+    assert page["messages"][1]["content"] == f"content {expected_ids[0]}"
+    qdrant_client.retrieve.assert_awaited_once_with(expected_ids[:2])
@@ -0,0 +1,124 @@
+import asyncio
+import uuid
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from api.data.client_registry import ClientRegistry
+from api.data.thoughtspace_data import MessageCreationException
+from api.service._steps import NewMessageTimeouts, StepTimeoutException
+from api.service.thoughtspace_service import ThoughtSpaceService
+
+STEP_SECONDS = 0.05
+
+
+def make_service(timeouts=None):
+    clients = ClientRegistry(openai_client=AsyncMock(), qdrant_client=AsyncMock())
+    service = ThoughtSpaceService(db=MagicMock(), clients=clients, timeouts=timeouts or NewMessageTimeouts())
+    data = service.thoughtspace_data
+    author_id = uuid.uuid4()
+    hit = SimpleNamespace(id=str(uuid.uuid4()), score=0.9, payload={"content": "old", "created_at": datetime(2024, 1, 1).isoformat()})
+    data.calls = []
+
+    def step(name, result=None, seconds=STEP_SECONDS):
+        async def run(*args, **kwargs):
+            data.calls.append(("start", name))
+            await asyncio.sleep(seconds)
+            data.calls.append(("end", name))
+            return result(*args) if callable(result) else result
+
+        return run
+
+    data.embed_text = step("embed", [0.1])
+    # The search sees the new message too once the upsert has landed
+    data.search_similar_messages = step("search", lambda embedding: [hit] + data.upserted)
+    data.upserted = []
+
+    async def upsert_message(message_id, text, embedding):
+        await step("upsert")()
+        data.upserted.append(SimpleNamespace(id=message_id, score=1.0, payload={"content": text}))
+
+    data.upsert_message = upsert_message
+    data.create_message_async = step("create_message")
+    data.get_messages_user_mapping_async = AsyncMock(return_value={hit.id: author_id})
+    data.settle_new_message_async = AsyncMock()
+    return service, data, hit, author_id
+
+
+@pytest.mark.asyncio
+async def test_search_runs_alongside_the_writes_and_settles_once():
+    service, data, hit, author_id = make_service()
+
+    started = asyncio.get_running_loop().time()
+    response = await service.new_message("new text", "user")
+    elapsed = asyncio.get_running_loop().time() - started
+
+    # embed, then search + upsert + insert together: two step durations, not four
+    assert elapsed < STEP_SECONDS * 3
+    starts = [name for event, name in data.calls if event == "start"]
+    assert starts[0] == "embed" and set(starts[1:]) == {"search", "upsert", "create_message"}
+    assert data.calls.index(("end", "embed")) < data.calls.index(("start", "search"))
+    assert [message["id"] for message in response["messages"]] == [hit.id]
+
+    data.settle_new_message_async.assert_awaited_once()
+    user_id, voice_amount, source_message_id, rewards = data.settle_new_message_async.await_args.args
+    assert (user_id, voice_amount) == ("user", response["token_count"])
+    assert [(str(message_id), author) for message_id, author, _ in rewards] == [(hit.id, author_id)]
+
+
+@pytest.mark.asyncio
+async def test_a_failed_search_keeps_the_message():
+    service, data, _, _ = make_service(NewMessageTimeouts(search=STEP_SECONDS / 5))
+    data.remove_message_async = AsyncMock()
+
+    response = await service.new_message("new text", "user")
+
+    assert ("end", "upsert") in data.calls and ("end", "create_message") in data.calls
+    assert response["messages"] == []
+    data.remove_message_async.assert_not_awaited()
+    # The author is still credited; there is nothing to reward
+    data.settle_new_message_async.assert_awaited_once()
+    assert data.settle_new_message_async.await_args.args[3] == []
+
+
+@pytest.mark.parametrize("failing_write", ["upsert_message", "create_message_async"])
+@pytest.mark.asyncio
+async def test_a_failed_write_removes_the_other_write(failing_write):
+    service, data, _, _ = make_service()
+    setattr(data, failing_write, AsyncMock(side_effect=MessageCreationException("store down")))
+    data.delete_message_point = AsyncMock()
+    data.remove_message_async = AsyncMock(return_value=True)
+
+    with pytest.raises(MessageCreationException):
+        await service.new_message("new text", "user")
+
+    (message_id,) = data.delete_message_point.await_args.args
+    data.remove_message_async.assert_awaited_once_with("user", message_id)
+    data.settle_new_message_async.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_a_slow_write_finishes_before_it_is_removed():
+    service, data, _, _ = make_service(NewMessageTimeouts(write=STEP_SECONDS / 5))
+
+    async def delete_message_point(message_id):
+        data.calls.append(("start", "delete_message_point"))
+
+    async def remove_message_async(user_id, message_id):
+        data.calls.append(("start", "remove_message"))
+        return True
+
+    data.delete_message_point = delete_message_point
+    data.remove_message_async = remove_message_async
+
+    with pytest.raises(StepTimeoutException) as exc_info:
+        await service.new_message("new text", "user")
+
+    assert exc_info.value.step == "upsert"
+    # Both timed-out writes ran to the end, and were undone only afterwards
+    assert data.upserted
+    last_write = max(data.calls.index(("end", "upsert")), data.calls.index(("end", "create_message")))
+    assert data.calls.index(("start", "delete_message_point")) > last_write
+    assert data.calls.index(("start", "remove_message")) > last_write
+    data.settle_new_message_async.assert_not_awaited()
@@ -0,0 +1,136 @@
+import random
+import uuid
+import numpy as np
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from qdrant_client.http.models import Record, ScoredPoint
+
+from api.data.client_registry import ClientRegistry
+from api.service.thoughtspace_service import ThoughtSpaceService
+from api.service._scoring import MessageRecord, RankedResults, top_k
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+# NumPy's vectorized pow/log can differ from libm in the last bit, so scores are compared in ULPs
+MAX_ULP = 4
+
+
+class FixedDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+
+@pytest.fixture
+def service():
+    clients = ClientRegistry(openai_client=AsyncMock(), qdrant_client=AsyncMock())
+    return ThoughtSpaceService(db=MagicMock(), clients=clients)
+
+
+def make_points(n, seed=7):
+    rng = random.Random(seed)
+    points = []
+    for i in range(n):
+        payload = {
+            "content": rng.choice([f"message {i}", f"  Message {i % 10} ", "shared"]),
+            "created_at": (NOW - timedelta(seconds=rng.randint(1, 10_000_000), microseconds=rng.randint(0, 999_999))).isoformat(),
+        }
+        if rng.random() < 0.6:
+            payload["voice"] = rng.choice([0, 1, 3.6, 250, 10_000])
+        if rng.random() < 0.3:
+            payload["revisions"] = ["r"] * rng.randint(1, 3)
+        points.append(ScoredPoint(id=str(uuid.uuid4()), version=0, score=rng.uniform(0.5, 1.0), payload=payload))
+    return points
+
+
+def reference_ranking(service, points):
+    with patch("api.service.thoughtspace_service.datetime", FixedDatetime):
+        messages = [service.scored_point_to_message(point) for point in points]
+        return service.rerank(service.dedup(messages))
+
+
+def test_columnar_ranking_matches_message_rerank(service):
+    points = make_points(200)
+    expected = reference_ranking(service, points)
+
+    ranked = RankedResults.from_scored_points(points, now=NOW)
+    messages = ranked.to_messages()
+
+    assert [m.id for m in messages] == [m.id for m in expected]
+    np.testing.assert_array_max_ulp(
+        np.array([m.reranking_score for m in messages]), np.array([m.reranking_score for m in expected]), maxulp=MAX_ULP
+    )
+    assert [(m.voice, m.revisions_count, m.created_at) for m in messages] == [
+        (m.voice, m.revisions_count, m.created_at) for m in expected
+    ]
+
+
+def test_sparse_dicts_match_message_to_sparse_dict(service):
+    points = make_points(200, seed=11)
+    expected = [service.message_to_sparse_dict(m) for m in reference_ranking(service, points)]
+
+    sparse = RankedResults.from_scored_points(points, now=NOW).to_sparse_dicts()
+
+    assert [d.keys() for d in sparse] == [d.keys() for d in expected]
+    for key in ("reranking", "novelty"):
+        np.testing.assert_array_max_ulp(
+            np.array([d[key] for d in sparse]), np.array([d[key] for d in expected]), maxulp=MAX_ULP
+        )
+
+
+def test_limit_returns_the_top_of_the_full_ranking(service):
+    points = make_points(200, seed=3)
+    full = RankedResults.from_scored_points(points, now=NOW)
+    top = RankedResults.from_scored_points(points, limit=15, now=NOW)
+
+    assert top.ids == full.ids[:15]
+
+
+def test_top_k_keeps_stable_order_for_ties():
+    scores = np.array([1.0, 3.0, 2.0, 3.0, 2.0, 2.0])
+
+    assert top_k(scores, 4).tolist() == [1, 3, 2, 4]
+    assert top_k(scores).tolist() == [1, 3, 2, 4, 5, 0]
+
+
+def test_records_match_messages_at_the_boundary(service):
+    points = make_points(50, seed=5)
+    ranked = RankedResults.from_scored_points(points, now=NOW)
+
+    records = ranked.to_records()
+
+    assert [record.to_message() for record in records] == ranked.to_messages()
+    assert [service.calculate_voice_reward(record) for record in records] == [
+        service.calculate_voice_reward(message) for message in ranked.to_messages()
+    ]
+    assert not hasattr(records[0], "__dict__")
+
+
+def test_dashboard_records_skip_message_validation(service):
+    records = [Record(id=str(point.id), payload=point.payload) for point in make_points(20, seed=9)]
+    expected = [service.message_to_sparse_dict(service.record_to_message(record)) for record in records]
+
+    with patch("api.service._scoring.Message") as message_model:
+        sparse = service.records_to_sparse_dicts(records)
+
+    assert sparse == expected
+    message_model.assert_not_called()
+    assert isinstance(MessageRecord.from_point(records[0], similarity_score=0).created_at, datetime)
+
+
+@pytest.mark.asyncio
+async def test_one_reward_event_is_queued_per_mapped_message(service):
+    ranked = RankedResults.from_scored_points(make_points(30, seed=2), now=NOW).to_records()
+    authors = [uuid.uuid4(), uuid.uuid4()]
+    mapping = {str(record.id): authors[i % 2] for i, record in enumerate(ranked[:-1])}
+    service.thoughtspace_data.get_messages_user_mapping = MagicMock(return_value=mapping)
+    service.thoughtspace_data.settle_new_message = MagicMock()
+
+    await service.settle_new_message(ranked, "source-id", "author", 100)
+
+    user_id, voice_amount, source_message_id, rewards = service.thoughtspace_data.settle_new_message.call_args.args
+    assert (user_id, voice_amount, source_message_id) == ("author", 100, "source-id")
+    assert rewards == [
+        (record.id, authors[i % 2], service.calculate_voice_reward(record)) for i, record in enumerate(ranked[:-1])
+    ]
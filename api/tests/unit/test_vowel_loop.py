@@ -0,0 +1,134 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from fastapi.testclient import TestClient
+
+from api.data.chunking import ChunkedEmbedder
+from api.index import app
+from api.vowel_loop import VOWEL_LOOP_MAX_LOOPS, VowelLoop
+
+
+def fake_clients():
+    openai_client = AsyncMock()
+    openai_client.embed_many.side_effect = lambda texts, model_name: [[0.1] for _ in texts]
+    qdrant_client = AsyncMock()
+    qdrant_client.search_batch.side_effect = lambda embeddings, search_limit: [
+        [SimpleNamespace(id=i, score=0.9, payload={"content": "memory"}), SimpleNamespace(id="shared", score=0.8, payload={})]
+        for i in range(len(embeddings))
+    ]
+    return SimpleNamespace(
+        openai_client=openai_client,
+        qdrant_client=qdrant_client,
+        chunked_embedder=ChunkedEmbedder(openai_client, max_tokens=1000, overlap_tokens=100),
+        observation_writer=MagicMock(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_chunks_embed_and_search_in_one_request_each():
+    clients = fake_clients()
+    loop = VowelLoop(clients, max_concurrency=2)
+
+    embeddings = await loop.embed("word " * 2000)
+    results = await loop.search(embeddings)
+
+    chunks = clients.openai_client.embed_many.await_args.args[0]
+    assert clients.openai_client.embed_many.await_count == 1
+    assert len(embeddings) == len(chunks) > 1
+    assert clients.qdrant_client.search_batch.await_count == 1
+    assert clients.qdrant_client.search_batch.await_args.args[0] == embeddings
+    # One hit per chunk plus the point every chunk found, which ranks first under RRF
+    assert len(results) == len(chunks) + 1
+    assert results[0].id == "shared"
+
+
+@pytest.mark.asyncio
+async def test_update_saves_the_observation_note():
+    clients = fake_clients()
+    clients.openai_client.chat_completion.return_value = "RETURN"
+    loop = VowelLoop(clients)
+
+    result = await loop.update([{"role": "assistant", "content": "Observation: remember this"}])
+
+    assert result == "return"
+    clients.observation_writer.submit.assert_called_once_with("remember this", payload={"agent": "vowel_loop_v0"})
+
+
+@pytest.mark.asyncio
+async def test_stream_emits_tokens_per_stage_until_done():
+    clients = fake_clients()
+    replies = iter(["act", "exp", "int", "obs", "RETURN", "final"])
+
+    async def chat_completion_stream(messages, **kwargs):
+        for token in next(replies):
+            yield token
+
+    clients.openai_client.chat_completion_stream = chat_completion_stream
+    loop = VowelLoop(clients)
+
+    events = [event async for event in loop.stream("prompt")]
+
+    stages = [event["stage"] for event in events if event["event"] == "stage_end"]
+    assert stages == ["action", "experience", "intention", "observation", "update", "yield"]
+    assert events[1] == {"event": "token", "stage": "action", "data": "a"}
+    assert events[-1] == {"event": "done", "data": "final", "status": "returned", "loops": 1}
+    clients.observation_writer.submit.assert_called_once_with("obs", payload={"agent": "vowel_loop_v0"})
+
+
+@pytest.mark.asyncio
+async def test_closing_stream_stops_remaining_stages():
+    clients = fake_clients()
+
+    async def chat_completion_stream(messages, **kwargs):
+        yield "token"
+
+    clients.openai_client.chat_completion_stream = chat_completion_stream
+    events = VowelLoop(clients).stream("prompt")
+
+    assert (await events.__anext__())["event"] == "stage_start"
+    await events.aclose()
+
+    clients.qdrant_client.search_batch.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_run_stops_at_max_loops_when_the_model_keeps_looping():
+    clients = fake_clients()
+    clients.openai_client.chat_completion.return_value = "LOOP"
+    loop = VowelLoop(clients, max_loops=2)
+
+    await loop.run("prompt")
+
+    assert (loop.status, loop.loops) == ("max_loops", 2)
+    # Four stages and an Update per iteration, then the Yield
+    assert clients.openai_client.chat_completion.await_count == 2 * 5 + 1
+
+
+def test_requested_max_loops_is_capped_server_side():
+    assert VowelLoop(fake_clients(), max_loops=10**6).max_loops == VOWEL_LOOP_MAX_LOOPS
+
+
+def test_vowel_loop_endpoint_requires_authentication():
+    response = TestClient(app).post("/api/vowel_loop", json={"user_prompt": "prompt"})
+
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_stream_stops_at_max_loops_when_the_model_keeps_looping():
+    clients = fake_clients()
+
+    async def chat_completion_stream(messages, **kwargs):
+        yield "LOOP"
+
+    clients.openai_client.chat_completion_stream = chat_completion_stream
+    events = [event async for event in VowelLoop(clients, max_loops=2).stream("prompt")]
+
+    assert events[-1] == {"event": "done", "data": "LOOP", "status": "max_loops", "loops": 2}
+    assert [event["stage"] for event in events if event["event"] == "stage_end"].count("update") == 2
+
+
+def test_vowel_loop_stream_endpoint_requires_authentication():
+    response = TestClient(app).post("/api/vowel_loop/stream", json={"user_prompt": "prompt"})
+
+    assert response.status_code == 401
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from api.utils._helpers import until_disconnected
+
+
+class FakeRequest:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+@pytest.mark.asyncio
+async def test_until_disconnected_relays_every_event():
+    async def events():
+        for i in range(3):
+            yield i
+
+    assert [event async for event in until_disconnected(FakeRequest(), events())] == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_disconnect_while_waiting_stops_the_generator():
+    request = FakeRequest()
+    closed = asyncio.Event()
+
+    async def events():
+        try:
+            yield "first"
+            await asyncio.sleep(3600)  # a stage stuck waiting on an upstream call
+            yield "never"
+        finally:
+            closed.set()
+
+    relayed = []
+
+    async def consume():
+        async for event in until_disconnected(request, events(), poll_interval=0.01):
+            relayed.append(event)
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    request.disconnected = True
+
+    await asyncio.wait_for(consumer, timeout=1)
+    assert relayed == ["first"]
+    assert closed.is_set()
@@ -0,0 +1,95 @@
+import time
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from api.data._sqlalchemy_models import Base, USER
+from api.service._user_auth import authenticate_user_async
+from api.utils._passwords import PasswordHasher, build_context
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=1000, max_workers=2, executor="thread")
+    yield hasher
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_in_the_pool(hasher):
+    hashed = await hasher.hash("secret")
+
+    assert await hasher.verify_and_update("secret", hashed) == (True, None)
+    assert await hasher.verify_and_update("wrong", hashed) == (False, None)
+    assert await hasher.verify_and_update("secret", "not a hash") == (False, None)
+    assert hasher.metrics()["verifications"] == 3
+
+
+@pytest.mark.asyncio
+async def test_outdated_cost_or_scheme_is_rehashed(hasher):
+    for hashed in (build_context(("sha256_crypt",), 2000).hash("secret"), build_context(("md5_crypt",)).hash("secret")):
+        hasher.config = (("sha256_crypt", "md5_crypt"), 1000)
+        valid, new_hash = await hasher.verify_and_update("secret", hashed)
+
+        assert valid and new_hash.startswith("$5$rounds=1000$")
+    assert hasher.rehashes == 2
+
+
+@pytest.mark.asyncio
+async def test_process_pool_keeps_the_event_loop_free():
+    hasher = PasswordHasher(rounds=400_000, executor="process")
+    try:
+        await hasher.hash("warm up the worker")
+        task = asyncio.create_task(hasher.hash("secret"))
+        gaps, last = [], time.perf_counter()
+        while not task.done():
+            await asyncio.sleep(0.005)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+        assert hasher.context.verify("secret", task.result())
+    finally:
+        hasher.shutdown()
+
+    assert len(gaps) > 5 and max(gaps) < 0.1
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_passwords(hasher):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    old_hash = build_context(("sha256_crypt",), 2000).hash("secret")
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        db.add(USER(username="u", email="u@example.com", full_name="U", hashed_password=old_hash))
+        await db.commit()
+        with patch("api.service._user_auth.verify_and_update_password_async", hasher.verify_and_update):
+            assert await authenticate_user_async(db, "u", "wrong") is False
+            user = await authenticate_user_async(db, "u", "secret")
+            assert user.hashed_password.startswith("$5$rounds=1000$")
+            assert await authenticate_user_async(db, "u", "secret") == user
+    await engine.dispose()
+
+    assert hasher.rehashes == 1
+
+
+@pytest.mark.asyncio
+async def test_login_succeeds_when_storing_the_rehash_fails(hasher):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    old_hash = build_context(("sha256_crypt",), 2000).hash("secret")
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        db.add(USER(username="u", email="u@example.com", full_name="U", hashed_password=old_hash))
+        await db.commit()
+        with (
+            patch("api.service._user_auth.verify_and_update_password_async", hasher.verify_and_update),
+            patch.object(db, "commit", AsyncMock(side_effect=RuntimeError("database went away"))),
+        ):
+            user = await authenticate_user_async(db, "u", "secret")
+
+        assert (user.username, user.hashed_password) == ("u", old_hash)
+        assert (await db.execute(select(USER.hashed_password))).scalar_one() == old_hash
+    await engine.dispose()
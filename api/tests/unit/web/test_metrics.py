@@ -0,0 +1,28 @@
+import uuid
+from unittest.mock import MagicMock
+
+from fastapi.testclient import TestClient
+
+from api.data.client_registry import get_clients
+from api.index import app
+from api.utils._helpers import get_current_user_dep
+
+
+def test_metrics_require_authentication():
+    assert TestClient(app).get("/api/metrics").status_code == 401
+    assert TestClient(app).get("/api/hello").json() == {"message": "Hello, World!"}
+
+
+def test_metrics_are_served_to_authenticated_users():
+    clients = MagicMock()
+    clients.metrics.return_value = {"embedding_cache": {"hits": 0}}
+    app.dependency_overrides[get_current_user_dep] = lambda: uuid.uuid4()
+    app.dependency_overrides[get_clients] = lambda: clients
+    try:
+        response = TestClient(app).get("/api/metrics")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json()["embedding_cache"] == {"hits": 0}
+    assert "db_availability" in response.json()
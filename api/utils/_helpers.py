@@ -1,5 +1,4 @@
 from jose import jwt, JWTError
-from passlib.context import CryptContext
 
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Security
@@ -9,16 +8,25 @@ from uuid import UUID
 from fastapi import HTTPException, status
 from typing import Union, Any
 from datetime import datetime, timedelta, timezone
+import json
+import asyncio
+import logging
+
+from ._passwords import PasswordHasher
 
 _: bool = load_dotenv(find_dotenv())
 
+logger = logging.getLogger(__name__)
+
 SECRET_KEY = os.environ.get("SECRET_KEY")
 ALGORITHM = os.environ.get("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
+# Scheme and cost come from PASSWORD_HASH_* env vars; see api/tests/benchmarks/bench_password_hashing.py
+password_hasher = PasswordHasher.from_env()
+pwd_context = password_hasher.context
 
 
 def verify_password(plain_password, hashed_password):
@@ -29,6 +37,16 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
+async def get_password_hash_async(password: str) -> str:
+    """Hash in the password hasher's pool, keeping the event loop free."""
+    return await password_hasher.hash(password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str):
+    """Returns (valid, new_hash); new_hash is set when the stored hash should be replaced."""
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
+
+
 async def get_current_user_dep(
     token: str = Security(oauth2_scheme),
 ) -> Union[str, UUID]:
@@ -102,3 +120,42 @@ credentials_exception = HTTPException(
     headers={"WWW-Authenticate": "Bearer"},
     detail={"error": "invalid_token", "error_description": "The access token expired"},
 )
+
+
+def format_sse(event: dict) -> str:
+    """
+    Format an event dict as a server-sent event, using its "event" key as the SSE event name.
+    """
+    return f"event: {event.get('event', 'message')}\ndata: {json.dumps(event)}\n\n"
+
+
+async def until_disconnected(request, events, poll_interval: float = 1.0):
+    """
+    Relay events from an async generator until it is exhausted or the client disconnects, then close it.
+
+    The client is also polled every poll_interval seconds while the next event is pending, so a
+    disconnect during a slow step stops the generator right away rather than at its next event.
+    """
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(events.__anext__())
+            while not (await asyncio.wait({pending}, timeout=poll_interval))[0]:
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, stopping the stream")
+                    return
+            try:
+                event = pending.result()
+            except StopAsyncIteration:
+                return
+            finally:
+                pending = None
+            if await request.is_disconnected():
+                logger.info("Client disconnected, stopping the stream")
+                return
+            yield event
+    finally:
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await events.aclose()
@@ -0,0 +1,135 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_KINDS = ("process", "thread")
+
+
+@lru_cache(maxsize=None)
+def build_context(schemes: Tuple[str, ...], rounds: Optional[int] = None) -> CryptContext:
+    """
+    CryptContext hashing with schemes[0]; the other schemes are only verified and flagged for rehash.
+
+    With `rounds` set, hashes of the default scheme at any other cost also need an update, so
+    raising or lowering the cost rehashes existing passwords as their users log in.
+    """
+    settings = {}
+    if rounds is not None:
+        for option in ("default_rounds", "min_rounds", "max_rounds"):
+            settings[f"{schemes[0]}__{option}"] = rounds
+    return CryptContext(schemes=list(schemes), deprecated="auto", **settings)
+
+
+# Module-level so a process pool can pickle them; each worker process builds its context once
+def _hash(config, password: str) -> str:
+    return build_context(*config).hash(password)
+
+
+def _verify_and_update(config, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return build_context(*config).verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords off the event loop, in a bounded pool of `max_workers`.
+
+    passlib's sha256_crypt backend holds the GIL for the whole hash, so the default is a process
+    pool: a login storm then queues on the pool instead of stalling message and search traffic on
+    the same worker. Schemes whose backends release the GIL (bcrypt, argon2) can use threads.
+
+    Args:
+        schemes (Tuple[str, ...]): passlib schemes; the first hashes new passwords.
+        rounds (Optional[int]): Cost of the first scheme; None keeps passlib's default.
+        max_workers (int): Hashes that run at once.
+        executor (str): "process" or "thread".
+    """
+
+    def __init__(
+        self,
+        schemes: Tuple[str, ...] = ("sha256_crypt",),
+        rounds: Optional[int] = None,
+        max_workers: int = 1,
+        executor: str = "process",
+    ):
+        if executor not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown password hash executor {executor!r}, expected one of {', '.join(EXECUTOR_KINDS)}")
+        self.config = (tuple(schemes), rounds)
+        self.context = build_context(*self.config)
+        self.max_workers = max_workers
+        self.executor_kind = executor
+        self._executor: Optional[Executor] = None
+        self.hashes = 0
+        self.verifications = 0
+        self.rehashes = 0
+        self.in_flight = 0
+
+    @classmethod
+    def from_env(cls) -> "PasswordHasher":
+        rounds = os.environ.get("PASSWORD_HASH_ROUNDS")
+        return cls(
+            schemes=tuple(s.strip() for s in os.environ.get("PASSWORD_HASH_SCHEMES", "sha256_crypt").split(",") if s.strip()),
+            rounds=int(rounds) if rounds else None,
+            max_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", "1")),
+            executor=os.environ.get("PASSWORD_HASH_EXECUTOR", "process"),
+        )
+
+    def _pool(self) -> Executor:
+        # Created on first use, so importing the module or hashing synchronously never starts workers
+        if self._executor is None:
+            if self.executor_kind == "process":
+                # spawn rather than fork: the parent runs an event loop and client threads
+                self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, self.config, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        self.hashes += 1
+        return await self._run(_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Returns (valid, new_hash), new_hash being set when the stored hash uses an outdated scheme
+        or cost and should be replaced. Unrecognized hashes are treated as invalid.
+        """
+        self.verifications += 1
+        try:
+            valid, new_hash = await self._run(_verify_and_update, password, hashed_password)
+        except ValueError as e:
+            logger.warning(f"Could not verify password hash: {e}")
+            return False, None
+        if new_hash is not None:
+            self.rehashes += 1
+        return valid, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def metrics(self) -> dict:
+        return {
+            "scheme": self.config[0][0],
+            "rounds": self.config[1],
+            "executor": self.executor_kind,
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "hashes": self.hashes,
+            "verifications": self.verifications,
+            "rehashes": self.rehashes,
+        }
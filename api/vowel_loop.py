@@ -1,158 +1,232 @@
-from openai import OpenAI
-from qdrant_client import QdrantClient, models
-from qdrant_client.http.exceptions import ApiException, UnexpectedResponse
-from datetime import datetime
+import asyncio
 import logging
-import uuid
 import os
+from typing import Optional
 
-openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-qdrant_client = QdrantClient(url=os.environ.get("QDRANT_URL"), api_key=os.environ.get("QDRANT_API_KEY"))
-
-def embed(input_text, model_name="text-embedding-ada-002", chunk_size=10000, overlap=5000):
-    chunks = []
-    start = 0
-    while start < len(input_text):
-        end = min(start + chunk_size, len(input_text))
-        chunks.append(input_text[start:end])
-        start += chunk_size - overlap
-
-    embeddings = []
-    for chunk in chunks:
-        embedding_response = openai_client.embeddings.create(
-            input=chunk,
-            model=model_name
-        )
-        embeddings.append(embedding_response.data[0].embedding)
-
-    return embeddings
-
-def search(embeddings, collection_name="choir", search_limit=40):
-    search_results = []
-    for embedding in embeddings:
-        results = qdrant_client.search(
-            collection_name=collection_name,
-            query_vector=embedding,
-            limit=search_limit
-        )
-        search_results.extend(results)
-
-    return search_results
-
-def deduplicate(search_results):
-    unique_payloads = set()
-    deduplicated_results = []
-    for result in search_results:
-        payload_content = result.payload.get('content', None)
-        if payload_content and payload_content not in unique_payloads:
-            unique_payloads.add(payload_content)
-            deduplicated_results.append(result)
-
-    print(f"Deduplicated {len(search_results)} search results to {len(deduplicated_results)} unique results: {deduplicated_results}")
-    return deduplicated_results
-
-def chat_completion(messages, model="gpt-4o", max_tokens=4000, n=1, stop=None, temperature=0.7):
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=messages,
-        max_tokens=max_tokens,
-        n=n,
-        stop=stop,
-        temperature=temperature,
-    )
-    return response.choices[0].message.content.strip()
-
-def upsert(id, input_string, embedding, collection_name="choir"):
-        try:
-            qdrant_client.upsert(
-                collection_name=collection_name,
-                points=[
-                    models.PointStruct(
-                        id=id,
-                        payload={"content": input_string, "created_at": datetime.now(), "agent": "vowel_loop_v0"},
-                        vector=embedding,
-                    )
-                ],
-            )
-            print(f"Successfully upserted observation with ID: {id}, content: {input_string}")
-        except (ApiException, UnexpectedResponse) as e:
-            logging.error(f"Error during upsert operation: {e}")
-            # Handle the error as needed
-
-def save_observation(observation):
-    try:
-        embedding = embed(observation)
-        observation_id = str(uuid.uuid4())  # Generate a unique ID for the observation
-
-        upsert(
-            id=observation_id,
-            input_string=observation,
-            embedding=embedding
-        )
-
-    except Exception as e:
-        logging.error(f"Error during save_observation: {e}")
-        # Handle the error as needed
-
-def action(messages, user_prompt):
-    action_system_prompt = """
-    This is the Vowel Loop, a decision-making model that turns the OODA loop on its head. Rather than accumulating data before acting, you act with "beginners mind"/emptiness, then reflect on your "System 1" action.
-    A user has asked you to engage in the Vowel Loop reasoning process.
-    This is step 1, Action: Provide an initial response to the user's prompt to the best of your ability.
-    """
-
-    messages = [{"role": "system", "content": action_system_prompt}, {"role": "user", "content": user_prompt}]
-    completion = chat_completion(messages)
-    print(f"Action: {completion}")
-    return completion
+from api.data.client_registry import ClientRegistry
+from api.data.qdrant_client import fuse_scored_points
 
-def experience(messages):
-    experience_system_prompt = """This is step 2 of the Vowel Loop, Experience: Search your memory for relevant context that could help refine the response from step 1."""
+VOWEL_LOOP_MAX_CONCURRENCY = int(os.environ.get("VOWEL_LOOP_MAX_CONCURRENCY", "8"))
+# How the per-chunk hits of the Experience step are merged: "rrf" or "max"
+VOWEL_LOOP_SEARCH_FUSION = os.environ.get("VOWEL_LOOP_SEARCH_FUSION", "rrf")
+# Iterations one request may run before the loop is made to yield, whatever the Update step says
+VOWEL_LOOP_MAX_LOOPS = int(os.environ.get("VOWEL_LOOP_MAX_LOOPS", "3"))
 
-    prompt = messages[-1]["content"]
-    embedding = embed(prompt)
-    search_results = search(embedding)
-    deduplicated_results = deduplicate(search_results)
 
-    reranked_prompt = f"{prompt}\n\nSearch Results:\n{[r.payload['content'] for r in deduplicated_results]}\n\nReranked Search Results:"
-    messages = [{"role": "system", "content": experience_system_prompt}, {"role": "user", "content": reranked_prompt}]
-    completion = chat_completion(messages)
-    print(f"Experience: {completion}")
-    return completion
-
-def intention(messages):
-    intention_system_prompt = """
-    This is step 3 of the Vowel Loop, Intention: Impute the user's intention, reflecting on whether the query can be satisfactorily responded to based on the priors recalled in the Experience step
+class VowelLoop:
     """
+    Async Vowel Loop engine running on the worker's shared OpenAI and Qdrant clients.
 
-    intention_prompt = f"{messages[-1]['content']}\n\nReflection on goal satisfiability:"
-    messages = [{"role": "system", "content": intention_system_prompt}, {"role": "user", "content": intention_prompt}]
-    completion = chat_completion(messages)
-    print(f"Intention: {completion}")
-    return completion
-
-def observation(messages):
-    observation_system_prompt = """This is step 4 of the Vowel Loop, Observation: Note any key insights from this iteration that could help improve future responses.
-    This note will be saved to a global vector database accessible to all instances of this AI Agent, for all users.
-    Don't save any private information."""
-
-    observation_prompt = f"{messages[-1]['content']}\n\nNote for future recall:"
-    messages = [{"role": "system", "content": observation_system_prompt}, {"role": "user", "content": observation_prompt}]
-    completion = chat_completion(messages)
-    print(f"Observation: {completion}")
-    return completion
-
-def update(messages):
-    update_system_prompt = """This is step 5 of the Vowel Loop, Update: Decide whether to perform another round of the loop to further refine the response or to provide a final answer to the user. Respond with 'LOOP' or 'RETURN'."""
+    Long inputs are embedded as token-bounded chunks in one request and all chunk vectors are
+    searched in one batch request, with at most max_concurrency calls in flight per loop.
 
-    update_prompt = f"{messages[-1]['content']}\n\nShould we LOOP or RETURN final response?"
-    messages = [{"role": "system", "content": update_system_prompt}, {"role": "user", "content": update_prompt}]
-    completion = chat_completion(messages, max_tokens=1)
-    print(f"Update: {completion}")
+    The loop repeats while the Update step answers LOOP (or gives an invalid answer), but never more
+    than max_loops times, capped at VOWEL_LOOP_MAX_LOOPS. After a run, status is "returned" if the
+    model chose to return and "max_loops" if the cap cut it short; loops counts the iterations.
+    """
 
-    observation_result = messages[-2]["content"].replace("Observation: ", "")
-    save_observation(observation_result)
+    def __init__(
+        self,
+        clients: ClientRegistry,
+        max_concurrency: int = VOWEL_LOOP_MAX_CONCURRENCY,
+        max_loops: Optional[int] = None,
+    ):
+        self.max_loops = min(max_loops or VOWEL_LOOP_MAX_LOOPS, VOWEL_LOOP_MAX_LOOPS)
+        self.loops = 0
+        self.status = None
+        self.openai_client = clients.openai_client
+        self.qdrant_client = clients.qdrant_client
+        self.chunked_embedder = clients.chunked_embedder
+        self.observation_writer = clients.observation_writer
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _bounded(self, coroutine):
+        async with self.semaphore:
+            return await coroutine
+
+    async def embed(self, input_text):
+        """One vector per token-bounded chunk of the input, all embedded in a single request."""
+        _, vectors = await self._bounded(self.chunked_embedder.embed_chunks(input_text))
+        return vectors
+
+    async def search(self, embeddings, search_limit=40):
+        """All chunk vectors in one batch search, fused into a single ranking deduplicated by point id."""
+        results = await self._bounded(self.qdrant_client.search_batch(embeddings, search_limit))
+        return fuse_scored_points(results or [], method=VOWEL_LOOP_SEARCH_FUSION, limit=search_limit)
+
+    async def chat_completion(self, messages, **kwargs):
+        return await self._bounded(self.openai_client.chat_completion(messages, **kwargs))
+
+    def save_observation(self, observation):
+        # Queued for the background writer; the loop never waits on the vector-store write
+        try:
+            observation_id = self.observation_writer.submit(observation, payload={"agent": "vowel_loop_v0"})
+            logging.info(f"Queued observation with ID: {observation_id}")
+        except Exception as e:
+            logging.error(f"Error during save_observation: {e}")
+            # Handle the error as needed
 
+    def action_prompt(self, user_prompt):
+        action_system_prompt = """
+        This is the Vowel Loop, a decision-making model that turns the OODA loop on its head. Rather than accumulating data before acting, you act with "beginners mind"/emptiness, then reflect on your "System 1" action.
+        A user has asked you to engage in the Vowel Loop reasoning process.
+        This is step 1, Action: Provide an initial response to the user's prompt to the best of your ability.
+        """
+        return [{"role": "system", "content": action_system_prompt}, {"role": "user", "content": user_prompt}]
+
+    async def experience_prompt(self, messages):
+        experience_system_prompt = """This is step 2 of the Vowel Loop, Experience: Search your memory for relevant context that could help refine the response from step 1."""
+
+        prompt = messages[-1]["content"]
+        embedding = await self.embed(prompt)
+        search_results = await self.search(embedding)
+
+        reranked_prompt = f"{prompt}\n\nSearch Results:\n{[r.payload.get('content') for r in search_results]}\n\nReranked Search Results:"
+        return [{"role": "system", "content": experience_system_prompt}, {"role": "user", "content": reranked_prompt}]
+
+    def intention_prompt(self, messages):
+        intention_system_prompt = """
+        This is step 3 of the Vowel Loop, Intention: Impute the user's intention, reflecting on whether the query can be satisfactorily responded to based on the priors recalled in the Experience step
+        """
+
+        intention_prompt = f"{messages[-1]['content']}\n\nReflection on goal satisfiability:"
+        return [{"role": "system", "content": intention_system_prompt}, {"role": "user", "content": intention_prompt}]
+
+    def observation_prompt(self, messages):
+        observation_system_prompt = """This is step 4 of the Vowel Loop, Observation: Note any key insights from this iteration that could help improve future responses.
+        This note will be saved to a global vector database accessible to all instances of this AI Agent, for all users.
+        Don't save any private information."""
+
+        observation_prompt = f"{messages[-1]['content']}\n\nNote for future recall:"
+        return [{"role": "system", "content": observation_system_prompt}, {"role": "user", "content": observation_prompt}]
+
+    def update_prompt(self, messages):
+        update_system_prompt = """This is step 5 of the Vowel Loop, Update: Decide whether to perform another round of the loop to further refine the response or to provide a final answer to the user. Respond with 'LOOP' or 'RETURN'."""
+
+        update_prompt = f"{messages[-1]['content']}\n\nShould we LOOP or RETURN final response?"
+        return [{"role": "system", "content": update_system_prompt}, {"role": "user", "content": update_prompt}]
+
+    def yield_prompt(self, messages):
+        yield_system_prompt = """This is the final step of the Vowel Loop, Yield: Synthesize the accumulated context from all iterations and provide a final response that comprehensively addresses the user's original prompt."""
+        messages.append({"role": "system", "content": yield_system_prompt})
+        messages.append({"role": "user", "content": "Synthesize the accumulated context and provide a final response:"})
+        return messages
+
+    async def action(self, messages, user_prompt):
+        completion = await self.chat_completion(self.action_prompt(user_prompt))
+        print(f"Action: {completion}")
+        return completion
+
+    async def experience(self, messages):
+        completion = await self.chat_completion(await self.experience_prompt(messages))
+        print(f"Experience: {completion}")
+        return completion
+
+    async def intention(self, messages):
+        completion = await self.chat_completion(self.intention_prompt(messages))
+        print(f"Intention: {completion}")
+        return completion
+
+    async def observation(self, messages):
+        completion = await self.chat_completion(self.observation_prompt(messages))
+        print(f"Observation: {completion}")
+        return completion
+
+    async def update(self, messages):
+        # The last loop message is the Observation step's note
+        observation_result = messages[-1]["content"].replace("Observation: ", "")
+
+        self.save_observation(observation_result)
+        completion = await self.chat_completion(self.update_prompt(messages), max_tokens=1)
+        print(f"Update: {completion}")
+        return parse_update(completion)
+
+    async def yield_response(self, messages):
+        final_response = await self.chat_completion(self.yield_prompt(messages))
+        return final_response
+
+    def _finish_loop(self, update_result) -> bool:
+        """Record one finished iteration and return whether the loop should stop."""
+        self.loops += 1
+        if update_result == "return":
+            self.status = "returned"
+        elif self.loops >= self.max_loops:
+            self.status = "max_loops"
+            logging.warning(f"Vowel Loop stopped after {self.loops} iterations without a RETURN")
+        return self.status is not None
+
+    async def run(self, user_prompt):
+        messages = []
+        self.loops, self.status = 0, None
+        while True:
+            action_result = await self.action(messages, user_prompt)
+            messages.append({"role": "assistant", "content": f"Action: {action_result}"})
+            experience_result = await self.experience(messages)
+            messages.append({"role": "assistant", "content": f"Experience: {experience_result}"})
+            intention_result = await self.intention(messages)
+            messages.append({"role": "assistant", "content": f"Intention: {intention_result}"})
+            observation_result = await self.observation(messages)
+            messages.append({"role": "assistant", "content": f"Observation: {observation_result}"})
+            update_result = await self.update(messages)
+            if self._finish_loop(update_result):
+                break
+        final_response = await self.yield_response(messages)
+        return final_response
+
+    async def _stream_stage(self, stage, prompt, result, **kwargs):
+        """
+        Stream one stage's completion as events, collecting the full text into result[stage].
+        """
+        yield {"event": "stage_start", "stage": stage}
+        tokens = []
+        async with self.semaphore:
+            async for token in self.openai_client.chat_completion_stream(prompt, **kwargs):
+                tokens.append(token)
+                yield {"event": "token", "stage": stage, "data": token}
+        result[stage] = "".join(tokens).strip()
+        yield {"event": "stage_end", "stage": stage, "data": result[stage]}
+
+    async def stream(self, user_prompt):
+        """
+        Run the loop, yielding each stage's tokens as they arrive.
+
+        Closing the generator (e.g. when the client disconnects) stops all remaining stages.
+        Observations already submitted are still written by the background writer. Like run(),
+        the loop stops after max_loops iterations; the done event carries the status and loops.
+        """
+        messages = []
+        result = {}
+        self.loops, self.status = 0, None
+        while True:
+            async for event in self._stream_stage("action", self.action_prompt(user_prompt), result):
+                yield event
+            messages.append({"role": "assistant", "content": f"Action: {result['action']}"})
+
+            experience_prompt = await self.experience_prompt(messages)
+            async for event in self._stream_stage("experience", experience_prompt, result):
+                yield event
+            messages.append({"role": "assistant", "content": f"Experience: {result['experience']}"})
+
+            async for event in self._stream_stage("intention", self.intention_prompt(messages), result):
+                yield event
+            messages.append({"role": "assistant", "content": f"Intention: {result['intention']}"})
+
+            async for event in self._stream_stage("observation", self.observation_prompt(messages), result):
+                yield event
+            messages.append({"role": "assistant", "content": f"Observation: {result['observation']}"})
+
+            self.save_observation(result["observation"])
+            async for event in self._stream_stage("update", self.update_prompt(messages), result, max_tokens=1):
+                yield event
+            if self._finish_loop(parse_update(result["update"])):
+                break
+
+        async for event in self._stream_stage("yield", self.yield_prompt(messages), result):
+            yield event
+        yield {"event": "done", "data": result["yield"], "status": self.status, "loops": self.loops}
+
+
+def parse_update(completion):
     if completion.lower() == "return":
         return "return"
     elif completion.lower() == "loop":
@@ -162,28 +236,16 @@ def update(messages):
         print("Invalid update response. Please try again.")
         return "invalid"
 
-def yield_response(messages):
-    yield_system_prompt = """This is the final step of the Vowel Loop, Yield: Synthesize the accumulated context from all iterations and provide a final response that comprehensively addresses the user's original prompt."""
-    messages.append({"role": "system", "content": yield_system_prompt})
-    messages.append({"role": "user", "content": "Synthesize the accumulated context and provide a final response:"})
-    final_response = chat_completion(messages)
-    return final_response
 
 def vowel_loop(user_prompt):
-    messages = []
-    while True:
-        action_result = action(messages, user_prompt)
-        messages.append({"role": "assistant", "content": f"Action: {action_result}"})
-        experience_result = experience(messages)
-        messages.append({"role": "assistant", "content": f"Experience: {experience_result}"})
-        intention_result = intention(messages)
-        messages.append({"role": "assistant", "content": f"Intention: {intention_result}"})
-        observation_result = observation(messages)
-        messages.append({"role": "assistant", "content": f"Observation: {observation_result}"})
-        update_result = update(messages)
-        if update_result == "return":
-            break
-        else:
-            continue
-    final_response = yield_response(messages)
-    return final_response
+    """Run the Vowel Loop to completion outside of an event loop, e.g. from a script."""
+
+    async def _run():
+        clients = ClientRegistry()
+        await clients.start()
+        try:
+            return await VowelLoop(clients).run(user_prompt)
+        finally:
+            await clients.close()
+
+    return asyncio.run(_run())
@@ -0,0 +1,48 @@
+"""Add reward events table
+
+Revision ID: 4c9e2b7a1d53
+Revises: 591dd84a3442
+Create Date: 2024-06-03 10:12:45.118204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4c9e2b7a1d53"
+down_revision: Union[str, None] = "591dd84a3442"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "reward_events_table",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("source_message_id", sa.UUID(), nullable=False),
+        sa.Column("message_id", sa.UUID(), nullable=False),
+        sa.Column("author_id", sa.UUID(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("settled_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["author_id"], ["users_table.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("source_message_id", "message_id", name="uq_reward_events_source_message"),
+    )
+    # Partial index: the settlement worker only ever scans unsettled events
+    op.create_index(
+        "ix_reward_events_unsettled",
+        "reward_events_table",
+        ["created_at"],
+        unique=False,
+        postgresql_where=sa.text("settled_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_reward_events_unsettled", table_name="reward_events_table")
+    op.drop_table("reward_events_table")
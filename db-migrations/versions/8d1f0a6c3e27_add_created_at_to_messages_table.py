@@ -0,0 +1,34 @@
+"""Add created_at to messages_table for keyset-paginated dashboards
+
+Revision ID: 8d1f0a6c3e27
+Revises: 4c9e2b7a1d53
+Create Date: 2024-06-10 09:27:03.551870
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d1f0a6c3e27"
+down_revision: Union[str, None] = "4c9e2b7a1d53"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows get the migration time as a placeholder, so until `python -m api.backfill
+    # restore-created-at` copies their real creation time from Qdrant, they are ordered by id only
+    op.add_column(
+        "messages_table",
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_messages_user_created", "messages_table", ["user_id", "created_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_user_created", table_name="messages_table")
+    op.drop_column("messages_table", "created_at")
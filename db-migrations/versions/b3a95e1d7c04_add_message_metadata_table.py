@@ -0,0 +1,42 @@
+"""Add message metadata projection table
+
+Revision ID: b3a95e1d7c04
+Revises: 8d1f0a6c3e27
+Create Date: 2024-06-14 15:02:41.370992
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b3a95e1d7c04"
+down_revision: Union[str, None] = "8d1f0a6c3e27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "message_metadata_table",
+        sa.Column("message_id", sa.UUID(), nullable=False),
+        sa.Column("user_id", sa.UUID(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("content_preview", sa.Text(), nullable=False),
+        sa.Column("voice", sa.Integer(), nullable=True),
+        sa.Column("revisions_count", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["message_id"], ["messages_table.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users_table.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("message_id"),
+    )
+    op.create_index(
+        "ix_message_metadata_user_created", "message_metadata_table", ["user_id", "created_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_message_metadata_user_created", table_name="message_metadata_table")
+    op.drop_table("message_metadata_table")
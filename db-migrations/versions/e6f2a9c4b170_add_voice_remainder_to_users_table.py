@@ -0,0 +1,27 @@
+"""Add voice_remainder to users_table
+
+Revision ID: e6f2a9c4b170
+Revises: b3a95e1d7c04
+Create Date: 2024-06-18 10:12:05.118403
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e6f2a9c4b170"
+down_revision: Union[str, None] = "b3a95e1d7c04"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("users_table", sa.Column("voice_remainder", sa.Float(), server_default="0", nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column("users_table", "voice_remainder")